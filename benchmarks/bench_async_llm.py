@@ -0,0 +1,160 @@
+"""
+End-to-end turn latency with blocking versus async provider calls.
+
+A turn here is the provider work that does not depend on each other: the
+reply from the selected provider, the same prompt on the other provider
+(for comparison), a retry variant and the summary of the previous reply.
+The blocking mode makes these calls one after another, as the script
+thread does with chat()/summarize_message(); the async mode gathers the
+coroutines (chat_async()/summarize_message_async()) on the shared event
+loop of utils/async_bridge.py. Several sessions can run turns at once.
+
+--simulate serves both APIs from a local server with fixed latencies, so
+no keys are needed and nothing is billed:
+
+    python benchmarks/bench_async_llm.py --simulate --turns 5 --sessions 4
+
+Without --simulate the real APIs are called with the configured keys.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_DIR))
+
+def prompt():
+    from utils.context_builder import PromptParts
+    # An empty system prompt stands for the default persona
+    return PromptParts("", "You are currently chatting with Bench.\n", "\nCurrent message from Bench: How was your weekend?\n")
+
+def percentile(samples, fraction):
+    """Get a percentile of the samples (nearest rank)"""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def start_simulated_api(chat_ms, summary_ms):
+    """Serve OpenAI chat completions and Anthropic messages locally; returns the base URL"""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("content-length", 0))) or b"{}")
+            # Summaries are the short completions
+            time.sleep((summary_ms if request.get("max_tokens", 0) <= 100 else chat_ms) / 1000)
+            text = "Reply 1: Lovely, thanks!\nReply 2: Great, and yours?"
+            if self.path.endswith("/messages"):
+                body = {
+                    "id": "msg", "type": "message", "role": "assistant", "model": request.get("model"),
+                    "content": [{"type": "text", "text": text}], "stop_reason": "end_turn", "stop_sequence": None,
+                    "usage": {"input_tokens": 10, "output_tokens": 10}
+                }
+            else:
+                body = {
+                    "id": "chatcmpl", "object": "chat.completion", "created": 0, "model": request.get("model"),
+                    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+                    "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20}
+                }
+            data = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+def blocking_turn(previous_reply):
+    from fred_us_tools_2 import chat, summarize_message
+    reply = chat(prompt(), [], "openai")
+    chat(prompt(), [], "claude")
+    chat(prompt().with_guidance("try another angle"), [], "openai")
+    summarize_message(previous_reply)
+    return reply
+
+def async_turn(previous_reply):
+    from fred_us_tools_2 import chat_async, summarize_message_async
+    from utils.async_bridge import run_async
+
+    async def turn():
+        reply, _, _, _ = await asyncio.gather(
+            chat_async(prompt(), [], "openai"),
+            chat_async(prompt(), [], "claude"),
+            chat_async(prompt().with_guidance("try another angle"), [], "openai"),
+            summarize_message_async(previous_reply)
+        )
+        return reply
+
+    return run_async(turn())
+
+def run_mode(mode, turn, sessions, turns):
+    """Run turns in several sessions at once; returns the turn latencies"""
+    latencies = []
+    lock = threading.Lock()
+
+    def session(index):
+        previous_reply = f"Reply 1: Hello from {mode} session {index}\nReply 2: Hi!"
+        for number in range(turns):
+            start = time.perf_counter()
+            # A distinct previous reply per turn and mode, so the summary cache does not answer it
+            turn(f"{previous_reply} ({number})")
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=session, args=(index,)) for index in range(sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--simulate", action="store_true", help="use a local simulated API instead of the real ones")
+    parser.add_argument("--chat-ms", type=float, default=1500, help="simulated chat latency")
+    parser.add_argument("--summary-ms", type=float, default=500, help="simulated summary latency")
+    parser.add_argument("--sessions", type=int, default=1)
+    parser.add_argument("--turns", type=int, default=5)
+    args = parser.parse_args()
+
+    # Settings are read from the environment first, so configure before importing;
+    # keep benchmark summaries out of the app's summary cache
+    os.environ.setdefault("LOCAL_STORE_PATH", ":memory:")
+    if args.simulate:
+        base_url = start_simulated_api(args.chat_ms, args.summary_ms)
+        os.environ.update({
+            "OPENAI_API_KEY": "simulated", "ANTHROPIC_API_KEY": "simulated",
+            "OPENAI_BASE_URL": f"{base_url}/v1", "ANTHROPIC_BASE_URL": base_url,
+            "PROMPT_CACHE": "false"
+        })
+
+    from utils.llm_clients import get_llm_client_metrics
+
+    results = {}
+    for mode, turn in [("blocking", blocking_turn), ("async", async_turn)]:
+        latencies, wall = run_mode(mode, turn, args.sessions, args.turns)
+        results[mode] = {
+            "turns": len(latencies),
+            "turn_mean_ms": statistics.mean(latencies) * 1000,
+            "turn_p95_ms": percentile(latencies, 0.95) * 1000,
+            "wall_s": wall
+        }
+    results["connections"] = get_llm_client_metrics()
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Reply latency with and without hedging the preferred provider.
+
+Each request asks the preferred provider (OpenAI) for a reply; hedged
+requests (chat(..., hedge=True)) also ask Claude once OpenAI has taken
+longer than its hedge delay, and the first reply wins. The first
+--warmup requests fill the latency histograms the hedge delay comes from.
+
+--simulate serves both APIs from a local server whose latencies have a
+slow tail (--tail-ms for a --tail-rate share of the calls), so no keys are
+needed and nothing is billed:
+
+    python benchmarks/bench_hedging.py --simulate --requests 200
+
+Without --simulate the real APIs are called with the configured keys.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_DIR))
+
+def prompt(number):
+    from utils.context_builder import PromptParts
+    # An empty system prompt stands for the default persona
+    return PromptParts("", "You are currently chatting with Bench.\n", f"\nCurrent message from Bench: How was your weekend? ({number})\n")
+
+def percentile(samples, fraction):
+    """Get a percentile of the samples (nearest rank)"""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def start_simulated_api(openai_ms, claude_ms, tail_ms, tail_rate):
+    """Serve OpenAI chat completions and Anthropic messages locally; returns the base URL"""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("content-length", 0))) or b"{}")
+            claude = self.path.endswith("/messages")
+            latency = claude_ms if claude else openai_ms
+            # Jitter, and now and then a slow call
+            latency *= random.uniform(0.8, 1.2)
+            if random.random() < tail_rate:
+                latency = tail_ms
+            time.sleep(latency / 1000)
+            text = "Reply 1: Lovely, thanks!\nReply 2: Great, and yours?"
+            if claude:
+                body = {
+                    "id": "msg", "type": "message", "role": "assistant", "model": request.get("model"),
+                    "content": [{"type": "text", "text": text}], "stop_reason": "end_turn", "stop_sequence": None,
+                    "usage": {"input_tokens": 10, "output_tokens": 10}
+                }
+            else:
+                body = {
+                    "id": "chatcmpl", "object": "chat.completion", "created": 0, "model": request.get("model"),
+                    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+                    "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20}
+                }
+            data = json.dumps(body).encode()
+            try:
+                self.send_response(200)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            except OSError:
+                # The losing request of a hedge was cancelled
+                pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+def run_mode(hedge, requests, start_number):
+    """Send requests one after another; returns the latencies and how many were hedged"""
+    from fred_us_tools_2 import chat
+
+    latencies = []
+    hedged = 0
+    for number in range(start_number, start_number + requests):
+        usage = {}
+        start = time.perf_counter()
+        chat(prompt(number), [], "openai", usage=usage, hedge=hedge)
+        latencies.append(time.perf_counter() - start)
+        hedged += bool(usage.get("hedged"))
+    return latencies, hedged
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--simulate", action="store_true", help="use a local simulated API instead of the real ones")
+    parser.add_argument("--openai-ms", type=float, default=300, help="simulated OpenAI latency")
+    parser.add_argument("--claude-ms", type=float, default=400, help="simulated Claude latency")
+    parser.add_argument("--tail-ms", type=float, default=3000, help="simulated latency of a slow call")
+    parser.add_argument("--tail-rate", type=float, default=0.04, help="share of slow calls")
+    parser.add_argument("--warmup", type=int, default=30, help="requests that fill the latency histograms first")
+    parser.add_argument("--requests", type=int, default=100, help="requests per mode")
+    args = parser.parse_args()
+
+    # Settings are read from the environment first, so configure before importing
+    os.environ.setdefault("LOCAL_STORE_PATH", ":memory:")
+    if args.simulate:
+        base_url = start_simulated_api(args.openai_ms, args.claude_ms, args.tail_ms, args.tail_rate)
+        os.environ.update({
+            "OPENAI_API_KEY": "simulated", "ANTHROPIC_API_KEY": "simulated",
+            "OPENAI_BASE_URL": f"{base_url}/v1", "ANTHROPIC_BASE_URL": base_url,
+            "PROMPT_CACHE": "false", "LLM_MAX_RETRIES": "0"
+        })
+
+    from utils.latency import hedge_delay
+
+    run_mode(False, args.warmup, 0)
+    results = {"hedge_delay_ms": hedge_delay("openai", "reply") * 1000}
+    for mode, hedge in [("single", False), ("hedged", True)]:
+        latencies, hedged = run_mode(hedge, args.requests, args.warmup + (args.requests if hedge else 0))
+        results[mode] = {
+            "requests": len(latencies),
+            "hedged": hedged,
+            "mean_ms": statistics.mean(latencies) * 1000,
+            "p50_ms": percentile(latencies, 0.5) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000
+        }
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
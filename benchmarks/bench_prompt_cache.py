@@ -0,0 +1,125 @@
+"""
+Prompt-cache reuse of the context on a conversation whose history no longer fits.
+
+Plays a long synthetic conversation turn by turn through
+ConversationContext (one per session, as the app keeps it), builds each
+turn's Claude request and replays the requests against a model of the
+provider caches, once per HISTORY_WINDOW_STEP given:
+
+- Claude: a request reads the longest of its cache breakpoints whose exact
+  prefix an earlier request wrote (prefixes under --min-cache tokens are
+  not cached), and writes all of its breakpoints.
+- OpenAI: a request reads its longest common prefix with an earlier
+  request, in 128-token steps from --min-cache tokens on.
+
+Only turns after the history first stopped fitting are counted. Step 1 is
+the cut-off moving with every turn.
+
+    python benchmarks/bench_prompt_cache.py --turns 200 --steps 1,4,8
+"""
+import argparse
+import json
+import os
+import random
+import sys
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_DIR))
+
+WORDS = ("lovely weekend garden tennis wine jazz dinner weather work travel Cleveland lake music "
+         "family dog sister movie coffee morning evening book kitchen paint market walk").split()
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+def conversation(turns, seed):
+    """Synthetic interactions as the session history holds them"""
+    rng = random.Random(seed)
+    history = []
+    for turn in range(turns):
+        history.append({
+            "timestamp": f"2026-10-{1 + turn // 40:02d} {10 + turn % 40 // 4:02d}:{turn % 4 * 15:02d}:00",
+            "user_message": sentence(rng, rng.randint(6, 30)),
+            "bot_reply": "Reply 1: " + sentence(rng, rng.randint(30, 80)) + "\nReply 2: " + sentence(rng, rng.randint(30, 80)),
+            "summary": sentence(rng, rng.randint(10, 20))
+        })
+    return history
+
+def prefixes(system, messages):
+    """The request text up to each cache breakpoint, and the whole request text"""
+    def text(block):
+        return block["text"] if isinstance(block, dict) else block
+    marks = []
+    done = ""
+    for block in system:
+        done += text(block)
+        if block.get("cache_control"):
+            marks.append(done)
+    for message in messages:
+        content = message["content"] if isinstance(message["content"], list) else [message["content"]]
+        done += f"\n{message['role']}: "
+        for block in content:
+            done += text(block)
+            if isinstance(block, dict) and block.get("cache_control"):
+                marks.append(done)
+    return marks, done
+
+def common_prefix(a, b):
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return length
+
+def run(step, history, budget, min_cache):
+    os.environ["HISTORY_WINDOW_STEP"] = str(step)
+    from fred_us_tools_2 import build_claude_request
+    from utils.context_builder import ConversationContext, count_tokens
+
+    context = ConversationContext("Bench")
+    claude_cache = set()
+    earlier = []
+    totals = {"turns": 0, "input_tokens": 0, "claude_cache_read": 0, "openai_cache_read": 0}
+    saturated = False
+    for turn in range(1, len(history)):
+        parts, report = context.build("", history[:turn], history[turn]["user_message"], budget=budget)
+        saturated = saturated or report["omitted_turns"] > 0 or report["summarized_turns"] > 0
+        system, messages = build_claude_request(parts, [])
+        marks, whole = prefixes(system, messages)
+
+        read = max((count_tokens(mark) for mark in marks if mark in claude_cache), default=0)
+        claude_cache.update(mark for mark in marks if count_tokens(mark) >= min_cache)
+        shared = max((common_prefix(whole, text) for text in earlier[-4:]), default=0)
+        shared_tokens = count_tokens(whole[:shared]) // 128 * 128
+        earlier.append(whole)
+        if not saturated:
+            continue
+        totals["turns"] += 1
+        totals["input_tokens"] += count_tokens(whole)
+        totals["claude_cache_read"] += read
+        totals["openai_cache_read"] += shared_tokens if shared_tokens >= min_cache else 0
+    return {
+        "saturated_turns": totals["turns"],
+        "claude_cache_read_share": totals["claude_cache_read"] / max(totals["input_tokens"], 1),
+        "openai_cache_read_share": totals["openai_cache_read"] / max(totals["input_tokens"], 1),
+        "avg_input_tokens": totals["input_tokens"] / max(totals["turns"], 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=200, help="turns of the conversation")
+    parser.add_argument("--budget", type=int, default=6000, help="CONTEXT_TOKEN_BUDGET")
+    parser.add_argument("--steps", default="1,4,8", help="HISTORY_WINDOW_STEP values to compare")
+    parser.add_argument("--min-cache", type=int, default=1024, help="shortest cached prefix in tokens")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    os.environ.setdefault("LOCAL_STORE_PATH", ":memory:")
+    history = conversation(args.turns, args.seed)
+    results = {f"step_{step}": run(int(step), history, args.budget, args.min_cache) for step in args.steps.split(",")}
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Recall and latency of the retrieval memory on synthetic client histories.
+
+Builds histories of small talk with personal facts planted at random
+turns ("my dog Biscuit...", "my sister Clara..."), indexes them with
+utils/vector_memory.py in a temporary directory and asks one question per
+fact that mentions it in other words but shares its key names. Reports
+recall@k (the fact's turn is among the k retrieved), search and append
+latency, and the recall of simply taking the k most recent turns.
+
+    python benchmarks/bench_retrieval.py --sizes 1000,10000,50000 --facts 50
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_DIR))
+
+NAMES = ["Biscuit", "Clara", "Mateo", "Pepper", "Juniper", "Otis", "Marisol", "Theo", "Luna", "Rufus",
+         "Ingrid", "Kofi", "Priya", "Hamish", "Noor", "Waffles", "Beatrix", "Dmitri", "Saffron", "Ziggy"]
+FACTS = [
+    ("My dog {name} chewed through my favourite slippers again.", "How is {name} the dog doing these days?"),
+    ("My sister {name} is getting married next spring in Lisbon.", "Any news about {name}'s wedding plans?"),
+    ("My cat {name} has been sleeping in the laundry basket.", "Is {name} still napping in odd places?"),
+    ("My neighbour {name} keeps parking in front of my garage.", "Did you sort things out with {name} about the parking?"),
+    ("I started learning the cello with a teacher called {name}.", "How are the cello lessons with {name} going?"),
+    ("My son {name} scored his first goal at football.", "Has {name} played any more football matches?"),
+]
+SMALL_TALK = [
+    "The weather has been so grey all week.", "I made pasta for dinner last night.",
+    "Work was pretty busy today.", "I watched a documentary about whales.",
+    "Traffic on the way home was terrible.", "I finally cleaned out the fridge.",
+    "Do you have any tips for sleeping better?", "I am thinking about repainting the kitchen.",
+    "The new coffee place downtown is nice.", "I went for a long walk in the park.",
+]
+
+def synthetic_history(size, facts, rng):
+    """Build a history of size interactions with facts planted at random turns"""
+    history = []
+    for index in range(size):
+        message = rng.choice(SMALL_TALK)
+        history.append({
+            "timestamp": f"2026-01-01 00:00:{index:08d}",
+            "user_message": message,
+            "summary": f"The reply chats about: {message.lower()}"
+        })
+    questions = []
+    for turn in rng.sample(range(size), min(facts, size)):
+        statement, question = rng.choice(FACTS)
+        name = f"{rng.choice(NAMES)}{turn}"
+        history[turn]["user_message"] = statement.format(name=name)
+        history[turn]["summary"] = f"Fred reacts warmly to news about {name}."
+        questions.append((question.format(name=name), history[turn]["timestamp"]))
+    return history, questions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000", help="comma-separated history sizes")
+    parser.add_argument("--facts", type=int, default=50, help="planted facts per history")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Settings are read from the environment first, so configure before importing
+        os.environ["VECTOR_MEMORY_DIR"] = directory
+        from utils.vector_memory import get_index
+
+        results = []
+        for size in [int(size) for size in args.sizes.split(",")]:
+            rng = random.Random(args.seed)
+            history, questions = synthetic_history(size, args.facts, rng)
+            index = get_index(f"synthetic-{size}")
+
+            start = time.perf_counter()
+            for offset in range(0, size, 500):
+                index.add(history[offset:offset + 500])
+            append_seconds = time.perf_counter() - start
+
+            hits, latencies = 0, []
+            for question, timestamp in questions:
+                start = time.perf_counter()
+                found = index.search(question, k=args.k)
+                latencies.append(time.perf_counter() - start)
+                hits += any(meta["timestamp"] == timestamp for _, meta in found)
+
+            recent = {interaction["timestamp"] for interaction in history[-args.k:]}
+            results.append({
+                "size": size,
+                "questions": len(questions),
+                f"recall@{args.k}": hits / len(questions),
+                f"recent_{args.k}_recall": sum(timestamp in recent for _, timestamp in questions) / len(questions),
+                "search_mean_ms": statistics.mean(latencies) * 1000,
+                "search_p95_ms": sorted(latencies)[int(len(latencies) * 0.95)] * 1000,
+                "append_per_1000_ms": append_seconds / size * 1000 * 1000,
+                "index_mb": index.vectors_path.stat().st_size / 2 ** 20,
+            })
+
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Compare the local extractive summarizer with the recorded GPT-4 summaries.
+
+Reads a recorded corpus - the CSV export of the chat history viewer
+("AI Response", "Summary") or a CSV download of a client sheet
+("Final Reply", "Summarized Reply") - summarizes every reply with
+utils/extractive_summarizer.py and reports its latency and its unigram
+overlap (ROUGE-1 style precision, recall and F1 over content words) with
+the recorded LLM summaries.
+
+With --llm N, the first N replies are also summarized live with
+summarize_message() to compare latency (needs OPENAI_API_KEY):
+
+    python benchmarks/bench_summarizer.py client_chat_history.csv --llm 5
+"""
+import argparse
+import csv
+import json
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_DIR))
+
+from utils.extractive_summarizer import summarize_extractive, tokenize
+
+TEXT_COLUMNS = ["AI Response", "Final Reply"]
+SUMMARY_COLUMNS = ["Summary", "Summarized Reply"]
+
+def load_corpus(path):
+    """Get (reply, recorded summary) pairs from a CSV export"""
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        text_column = next((c for c in TEXT_COLUMNS if c in reader.fieldnames), None)
+        summary_column = next((c for c in SUMMARY_COLUMNS if c in reader.fieldnames), None)
+        if not text_column or not summary_column:
+            raise SystemExit(f"{path} needs one of {TEXT_COLUMNS} and one of {SUMMARY_COLUMNS}")
+        return [
+            (row[text_column], row[summary_column])
+            for row in reader
+            if row[text_column] and row[summary_column] and not row[summary_column].startswith("Error")
+        ]
+
+def overlap(candidate, reference):
+    """Unigram precision, recall and F1 of candidate against reference"""
+    candidate_counts = Counter(tokenize(candidate))
+    reference_counts = Counter(tokenize(reference))
+    common = sum((candidate_counts & reference_counts).values())
+    if not common:
+        return 0.0, 0.0, 0.0
+    precision = common / sum(candidate_counts.values())
+    recall = common / sum(reference_counts.values())
+    return precision, recall, 2 * precision * recall / (precision + recall)
+
+def latency_stats(samples):
+    ordered = sorted(samples)
+    return {
+        "mean_ms": statistics.mean(ordered) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("corpus", help="CSV export with replies and recorded summaries")
+    parser.add_argument("--max-sentences", type=int, default=2)
+    parser.add_argument("--llm", type=int, default=0, help="also summarize the first N replies with the LLM")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        raise SystemExit("No replies with recorded summaries found")
+
+    latencies, scores = [], []
+    for reply, recorded in corpus:
+        start = time.perf_counter()
+        summary = summarize_extractive(reply, max_sentences=args.max_sentences)
+        latencies.append(time.perf_counter() - start)
+        scores.append(overlap(summary, recorded))
+
+    report = {
+        "replies": len(corpus),
+        "extractive": {
+            **latency_stats(latencies),
+            "precision": statistics.mean(s[0] for s in scores),
+            "recall": statistics.mean(s[1] for s in scores),
+            "f1": statistics.mean(s[2] for s in scores),
+        },
+    }
+
+    if args.llm:
+        os.environ["SUMMARIZER"] = "llm"
+        from fred_us_tools_2 import summarize_message, SUMMARY_PROMPT, MODEL
+        from utils.summary_cache import get_cached_summary
+
+        llm_latencies = []
+        for reply, _ in corpus[:args.llm]:
+            if get_cached_summary(MODEL, SUMMARY_PROMPT, reply) is not None:
+                continue  # A cache hit would not measure the API
+            start = time.perf_counter()
+            summarize_message(reply)
+            llm_latencies.append(time.perf_counter() - start)
+        if llm_latencies:
+            report["llm"] = latency_stats(llm_latencies)
+            report["speedup"] = report["llm"]["mean_ms"] / report["extractive"]["mean_ms"]
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Cold-start benchmark for the Streamlit app.
+
+Measures time-to-first-render of streamlit_app.main() with the bundled,
+pre-parsed discovery documents ("bundled") and with googleapiclient's own
+per-build discovery lookup ("library"). Every sample runs in a fresh
+interpreter so module imports and process-wide caches start cold.
+
+Run from the project root with .streamlit/secrets.toml configured:
+
+    python benchmarks/startup_benchmark.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).parent.parent
+MODES = ["library", "bundled"]
+
+def measure_first_render():
+    """Time a single cold render of the app, in the current interpreter"""
+    from streamlit.testing.v1 import AppTest
+
+    start = time.perf_counter()
+    app = AppTest.from_file(str(PROJECT_DIR / "streamlit_app.py"), default_timeout=120)
+    app.run()
+    first_render = time.perf_counter() - start
+
+    start = time.perf_counter()
+    app.run()
+    rerun = time.perf_counter() - start
+
+    return {
+        "first_render": first_render,
+        "rerun": rerun,
+        "exceptions": [str(e.value) for e in app.exception],
+    }
+
+def measure_service_builds():
+    """Time building the Sheets, Docs and Drive services twice each"""
+    import httplib2
+    import google_services
+
+    timings = {}
+    for api, version in [("sheets", "v4"), ("docs", "v1"), ("drive", "v3")]:
+        samples = []
+        for _ in range(2):
+            start = time.perf_counter()
+            google_services.build_service(api, version, http=httplib2.Http())
+            samples.append(time.perf_counter() - start)
+        timings[f"{api}.{version}"] = samples
+    return timings
+
+def run_child(mode):
+    """Collect one sample in a subprocess with the given discovery mode"""
+    env = dict(os.environ, GOOGLE_DISCOVERY=mode)
+    output = subprocess.run(
+        [sys.executable, __file__, "--child"],
+        cwd=PROJECT_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="cold starts per mode")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, str(PROJECT_DIR))
+        result = measure_first_render()
+        result["service_builds"] = measure_service_builds()
+        print(json.dumps(result))
+        return
+
+    for mode in MODES:
+        samples = [run_child(mode) for _ in range(args.runs)]
+        first = [s["first_render"] * 1000 for s in samples]
+        rerun = [s["rerun"] * 1000 for s in samples]
+        print(f"{mode:>8}: first render median {statistics.median(first):8.1f} ms "
+              f"(min {min(first):.1f}, max {max(first):.1f}), "
+              f"warm rerun median {statistics.median(rerun):8.1f} ms")
+        for api, builds in samples[-1]["service_builds"].items():
+            print(f"{'':>10}{api}: cold build {builds[0] * 1000:.2f} ms, warm build {builds[1] * 1000:.2f} ms")
+        if samples[-1]["exceptions"]:
+            print(f"{'':>10}app raised: {samples[-1]['exceptions']}")
+
+if __name__ == "__main__":
+    main()
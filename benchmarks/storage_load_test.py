@@ -0,0 +1,145 @@
+"""
+Offline load test of the storage path against the fake Sheets server.
+
+Simulates several operators chatting at once: each one loads a client's
+history, then records turns (a new interaction followed by a Save Reply
+upsert of the same one) through the background writer. Reports the latency
+the operators see, how many Sheets requests the writer needed and how many
+were throttled by the simulated quota.
+
+No credentials are needed; the fake backend runs in-process:
+
+    python benchmarks/storage_load_test.py --operators 8 --turns 10
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).parent.parent
+
+def percentile(samples, fraction):
+    """Get a percentile of the samples (nearest rank)"""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def summarize(samples):
+    return {
+        "count": len(samples),
+        "mean_ms": statistics.mean(samples) * 1000 if samples else None,
+        "p95_ms": percentile(samples, 0.95) * 1000 if samples else None,
+    }
+
+def run_operator(operator, turns, think_time, timings):
+    """One operator: load the client's history, then chat and save replies"""
+    from utils.history_cache import load_rows
+    from utils.write_behind import enqueue_interaction
+
+    client_name = f"Client {operator}"
+    session_id = f"session-{operator}"
+
+    start = time.perf_counter()
+    load_rows(client_name)
+    timings["load"].append(time.perf_counter() - start)
+
+    for turn in range(turns):
+        interaction = {
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'session_id': session_id,
+            'user_message': f"Message {turn} from operator {operator}",
+            'reply1': "Reply 1",
+            'reply2': "Reply 2",
+            'final_reply': "",
+            'summary': "Summary"
+        }
+        start = time.perf_counter()
+        enqueue_interaction(client_name, interaction)
+        timings["save"].append(time.perf_counter() - start)
+
+        time.sleep(think_time)
+        interaction['final_reply'] = "Reply 1"
+        start = time.perf_counter()
+        enqueue_interaction(client_name, interaction)
+        timings["save"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        load_rows(client_name)
+        timings["load"].append(time.perf_counter() - start)
+        time.sleep(think_time)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--operators", type=int, default=5, help="concurrent operators")
+    parser.add_argument("--turns", type=int, default=10, help="turns per operator")
+    parser.add_argument("--think-time", type=float, default=0.2, help="seconds between actions")
+    parser.add_argument("--latency-ms", type=float, default=150.0, help="simulated Sheets round trip")
+    parser.add_argument("--quota", type=int, default=60, help="Sheets read and write requests per minute")
+    parser.add_argument("--limiter-quota", type=int, help="quota the client-side limiter assumes (default: --quota)")
+    args = parser.parse_args()
+
+    # Settings are read from the environment first, so configure before importing
+    os.environ.update({
+        "STORAGE_BACKEND": "fake",
+        "SPREADSHEET_ID": "load-test",
+        "FAKE_SHEETS_LATENCY_MS": str(args.latency_ms),
+        "FAKE_SHEETS_READ_QUOTA": str(args.quota),
+        "FAKE_SHEETS_WRITE_QUOTA": str(args.quota),
+        "GOOGLE_READ_QUOTA": str(args.limiter_quota or args.quota),
+        "GOOGLE_WRITE_QUOTA": str(args.limiter_quota or args.quota),
+    })
+    sys.path.insert(0, str(PROJECT_DIR))
+
+    from utils.fake_sheets import get_fake_sheets_service
+    from utils.rate_limiter import get_rate_limiter_stats
+    from utils.storage import get_storage
+    from utils import local_store
+    from utils.write_behind import get_write_queue_stats, start_writer
+
+    storage = get_storage()
+    for operator in range(args.operators):
+        storage.create_client(f"Client {operator}")
+    fake = get_fake_sheets_service()
+    setup_requests = dict(fake.stats)
+    start_writer()
+
+    timings = {"load": [], "save": []}
+    threads = [
+        threading.Thread(target=run_operator, args=(operator, args.turns, args.think_time, timings))
+        for operator in range(args.operators)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Wait for the background writer to empty the journal
+    deadline = time.monotonic() + 120
+    while local_store.journal_depth() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    drained = not local_store.journal_depth()
+    elapsed = time.perf_counter() - start
+
+    rows = sum(len(storage.load_history(f"Client {operator}")) - 1 for operator in range(args.operators))
+    report = {
+        "operators": args.operators,
+        "turns": args.operators * args.turns,
+        "elapsed_s": elapsed,
+        "drained": drained,
+        "rows_in_sheets": rows,
+        "load_history": summarize(timings["load"]),
+        "save_interaction": summarize(timings["save"]),
+        "sheets_requests": {
+            kind: fake.stats[kind] - setup_requests[kind] for kind in ("read", "write", "throttled")
+        },
+        "write_queue": get_write_queue_stats(),
+        "rate_limiter": get_rate_limiter_stats(),
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
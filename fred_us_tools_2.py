@@ -2,25 +2,85 @@
 # coding: utf-8
 
 import os
+import re
 import json
+import time
+import asyncio
 import requests
 from bs4 import BeautifulSoup
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Iterator, AsyncIterator, Optional, Union
 from dotenv import load_dotenv
 from openai import OpenAI
 import anthropic
 import streamlit as st
 import google.auth
-from googleapiclient.discovery import build
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 from googleapiclient.errors import HttpError
 import pickle
 from datetime import datetime
+# Sheets storage helpers live in google_services (backed by utils/storage.py);
+# re-exported here for existing callers
+from google_services import (
+    build_service,
+    check_sheet_exists,
+    create_sheet,
+    get_all_sheet_names,
+    save_to_sheets
+)
+from utils.rate_limiter import execute_request
+from utils.summary_cache import get_cached_summary, store_summary
+from utils.settings import get_setting, get_bool_setting
+from utils.extractive_summarizer import summarize_extractive
+from utils.context_builder import PromptParts
+from utils.llm_clients import get_llm_client, get_async_llm_client
+from utils.latency import record_latency, hedge_delay
+from utils.async_bridge import run_async, iterate_async, merge_async
 
 # Model configuration
 MODEL = 'gpt-4'
+OPENAI_CHAT_MODEL = "gpt-4-turbo-preview"
+CLAUDE_MODEL = "claude-3-opus-20240229"
+PROVIDER_NAMES = {"openai": "OpenAI", "claude": "Claude"}
+SUMMARY_PROMPT = "Create a brief 1-2 sentence summary of the following message:"
+MEMORY_PROMPT = (
+    "Condense these notes about past conversations with a client (each the client's message and "
+    "a summary of your reply) into a short digest. Keep names, pets, family, preferences, plans and "
+    "other personal details, above all those the client shared; drop small talk."
+)
+
+# Structured generation: both replies and the summary from one tool call
+REPLIES_TOOL_NAME = "submit_replies"
+REPLIES_TOOL_DESCRIPTION = "Submit two different replies to the message and a brief summary of them."
+REPLIES_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "reply1": {"type": "string", "description": "The first reply"},
+        "reply2": {"type": "string", "description": "A second, different reply"},
+        "summary": {"type": "string", "description": "A brief 1-2 sentence summary of the replies"}
+    },
+    "required": ["reply1", "reply2", "summary"]
+}
+STRUCTURED_INSTRUCTION = (
+    "\n\nAlways answer by calling the submit_replies tool with two different replies "
+    "and a brief 1-2 sentence summary of them."
+)
+
+# Split generation: Reply 1 and Reply 2 from two concurrent requests, one
+# tone each. These requests have a system prompt and preamble of their own
+# that ask for one reply; the tone goes after the cached prompt prefix, so
+# both requests share that prefix.
+REPLY_TONES = (
+    "warm and lighthearted, with a touch of humor",
+    "thoughtful and heartfelt, ending with a question that keeps the conversation going"
+)
+SINGLE_REPLY_INSTRUCTION = "\n\nWrite your reply {tone}."
+SINGLE_REPLY_OVERRIDE = (
+    "\n\nIgnore any instruction above to give two replies or to use the \"Reply 1:\"/\"Reply 2:\" "
+    "format: answer with ONE reply, as the reply text alone."
+)
+SINGLE_REPLY_STOP = "\nReply 2:"
 
 # Google API scopes
 SCOPES = [
@@ -33,9 +93,7 @@ SCOPES = [
 SPREADSHEET_ID = st.secrets["SPREADSHEET_ID"]
 
 # System messages
-system_message = """You are Fred, a helpful AI assistant. You MUST provide exactly two different responses to each user message.
-
-Your Role: You are a 51-year-old American businessman named Fred (full name: Frederick Allen Hampton) from Nashville, Tennessee, who has successfully run a family business specializing in tiles, marbles, and stones for years across the US and UK.
+FRED_PERSONA = """Your Role: You are a 51-year-old American businessman named Fred (full name: Frederick Allen Hampton) from Nashville, Tennessee, who has successfully run a family business specializing in tiles, marbles, and stones for years across the US and UK.
 
 Your background: Your dad is half Irish and half English, and your mom is from Nashville. Your dad founded Allen Marbles in the UK, and he fell in love with your mom during a business trip to Nashville. After his retirement, you took over the company and grew it to a successful business.
 
@@ -45,7 +103,11 @@ Your personality: You are confident, romantic, and active. You enjoy playing ten
 
 Your goals: You are seeking a serious, committed relationship, possibly starting a family 👨‍👩‍👧‍👦, with a partner who shares your vision for the future. Your dating profile highlights your interest in intimate, romantic evenings, such as a cozy evening at a jazz club sharing a glass of wine, reflecting your desire for a deep connection.
 
-IMPORTANT: You must remember and refer to any details that users have shared with you previously (like their name, preferences, pets, etc). For example, if a user mentioned they have a dog named Max in a previous conversation, you should remember this and refer to it if relevant.
+IMPORTANT: You must remember and refer to any details that users have shared with you previously (like their name, preferences, pets, etc). For example, if a user mentioned they have a dog named Max in a previous conversation, you should remember this and refer to it if relevant."""
+
+system_message = f"""You are Fred, a helpful AI assistant. You MUST provide exactly two different responses to each user message.
+
+{FRED_PERSONA}
 
 Your response MUST follow this EXACT format:
 Reply 1: [Your first response here]
@@ -53,18 +115,24 @@ Reply 2: [Your second, alternative response here]
 
 Both replies must be complete, thoughtful responses but with different approaches or tones, while staying true to your personality as Fred. Never skip providing both replies. Never deviate from this format."""
 
-def get_openai_client():
-    """Get OpenAI client with proper error handling."""
+single_reply_system_message = f"""You are Fred, a helpful AI assistant. You write one response to each user message.
+
+{FRED_PERSONA}
+
+Answer with the reply text alone, without a "Reply 1:" label and without a second reply. Your reply must be a complete, thoughtful response that stays true to your personality as Fred."""
+
+def get_openai_client(operation: str = "chat"):
+    """Get the shared OpenAI client for an operation ("chat", "stream" or "summary") with proper error handling."""
     try:
-        return OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
+        return get_llm_client("openai", operation)
     except Exception as e:
         st.error(f"Error initializing OpenAI client: {str(e)}")
         return None
 
-def get_anthropic_client():
-    """Get Anthropic client with proper error handling."""
+def get_anthropic_client(operation: str = "chat"):
+    """Get the shared Anthropic client for an operation ("chat", "stream" or "summary") with proper error handling."""
     try:
-        return anthropic.Anthropic(api_key=st.secrets["ANTHROPIC_API_KEY"])
+        return get_llm_client("claude", operation)
     except Exception as e:
         st.error(f"Error initializing Anthropic client: {str(e)}")
         return None
@@ -91,87 +159,17 @@ def get_google_credentials():
 def get_sheet_service():
     """Get Google Sheets API service."""
     creds = get_google_credentials()
-    return build('sheets', 'v4', credentials=creds)
+    return build_service('sheets', 'v4', credentials=creds)
 
 def get_docs_service():
     """Get Google Docs API service."""
     creds = get_google_credentials()
-    return build('docs', 'v1', credentials=creds)
+    return build_service('docs', 'v1', credentials=creds)
 
 def get_drive_service():
     """Get Google Drive API service."""
     creds = get_google_credentials()
-    return build('drive', 'v3', credentials=creds)
-
-def check_sheet_exists(sheet_service, spreadsheet_id: str, sheet_name: str) -> bool:
-    """Check if a sheet exists in the spreadsheet."""
-    try:
-        spreadsheet = sheet_service.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
-        return any(sheet['properties']['title'] == sheet_name for sheet in spreadsheet.get('sheets', []))
-    except Exception as e:
-        print(f"Error checking sheet existence: {e}")
-        return False
-
-def create_sheet(sheet_service, spreadsheet_id: str, sheet_name: str) -> bool:
-    """Create a new sheet with headers."""
-    try:
-        request = {
-            'addSheet': {
-                'properties': {
-                    'title': sheet_name
-                }
-            }
-        }
-        body = {'requests': [request]}
-        sheet_service.spreadsheets().batchUpdate(
-            spreadsheetId=spreadsheet_id,
-            body=body
-        ).execute()
-
-        # Add headers
-        values = [['Timestamp', 'Client', 'Message', 'Reply 1', 'Reply 2', 'Final Reply', 'Summarized Reply']]
-        body = {'values': values}
-        sheet_service.spreadsheets().values().update(
-            spreadsheetId=spreadsheet_id,
-            range=f"{sheet_name}!A1:G1",
-            valueInputOption='RAW',
-            body=body
-        ).execute()
-        return True
-    except Exception as e:
-        print(f"Error creating sheet: {e}")
-        return False
-
-def get_all_sheet_names() -> List[str]:
-    """Get all sheet names from the spreadsheet."""
-    try:
-        sheet_service = get_sheet_service()
-        spreadsheet = sheet_service.spreadsheets().get(spreadsheetId=SPREADSHEET_ID).execute()
-        return [sheet['properties']['title'] for sheet in spreadsheet.get('sheets', [])]
-    except Exception as e:
-        print(f"Error getting sheet names: {e}")
-        return ["Example Client"]
-
-def save_to_sheets(sheet_service, client_name: str, message: str, reply: str, summary: str) -> bool:
-    """Save a conversation entry to sheets."""
-    try:
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        values = [[timestamp, client_name, message, "", "", reply, summary]]
-        result = sheet_service.spreadsheets().values().get(
-            spreadsheetId=SPREADSHEET_ID,
-            range=f"{client_name}!A:A"
-        ).execute()
-        next_row = len(result.get('values', [])) + 1
-        sheet_service.spreadsheets().values().update(
-            spreadsheetId=SPREADSHEET_ID,
-            range=f"{client_name}!A{next_row}:G{next_row}",
-            valueInputOption='RAW',
-            body={'values': values}
-        ).execute()
-        return True
-    except Exception as e:
-        print(f"Error saving to sheets: {e}")
-        return False
+    return build_service('drive', 'v3', credentials=creds)
 
 def save_to_docs(docs_service, drive_service, client_name: str, content: str) -> Dict[str, str]:
     """Save content to a new Google Doc and return its URL."""
@@ -181,7 +179,7 @@ def save_to_docs(docs_service, drive_service, client_name: str, content: str) ->
         document = {
             'title': doc_title
         }
-        doc = docs_service.documents().create(body=document).execute()
+        doc = execute_request(docs_service.documents().create(body=document), "docs", idempotent=False)
         doc_id = doc.get('documentId')
 
         # Insert the content
@@ -195,10 +193,10 @@ def save_to_docs(docs_service, drive_service, client_name: str, content: str) ->
                 }
             }
         ]
-        docs_service.documents().batchUpdate(
+        execute_request(docs_service.documents().batchUpdate(
             documentId=doc_id,
             body={'requests': requests}
-        ).execute()
+        ), "docs", idempotent=False)
 
         # Get the document URL
         doc_url = f"https://docs.google.com/document/d/{doc_id}/edit"
@@ -214,35 +212,53 @@ def save_to_docs(docs_service, drive_service, client_name: str, content: str) ->
             "message": str(e)
         }
 
+def _local_summary(message: str) -> Optional[str]:
+    """Get the summary of a message if it needs no API call, else None."""
+    if not message:
+        return ""
+        
+    # SUMMARIZER=extractive summarizes locally instead of calling GPT-4
+    if get_setting("SUMMARIZER", "llm") == "extractive":
+        return summarize_extractive(message)
+        
+    # Identical text summarized before costs nothing
+    return get_cached_summary(MODEL, SUMMARY_PROMPT, message)
+
+def summary_request(message: str) -> Dict[str, Any]:
+    """Keyword arguments of the chat completion that summarizes a message."""
+    return {
+        "model": MODEL,
+        "messages": [
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": message}
+        ],
+        "max_tokens": 100,
+        "temperature": 0.5  # Lower temperature for more focused summaries
+    }
+
 def summarize_message(message: str) -> str:
     """Create a brief summary of a message."""
     try:
-        if not message:
-            return ""
+        summary = _local_summary(message)
+        if summary is not None:
+            return summary
             
         # Log the attempt to create summary
         print(f"Attempting to summarize message: {message[:100]}...")
         
         # Get OpenAI client
-        client = get_openai_client()
+        client = get_openai_client("summary")
         if not client:
             error_msg = "Failed to initialize OpenAI client"
             print(error_msg)
             st.error(error_msg)
             return "Error creating summary"
             
-        response = client.chat.completions.create(
-            model=MODEL,
-            messages=[
-                {"role": "system", "content": "Create a brief 1-2 sentence summary of the following message:"},
-                {"role": "user", "content": message}
-            ],
-            max_tokens=100,
-            temperature=0.5  # Lower temperature for more focused summaries
-        )
+        response = client.chat.completions.create(**summary_request(message))
         
         summary = response.choices[0].message.content
         print(f"Successfully created summary: {summary}")
+        store_summary(MODEL, SUMMARY_PROMPT, message, summary)
         return summary
         
     except Exception as e:
@@ -251,7 +267,172 @@ def summarize_message(message: str) -> str:
         st.error(error_msg)
         return "Error creating summary"
 
-def chat_with_openai(message: str, history: List[tuple]) -> str:
+def condense_memory(notes: str, previous_digest: Optional[str] = None) -> str:
+    """Condense conversation notes into a memory digest, merged with a previous digest. Raises on failure."""
+    text = f"Existing digest:\n{previous_digest}\n\nNew notes:\n{notes}" if previous_digest else notes
+    if get_setting("SUMMARIZER", "llm") == "extractive":
+        return summarize_extractive(text, max_sentences=6, max_chars=1200)
+        
+    client = get_openai_client("summary")
+    if not client:
+        raise RuntimeError("Failed to initialize OpenAI client")
+    response = client.chat.completions.create(
+        model=MODEL,
+        messages=[
+            {"role": "system", "content": MEMORY_PROMPT},
+            {"role": "user", "content": text}
+        ],
+        max_tokens=300,
+        temperature=0.3
+    )
+    return response.choices[0].message.content
+
+def split_prompt(message: Union[str, PromptParts]) -> Tuple[str, str, str, str]:
+    """Get the system prompt, the history part, the current part and the recent history turns of a prompt.
+
+    message is either PromptParts from the context builder or a plain
+    string, which may be a whole context to split; a plain string has no
+    separate current part or recent turns.
+    """
+    if isinstance(message, PromptParts):
+        # Only use custom prompt if it's not empty
+        system_content = message.system if message.system.strip() else system_message
+        return system_content, message.history, message.current, message.recent
+        
+    system_content = system_message
+    user_message = message
+    if "You are currently chatting with" in message:
+        # This is a context message, extract the system prompt part
+        parts = message.split("\n\nYou are currently chatting with")
+        if len(parts) > 1 and parts[0].strip():  # Only use custom prompt if it's not empty
+            system_content = parts[0]
+        user_message = "You are currently chatting with" + parts[1]
+    return system_content, user_message, "", ""
+
+def _chat_messages(prompt_content: Any, history: List[tuple], single_reply: bool = False) -> List[Dict[str, Any]]:
+    if single_reply:
+        preamble = [
+            {"role": "user", "content": "When I send a message, give me one reply, with no \"Reply 1:\" label."},
+            {"role": "assistant", "content": "Understood. I will answer each message with a single reply and nothing else."}
+        ]
+    else:
+        preamble = [
+            {"role": "user", "content": "When I send a message, give me two different responses in the exact format specified."},
+            {"role": "assistant", "content": "Reply 1: I understand that I must provide two different responses to your messages.\nReply 2: Let me confirm that I will always give two distinct replies to what you say."}
+        ]
+    formatted_messages = preamble + [{"role": "user", "content": prompt_content}]
+    
+    # Add history if exists
+    if history:
+        for msg, response in history:
+            formatted_messages.extend([
+                {"role": "user", "content": msg},
+                {"role": "assistant", "content": response}
+            ])
+    return formatted_messages
+
+def build_chat_messages(message: Union[str, PromptParts], history: List[tuple], single_reply: bool = False) -> Tuple[str, List[Dict[str, str]]]:
+    """Get the system prompt and the chat messages (without the system message) for a prompt.
+
+    single_reply uses the preamble of single_reply_prompt() prompts.
+    """
+    system_content, prefix, current, recent = split_prompt(message)
+    # The prompt prefix stays the same from turn to turn, so OpenAI can reuse it from its prompt cache
+    return system_content, _chat_messages("Great! Now respond to this: " + prefix + recent + current, history, single_reply)
+
+def build_claude_request(message: Union[str, PromptParts], history: List[tuple], system_suffix: str = "", single_reply: bool = False) -> Tuple[Any, List[Dict[str, Any]]]:
+    """Get the system and messages for Claude, with prompt-cache breakpoints.
+
+    The breakpoints mark the end of the system prompt, of the history
+    part that stays the same for several turns and of the recent turns
+    after it, so later turns read the first two, and retries and parallel
+    requests of this turn all three, from the cache instead of processing
+    them again. PROMPT_CACHE=false sends them unmarked.
+    """
+    system_content, prefix, current, recent = split_prompt(message)
+    system_content += system_suffix
+    if not get_bool_setting("PROMPT_CACHE", True):
+        return system_content, _chat_messages("Great! Now respond to this: " + prefix + recent + current, history, single_reply)
+        
+    cache = {"type": "ephemeral"}
+    prompt_content = [{"type": "text", "text": "Great! Now respond to this: " + prefix, "cache_control": cache}]
+    if recent:
+        prompt_content.append({"type": "text", "text": recent, "cache_control": cache})
+    if current:
+        prompt_content.append({"type": "text", "text": current})
+    system = [{"type": "text", "text": system_content, "cache_control": cache}]
+    return system, _chat_messages(prompt_content, history, single_reply)
+
+def record_usage(usage: Optional[Dict[str, Any]], provider: str, response_usage: Any) -> None:
+    """Log a response's token counts, prompt cache reads and writes included, and copy them into usage."""
+    if response_usage is None:
+        return
+    if provider == "Claude":
+        cache_read = getattr(response_usage, "cache_read_input_tokens", None) or 0
+        cache_write = getattr(response_usage, "cache_creation_input_tokens", None) or 0
+        input_tokens = response_usage.input_tokens + cache_read + cache_write
+        output_tokens = response_usage.output_tokens
+    else:
+        details = getattr(response_usage, "prompt_tokens_details", None)
+        cache_read = (getattr(details, "cached_tokens", None) or 0) if details else 0
+        cache_write = None  # OpenAI caches automatically and does not report writes
+        input_tokens = response_usage.prompt_tokens
+        output_tokens = response_usage.completion_tokens
+    print(
+        f"{provider} usage: {input_tokens} input tokens ({cache_read} from cache"
+        + (f", {cache_write} written to cache" if cache_write is not None else "")
+        + f"), {output_tokens} output tokens"
+    )
+    if usage is not None:
+        usage.update({
+            "input_tokens": input_tokens,
+            "cache_read_tokens": cache_read,
+            "cache_write_tokens": cache_write,
+            "output_tokens": output_tokens
+        })
+
+def openai_chat_request(message: Union[str, PromptParts], history: List[tuple], single_reply: bool = False) -> Dict[str, Any]:
+    """Keyword arguments of an OpenAI chat completion for a prompt.
+
+    single_reply requests (see single_reply_prompt()) stop before a second reply.
+    """
+    system_content, formatted_messages = build_chat_messages(message, history, single_reply)
+    request = {
+        "model": OPENAI_CHAT_MODEL,
+        "messages": [{"role": "system", "content": system_content}] + formatted_messages,
+        "temperature": 0.7,
+        "max_tokens": 2000
+    }
+    if single_reply:
+        request["stop"] = [SINGLE_REPLY_STOP]
+    return request
+
+def claude_chat_request(message: Union[str, PromptParts], history: List[tuple], single_reply: bool = False) -> Dict[str, Any]:
+    """Keyword arguments of a Claude message for a prompt.
+
+    single_reply requests (see single_reply_prompt()) stop before a second reply.
+    """
+    system, formatted_messages = build_claude_request(message, history, single_reply=single_reply)
+    request = {
+        "model": CLAUDE_MODEL,
+        "messages": formatted_messages,
+        "system": system,
+        "max_tokens": 2000,
+        "temperature": 0.7
+    }
+    if single_reply:
+        request["stop_sequences"] = [SINGLE_REPLY_STOP]
+    return request
+
+def ensure_reply_format(response_text: str, provider: str) -> str:
+    """Make sure a response has both replies."""
+    if "Reply 1:" not in response_text or "Reply 2:" not in response_text:
+        print(f"{provider} did not follow format. Response: {response_text}")
+        # Create a properly formatted response
+        response_text = f"Reply 1: {response_text}\nReply 2: Here's an alternative perspective on your message."
+    return response_text
+
+def chat_with_openai(message: Union[str, PromptParts], history: List[tuple], usage: Optional[Dict[str, Any]] = None) -> str:
     """Chat function for OpenAI API with conversation history."""
     try:
         # Get OpenAI client
@@ -259,54 +440,19 @@ def chat_with_openai(message: str, history: List[tuple]) -> str:
         if not client:
             return "Error: Failed to initialize OpenAI client"
             
-        # Extract system prompt from the message if it's a context
-        system_content = system_message
-        user_message = message
+        start = time.perf_counter()
+        response = client.chat.completions.create(**openai_chat_request(message, history))
+        record_latency("openai", "reply", time.perf_counter() - start)
+        record_usage(usage, "OpenAI", response.usage)
         
-        if "You are currently chatting with" in message:
-            # This is a context message, extract the system prompt part
-            parts = message.split("\n\nYou are currently chatting with")
-            if len(parts) > 1 and parts[0].strip():  # Only use custom prompt if it's not empty
-                system_content = parts[0]
-            user_message = "You are currently chatting with" + parts[1]
-            
-        formatted_messages = [
-            {"role": "system", "content": system_content},
-            {"role": "user", "content": "When I send a message, give me two different responses in the exact format specified."},
-            {"role": "assistant", "content": "Reply 1: I understand that I must provide two different responses to your messages.\nReply 2: Let me confirm that I will always give two distinct replies to what you say."},
-            {"role": "user", "content": "Great! Now respond to this: " + user_message}
-        ]
-        
-        # Add history if exists
-        if history:
-            for msg, response in history:
-                formatted_messages.extend([
-                    {"role": "user", "content": msg},
-                    {"role": "assistant", "content": response}
-                ])
-                
-        response = client.chat.completions.create(
-            model="gpt-4-turbo-preview",
-            messages=formatted_messages,
-            temperature=0.7,
-            max_tokens=2000
-        )
-        
-        response_text = response.choices[0].message.content
-        # Ensure response has both replies
-        if "Reply 1:" not in response_text or "Reply 2:" not in response_text:
-            print(f"OpenAI did not follow format. Response: {response_text}")
-            # Create a properly formatted response
-            response_text = f"Reply 1: {response_text}\nReply 2: Here's an alternative perspective on your message."
-            
-        return response_text
+        return ensure_reply_format(response.choices[0].message.content, "OpenAI")
     except Exception as e:
         error_msg = f"Error in chat_with_openai: {str(e)}"
         print(error_msg)
         st.error(error_msg)
         return f"Error: {str(e)}"
 
-def chat_with_claude(message: str, history: List[tuple]) -> str:
+def chat_with_claude(message: Union[str, PromptParts], history: List[tuple], usage: Optional[Dict[str, Any]] = None) -> str:
     """Chat function for Claude API with conversation history."""
     try:
         # Get Anthropic client
@@ -314,60 +460,556 @@ def chat_with_claude(message: str, history: List[tuple]) -> str:
         if not claude:
             return "Error: Failed to initialize Anthropic client"
             
-        # Extract system prompt from the message if it's a context
-        system_content = system_message
-        user_message = message
+        # Create the chat completion
+        start = time.perf_counter()
+        response = claude.messages.create(**claude_chat_request(message, history))
+        record_latency("claude", "reply", time.perf_counter() - start)
+        record_usage(usage, "Claude", response.usage)
         
-        if "You are currently chatting with" in message:
-            # This is a context message, extract the system prompt part
-            parts = message.split("\n\nYou are currently chatting with")
-            if len(parts) > 1 and parts[0].strip():  # Only use custom prompt if it's not empty
-                system_content = parts[0]
-            user_message = "You are currently chatting with" + parts[1]
-            
-        formatted_messages = [
-            {"role": "user", "content": "When I send a message, give me two different responses in the exact format specified."},
-            {"role": "assistant", "content": "Reply 1: I understand that I must provide two different responses to your messages.\nReply 2: Let me confirm that I will always give two distinct replies to what you say."},
-            {"role": "user", "content": "Great! Now respond to this: " + user_message}
-        ]
+        return ensure_reply_format(response.content[0].text, "Claude")
+    except Exception as e:
+        error_msg = f"Error in chat_with_claude: {str(e)}"
+        print(error_msg)
+        st.error(error_msg)
+        return f"Error: {str(e)}"
+
+def chat(message: Union[str, PromptParts], history: List[tuple], model_choice: str = "openai", usage: Optional[Dict[str, Any]] = None, hedge: Optional[bool] = None) -> str:
+    """Main chat function that routes to the appropriate model.
+
+    usage, if given, receives the token counts of the call (see record_usage()).
+    With hedge (default: the HEDGED_REQUESTS setting) a slow request is
+    hedged with the other provider, see chat_hedged_async().
+    """
+    if _hedging(hedge):
+        return run_async(chat_hedged_async(message, history, model_choice, usage))
+    if model_choice == "claude":
+        return chat_with_claude(message, history, usage)
+    else:
+        return chat_with_openai(message, history, usage)
+
+def _validate_replies(replies: Any) -> Dict[str, str]:
+    """Check a tool call result has the three string fields."""
+    if not isinstance(replies, dict) or not all(isinstance(replies.get(key), str) for key in REPLIES_SCHEMA["required"]):
+        raise ValueError(f"Malformed {REPLIES_TOOL_NAME} arguments: {replies}")
+    return {key: replies[key].strip() for key in REPLIES_SCHEMA["required"]}
+
+def chat_structured_with_openai(message: Union[str, PromptParts], history: List[tuple], usage: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
+    """Get both replies and the summary from OpenAI with a forced function call."""
+    client = get_openai_client()
+    if not client:
+        raise RuntimeError("Failed to initialize OpenAI client")
         
-        # Add history if exists
-        if history:
-            for msg, response in history:
-                formatted_messages.extend([
-                    {"role": "user", "content": msg},
-                    {"role": "assistant", "content": response}
-                ])
+    system_content, formatted_messages = build_chat_messages(message, history)
+    formatted_messages = [{"role": "system", "content": system_content + STRUCTURED_INSTRUCTION}] + formatted_messages
+    
+    start = time.perf_counter()
+    response = client.chat.completions.create(
+        model=OPENAI_CHAT_MODEL,
+        messages=formatted_messages,
+        tools=[{
+            "type": "function",
+            "function": {
+                "name": REPLIES_TOOL_NAME,
+                "description": REPLIES_TOOL_DESCRIPTION,
+                "parameters": REPLIES_SCHEMA
+            }
+        }],
+        tool_choice={"type": "function", "function": {"name": REPLIES_TOOL_NAME}},
+        temperature=0.7,
+        max_tokens=2000
+    )
+    record_latency("openai", "structured", time.perf_counter() - start)
+    record_usage(usage, "OpenAI", response.usage)
+    
+    tool_calls = response.choices[0].message.tool_calls or []
+    if not tool_calls:
+        raise ValueError("OpenAI did not call the replies tool")
+    return _validate_replies(json.loads(tool_calls[0].function.arguments))
+
+def chat_structured_with_claude(message: Union[str, PromptParts], history: List[tuple], usage: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
+    """Get both replies and the summary from Claude with a forced tool use."""
+    claude = get_anthropic_client()
+    if not claude:
+        raise RuntimeError("Failed to initialize Anthropic client")
         
-        # Create the chat completion
-        response = claude.messages.create(
-            model="claude-3-opus-20240229",
-            messages=formatted_messages,
-            system=system_content,
-            max_tokens=2000,
-            temperature=0.7
+    system, formatted_messages = build_claude_request(message, history, STRUCTURED_INSTRUCTION)
+    
+    start = time.perf_counter()
+    response = claude.messages.create(
+        model=CLAUDE_MODEL,
+        messages=formatted_messages,
+        system=system,
+        tools=[{
+            "name": REPLIES_TOOL_NAME,
+            "description": REPLIES_TOOL_DESCRIPTION,
+            "input_schema": REPLIES_SCHEMA
+        }],
+        tool_choice={"type": "tool", "name": REPLIES_TOOL_NAME},
+        max_tokens=2000,
+        temperature=0.7
+    )
+    record_latency("claude", "structured", time.perf_counter() - start)
+    record_usage(usage, "Claude", response.usage)
+    
+    tool_use = next((block for block in response.content if block.type == "tool_use"), None)
+    if tool_use is None:
+        raise ValueError("Claude did not call the replies tool")
+    return _validate_replies(tool_use.input)
+
+def chat_structured(message: Union[str, PromptParts], history: List[tuple], model_choice: str = "openai", usage: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, str]]:
+    """Get reply1, reply2 and summary in a single call, or None if that failed.
+
+    The call's latency is recorded as the "structured" kind, apart from
+    text replies, whose hedge delay it would otherwise skew.
+    """
+    try:
+        if model_choice == "claude":
+            return chat_structured_with_claude(message, history, usage)
+        else:
+            return chat_structured_with_openai(message, history, usage)
+    except Exception as e:
+        error_msg = f"Error in structured chat: {str(e)}"
+        print(error_msg)
+        return None
+
+def format_replies(reply1: str, reply2: str) -> str:
+    """Join two replies into the "Reply 1/Reply 2" response text."""
+    return f"Reply 1: {reply1}\nReply 2: {reply2}"
+
+def stream_chat_with_openai(message: Union[str, PromptParts], history: List[tuple], usage: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    """Stream an OpenAI response as text deltas."""
+    try:
+        client = get_openai_client("stream")
+        if not client:
+            yield "Error: Failed to initialize OpenAI client"
+            return
+            
+        start = time.perf_counter()
+        first = True
+        stream = client.chat.completions.create(
+            **openai_chat_request(message, history),
+            stream=True,
+            stream_options={"include_usage": True}
         )
-        
-        response_text = response.content[0].text
-        # Ensure response has both replies
-        if "Reply 1:" not in response_text or "Reply 2:" not in response_text:
-            print(f"Claude did not follow format. Response: {response_text}")
-            # Create a properly formatted response
-            response_text = f"Reply 1: {response_text}\nReply 2: Here's an alternative perspective on your message."
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                if first:
+                    record_latency("openai", "first_token", time.perf_counter() - start)
+                    first = False
+                yield chunk.choices[0].delta.content
+            if chunk.usage:
+                # Sent in a last chunk without choices
+                record_usage(usage, "OpenAI", chunk.usage)
+    except Exception as e:
+        error_msg = f"Error in stream_chat_with_openai: {str(e)}"
+        print(error_msg)
+        st.error(error_msg)
+        yield f"Error: {str(e)}"
+
+def stream_chat_with_claude(message: Union[str, PromptParts], history: List[tuple], usage: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    """Stream a Claude response as text deltas."""
+    try:
+        claude = get_anthropic_client("stream")
+        if not claude:
+            yield "Error: Failed to initialize Anthropic client"
+            return
             
-        return response_text
+        start = time.perf_counter()
+        first = True
+        with claude.messages.stream(**claude_chat_request(message, history)) as stream:
+            for text in stream.text_stream:
+                if first:
+                    record_latency("claude", "first_token", time.perf_counter() - start)
+                    first = False
+                yield text
+            record_usage(usage, "Claude", stream.get_final_message().usage)
     except Exception as e:
-        error_msg = f"Error in chat_with_claude: {str(e)}"
+        error_msg = f"Error in stream_chat_with_claude: {str(e)}"
         print(error_msg)
         st.error(error_msg)
+        yield f"Error: {str(e)}"
+
+def stream_chat(message: Union[str, PromptParts], history: List[tuple], model_choice: str = "openai", usage: Optional[Dict[str, Any]] = None, hedge: Optional[bool] = None) -> Iterator[str]:
+    """Streaming variant of chat(): yields the response text as it is generated.
+
+    The joined text has not been through ensure_reply_format() yet.
+    """
+    if _hedging(hedge):
+        return iterate_async(stream_chat_hedged_async(message, history, model_choice, usage))
+    if model_choice == "claude":
+        return stream_chat_with_claude(message, history, usage)
+    else:
+        return stream_chat_with_openai(message, history, usage)
+
+# Async variants, for coroutines run on the utils/async_bridge.py event loop.
+# They share the request building of the blocking functions above and use the
+# async clients of utils/llm_clients.py. They run off the script thread, so
+# errors are logged and returned instead of shown with st.error.
+
+def _get_async_client(provider: str, operation: str = "chat"):
+    client = get_async_llm_client(provider, operation)
+    if not client:
+        raise RuntimeError(f"Failed to initialize {PROVIDER_NAMES[provider]} client")
+    return client
+
+async def _reply_text_async(provider: str, message: Union[str, PromptParts], history: List[tuple], usage: Optional[Dict[str, Any]] = None, single_reply: bool = False) -> str:
+    """Get a provider's response text as is; raises on failure."""
+    kind = "single_reply" if single_reply else "reply"
+    start = time.perf_counter()
+    client = _get_async_client(provider)
+    if provider == "claude":
+        response = await client.messages.create(**claude_chat_request(message, history, single_reply))
+        text = response.content[0].text
+    else:
+        response = await client.chat.completions.create(**openai_chat_request(message, history, single_reply))
+        text = response.choices[0].message.content
+    record_latency(provider, kind, time.perf_counter() - start)
+    record_usage(usage, PROVIDER_NAMES[provider], response.usage)
+    return text
+
+async def _reply_async(provider: str, message: Union[str, PromptParts], history: List[tuple], usage: Optional[Dict[str, Any]] = None) -> str:
+    """Get a reply from a provider; raises on failure."""
+    text = await _reply_text_async(provider, message, history, usage)
+    return ensure_reply_format(text, PROVIDER_NAMES[provider])
+
+async def _stream_async(provider: str, message: Union[str, PromptParts], history: List[tuple], usage: Optional[Dict[str, Any]] = None, single_reply: bool = False) -> AsyncIterator[str]:
+    """Stream a reply from a provider as text deltas; raises on failure."""
+    start = time.perf_counter()
+    first = True
+    # Kept apart from the full-turn first tokens stream_chat_hedged_async() hedges on
+    kind = "single_reply_first_token" if single_reply else "first_token"
+    client = _get_async_client(provider, "stream")
+    if provider == "claude":
+        async with client.messages.stream(**claude_chat_request(message, history, single_reply)) as stream:
+            async for text in stream.text_stream:
+                if first:
+                    record_latency(provider, kind, time.perf_counter() - start)
+                    first = False
+                yield text
+            record_usage(usage, "Claude", (await stream.get_final_message()).usage)
+        return
+    stream = await client.chat.completions.create(
+        **openai_chat_request(message, history, single_reply),
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            if first:
+                record_latency(provider, kind, time.perf_counter() - start)
+                first = False
+            yield chunk.choices[0].delta.content
+        if chunk.usage:
+            record_usage(usage, "OpenAI", chunk.usage)
+
+async def chat_with_openai_async(message: Union[str, PromptParts], history: List[tuple], usage: Optional[Dict[str, Any]] = None) -> str:
+    """Async chat_with_openai()."""
+    try:
+        return await _reply_async("openai", message, history, usage)
+    except Exception as e:
+        print(f"Error in chat_with_openai_async: {str(e)}")
         return f"Error: {str(e)}"
 
-def chat(message: str, history: List[tuple], model_choice: str = "openai") -> str:
-    """Main chat function that routes to the appropriate model."""
+async def chat_with_claude_async(message: Union[str, PromptParts], history: List[tuple], usage: Optional[Dict[str, Any]] = None) -> str:
+    """Async chat_with_claude()."""
+    try:
+        return await _reply_async("claude", message, history, usage)
+    except Exception as e:
+        print(f"Error in chat_with_claude_async: {str(e)}")
+        return f"Error: {str(e)}"
+
+def _other_provider(provider: str) -> str:
+    return "openai" if provider == "claude" else "claude"
+
+def _hedging(hedge: Optional[bool]) -> bool:
+    return get_bool_setting("HEDGED_REQUESTS", False) if hedge is None else hedge
+
+def _hedge_report(usage: Optional[Dict[str, Any]], provider_usage: Dict[str, Any], provider: str, hedged: bool) -> None:
+    if usage is not None:
+        usage.update(provider_usage)
+        usage.update({"answered_by": provider, "hedged": hedged})
+
+async def chat_hedged_async(message: Union[str, PromptParts], history: List[tuple], model_choice: str = "openai", usage: Optional[Dict[str, Any]] = None) -> str:
+    """Get a reply from the preferred provider, hedged with the other one.
+
+    When the preferred provider has not answered within its hedge delay
+    (the HEDGE_PERCENTILE latency, see utils/latency.py), or failed, the
+    same request goes to the other provider too; the first reply wins and
+    the other request is cancelled. usage also gets answered_by and hedged.
+    """
+    providers = [model_choice, _other_provider(model_choice)]
+    usages = {provider: {} for provider in providers}
+    tasks = {asyncio.ensure_future(_reply_async(model_choice, message, history, usages[model_choice])): model_choice}
+    delay = hedge_delay(model_choice, "reply")
+    errors = []
+    hedged = False
+    try:
+        while tasks:
+            timeout = delay if len(tasks) == 1 and len(errors) + len(tasks) < 2 else None
+            done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                provider = tasks.pop(task)
+                if task.exception() is None:
+                    _hedge_report(usage, usages[provider], provider, hedged)
+                    return task.result()
+                errors.append(f"{PROVIDER_NAMES[provider]}: {task.exception()}")
+                print(f"Hedged request to {PROVIDER_NAMES[provider]} failed: {task.exception()}")
+            if len(tasks) + len(errors) < 2:
+                # Too slow, or failed: ask the other provider as well
+                backup = providers[1]
+                print(f"Hedging {PROVIDER_NAMES[model_choice]} request with {PROVIDER_NAMES[backup]}")
+                hedged = True
+                tasks[asyncio.ensure_future(_reply_async(backup, message, history, usages[backup]))] = backup
+        return "Error: " + "; ".join(errors)
+    finally:
+        # The loser (or everything, if this coroutine was cancelled)
+        for task in tasks:
+            task.cancel()
+
+async def stream_chat_hedged_async(message: Union[str, PromptParts], history: List[tuple], model_choice: str = "openai", usage: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+    """Stream a reply from the preferred provider, hedged on the first chunk.
+
+    Like chat_hedged_async(), with the hedge delay taken from the
+    first-token latency: the provider whose first chunk comes first is
+    streamed and the other stream is closed.
+    """
+    providers = [model_choice, _other_provider(model_choice)]
+    usages = {provider: {} for provider in providers}
+    streams = {}
+    tasks = {}
+
+    def start(provider):
+        streams[provider] = _stream_async(provider, message, history, usages[provider])
+        tasks[asyncio.ensure_future(streams[provider].__anext__())] = provider
+
+    start(model_choice)
+    delay = hedge_delay(model_choice, "first_token")
+    errors = []
+    winner = first_chunk = None
+    try:
+        while tasks and winner is None:
+            timeout = delay if len(tasks) == 1 and len(errors) + len(tasks) < 2 else None
+            done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                provider = tasks.pop(task)
+                if task.exception() is None:
+                    winner, first_chunk = provider, task.result()
+                    break
+                error = "empty reply" if isinstance(task.exception(), StopAsyncIteration) else task.exception()
+                errors.append(f"{PROVIDER_NAMES[provider]}: {error}")
+                print(f"Hedged stream from {PROVIDER_NAMES[provider]} failed: {error}")
+            if winner is None and len(tasks) + len(errors) < 2:
+                print(f"Hedging {PROVIDER_NAMES[model_choice]} stream with {PROVIDER_NAMES[providers[1]]}")
+                start(providers[1])
+    finally:
+        # Let the loser's pending chunk finish cancelling before closing its stream
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for provider, stream in streams.items():
+            if provider != winner:
+                await stream.aclose()
+    if winner is None:
+        yield "Error: " + "; ".join(errors)
+        return
+        
+    hedged = len(streams) > 1
+    try:
+        yield first_chunk
+        async for text in streams[winner]:
+            yield text
+    except Exception as e:
+        print(f"Error in hedged stream from {PROVIDER_NAMES[winner]}: {str(e)}")
+        yield f"Error: {str(e)}"
+    finally:
+        await streams[winner].aclose()
+        _hedge_report(usage, usages[winner], winner, hedged)
+
+async def chat_async(message: Union[str, PromptParts], history: List[tuple], model_choice: str = "openai", usage: Optional[Dict[str, Any]] = None, hedge: Optional[bool] = None) -> str:
+    """Async chat()."""
+    if _hedging(hedge):
+        return await chat_hedged_async(message, history, model_choice, usage)
+    if model_choice == "claude":
+        return await chat_with_claude_async(message, history, usage)
+    else:
+        return await chat_with_openai_async(message, history, usage)
+
+async def _stream_reporting_errors(provider: str, message: Union[str, PromptParts], history: List[tuple], usage: Optional[Dict[str, Any]], single_reply: bool = False) -> AsyncIterator[str]:
+    try:
+        async for text in _stream_async(provider, message, history, usage, single_reply):
+            yield text
+    except Exception as e:
+        print(f"Error in stream_chat_with_{provider}_async: {str(e)}")
+        yield f"Error: {str(e)}"
+
+def stream_chat_with_openai_async(message: Union[str, PromptParts], history: List[tuple], usage: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+    """Async stream_chat_with_openai()."""
+    return _stream_reporting_errors("openai", message, history, usage)
+
+def stream_chat_with_claude_async(message: Union[str, PromptParts], history: List[tuple], usage: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+    """Async stream_chat_with_claude()."""
+    return _stream_reporting_errors("claude", message, history, usage)
+
+def stream_chat_async(message: Union[str, PromptParts], history: List[tuple], model_choice: str = "openai", usage: Optional[Dict[str, Any]] = None, hedge: Optional[bool] = None) -> AsyncIterator[str]:
+    """Async stream_chat(); iterate it from a script thread with utils.async_bridge.iterate_async()."""
+    if _hedging(hedge):
+        return stream_chat_hedged_async(message, history, model_choice, usage)
     if model_choice == "claude":
-        return chat_with_claude(message, history)
+        return stream_chat_with_claude_async(message, history, usage)
     else:
-        return chat_with_openai(message, history)
+        return stream_chat_with_openai_async(message, history, usage)
+
+async def chat_both_async(message: Union[str, PromptParts], history: List[tuple], usages: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, str]:
+    """Get replies from both providers at once, keyed "openai" and "claude".
+
+    usages, if given, maps a provider to the dict that receives its token counts.
+    """
+    usages = usages or {}
+    replies = await asyncio.gather(*(
+        chat_async(message, history, provider, usages.get(provider), hedge=False)
+        for provider in PROVIDER_NAMES
+    ))
+    return dict(zip(PROVIDER_NAMES, replies))
+
+def stream_chat_both_async(message: Union[str, PromptParts], history: List[tuple], usages: Optional[Dict[str, Dict[str, Any]]] = None) -> AsyncIterator[Tuple[str, str]]:
+    """Stream replies from both providers at once as (provider, text delta) pairs, in arrival order."""
+    usages = usages or {}
+    return merge_async({
+        provider: stream_chat_async(message, history, provider, usages.get(provider), hedge=False)
+        for provider in PROVIDER_NAMES
+    })
+
+def chat_both(message: Union[str, PromptParts], history: List[tuple], usages: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, str]:
+    """Blocking chat_both_async(), for comparing the providers side by side."""
+    return run_async(chat_both_async(message, history, usages))
+
+def stream_chat_both(message: Union[str, PromptParts], history: List[tuple], usages: Optional[Dict[str, Dict[str, Any]]] = None) -> Iterator[Tuple[str, str]]:
+    """Blocking iterator over stream_chat_both_async()."""
+    return iterate_async(stream_chat_both_async(message, history, usages))
+
+def single_reply_prompt(message: Union[str, PromptParts], tone: str) -> PromptParts:
+    """The prompt for just one reply in the given tone; send it with single_reply=True.
+
+    The default system prompt is replaced by single_reply_system_message,
+    and a custom one is told to give one reply. Only the current part
+    differs between tones, so the requests for both replies share the
+    cached prompt prefix.
+    """
+    if not isinstance(message, PromptParts):
+        message = PromptParts(*split_prompt(message))
+    system = message.system + SINGLE_REPLY_OVERRIDE if message.system.strip() else single_reply_system_message
+    return message._replace(system=system, current=message.current + SINGLE_REPLY_INSTRUCTION.format(tone=tone))
+
+def clean_single_reply(text: str) -> str:
+    """Strip a "Reply N:" label a model added to a single reply anyway, and a second reply after it."""
+    return re.split(r"\n\s*Reply 2:", re.sub(r"^\s*Reply [12]:\s*", "", text))[0].strip()
+
+async def _clean_single_reply_stream(deltas: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Stream a single reply without a "Reply N:" label or a second reply, like clean_single_reply().
+
+    Text that may turn out to be a label is held back until it is known
+    not to be one; a second reply ends the stream.
+    """
+    labels = ("Reply 1:", "Reply 2:")
+    buffer = ""
+    started = False
+    try:
+        async for text in deltas:
+            buffer += text
+            if not started:
+                head = buffer.lstrip()
+                if len(head) < len(labels[0]) and any(label.startswith(head) for label in labels):
+                    continue
+                started = True
+                buffer = re.sub(r"^\s*Reply [12]:\s*", "", buffer)
+            second = re.search(r"\n\s*Reply 2:", buffer)
+            if second:
+                if buffer[:second.start()]:
+                    yield buffer[:second.start()]
+                return
+            # Hold back a last line that may start the second reply
+            cut = buffer.rfind("\n")
+            if cut < 0 or not labels[1].startswith(buffer[cut:].strip()):
+                cut = len(buffer)
+            if buffer[:cut]:
+                yield buffer[:cut]
+            buffer = buffer[cut:]
+        if buffer.strip():
+            yield re.sub(r"^\s*Reply [12]:\s*", "", buffer) if not started else buffer
+    finally:
+        await deltas.aclose()
+
+def _add_usage(usage: Optional[Dict[str, Any]], parts: List[Dict[str, Any]]) -> None:
+    """Add up the token counts of several calls into usage."""
+    if usage is None:
+        return
+    for key in ("input_tokens", "cache_read_tokens", "cache_write_tokens", "output_tokens"):
+        counts = [part[key] for part in parts if key in part]
+        if counts:
+            # OpenAI does not report cache writes
+            usage[key] = None if None in counts else sum(counts)
+
+async def _single_reply_async(provider: str, message: PromptParts, history: List[tuple], usage: Dict[str, Any]) -> str:
+    try:
+        return clean_single_reply(await _reply_text_async(provider, message, history, usage, single_reply=True))
+    except Exception as e:
+        print(f"Error in single reply from {PROVIDER_NAMES[provider]}: {str(e)}")
+        return f"Error: {str(e)}"
+
+async def chat_split_async(message: Union[str, PromptParts], history: List[tuple], model_choice: str = "openai", usage: Optional[Dict[str, Any]] = None) -> Tuple[str, str]:
+    """Get Reply 1 and Reply 2 from two concurrent requests, one per REPLY_TONES tone.
+
+    Neither reply waits for the other, and a model that ignores the format
+    cannot leave Reply 2 empty. usage receives the counts of both calls.
+    """
+    usages = [{}, {}]
+    replies = await asyncio.gather(*(
+        _single_reply_async(model_choice, single_reply_prompt(message, tone), history, part_usage)
+        for tone, part_usage in zip(REPLY_TONES, usages)
+    ))
+    _add_usage(usage, usages)
+    return tuple(replies)
+
+async def stream_chat_split_async(message: Union[str, PromptParts], history: List[tuple], model_choice: str = "openai", usage: Optional[Dict[str, Any]] = None) -> AsyncIterator[Tuple[int, str]]:
+    """Stream Reply 1 and Reply 2 from two concurrent requests as (reply number, text delta) pairs.
+
+    Labels and second replies are stripped as the text arrives; the joined
+    texts may still have surrounding whitespace, see clean_single_reply().
+    """
+    usages = [{}, {}]
+    try:
+        async for number, text in merge_async({
+            number: _clean_single_reply_stream(
+                _stream_reporting_errors(model_choice, single_reply_prompt(message, tone), history, part_usage, single_reply=True)
+            )
+            for number, (tone, part_usage) in enumerate(zip(REPLY_TONES, usages), 1)
+        }):
+            yield number, text
+    finally:
+        _add_usage(usage, usages)
+
+def chat_split(message: Union[str, PromptParts], history: List[tuple], model_choice: str = "openai", usage: Optional[Dict[str, Any]] = None) -> Tuple[str, str]:
+    """Blocking chat_split_async()."""
+    return run_async(chat_split_async(message, history, model_choice, usage))
+
+def stream_chat_split(message: Union[str, PromptParts], history: List[tuple], model_choice: str = "openai", usage: Optional[Dict[str, Any]] = None) -> Iterator[Tuple[int, str]]:
+    """Blocking iterator over stream_chat_split_async()."""
+    return iterate_async(stream_chat_split_async(message, history, model_choice, usage))
+
+async def summarize_message_async(message: str) -> str:
+    """Async summarize_message()."""
+    try:
+        summary = _local_summary(message)
+        if summary is not None:
+            return summary
+        client = _get_async_client("openai", "summary")
+        response = await client.chat.completions.create(**summary_request(message))
+        summary = response.choices[0].message.content
+        store_summary(MODEL, SUMMARY_PROMPT, message, summary)
+        return summary
+    except Exception as e:
+        print(f"Error summarizing message: {str(e)}")
+        return "Error creating summary"
 
 def parse_replies(response_text: str) -> Tuple[str, str]:
     """Parse the response text to extract Reply 1 and Reply 2."""
@@ -17,7 +17,7 @@ import requests
 from bs4 import BeautifulSoup
 from typing import List, Dict, Any
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from anthropic import Anthropic
 import re
 import gradio as gr
@@ -78,6 +78,7 @@ else:
 
 
 client = OpenAI(api_key=openai_api_key)
+async_client = AsyncOpenAI(api_key=openai_api_key)
 MODEL = 'gpt-4'  # or 'gpt-3.5-turbo' depending on your needs
 claude = Anthropic(api_key=anthropic_api_key)
 
@@ -196,6 +197,25 @@ def scrap_gpt(prompt):
         result += chunk.choices[0].delta.content or ""
     return result
 
+async def scrap_gpt_async(prompt, system_message_bs4=DEFAULT_BS4_SYSTEM_MESSAGE):
+    """Async scrap_gpt() for running several prompts at once with asyncio.gather.
+
+    Takes the system message instead of reading it from Google Docs, which blocks.
+    """
+    messages = [
+        {"role": "system", "content": system_message_bs4},
+        {"role": "user", "content": prompt}
+    ]
+    stream = await async_client.chat.completions.create(
+        model=MODEL,
+        messages=messages,
+        stream=True
+    )
+    parts = []
+    async for chunk in stream:
+        parts.append(chunk.choices[0].delta.content or "")
+    return "".join(parts)
+
 
 # In[10]:
 
@@ -336,10 +356,18 @@ def save_conversation_to_sheet(sheet_service, spreadsheet_id, sheet_name, role,
 # In[14]:
 
 
+# Per-sheet cache of parsed history and the next unread row, so each message
+# only fetches the rows appended since the previous one
+history_cursors = {}
+
+
 def load_conversation_history(sheet_service, spreadsheet_id, sheet_name):
     """
     Load all conversation history for a client from Google Sheets
 
+    Only rows added since the previous call are fetched; earlier rows are
+    served from history_cursors.
+
     Args:
         sheet_service: Google Sheets service object
         spreadsheet_id (str): ID of the spreadsheet
@@ -349,33 +377,35 @@ def load_conversation_history(sheet_service, spreadsheet_id, sheet_name):
         list: List of tuples (role, content) with properly formatted messages
     """
     try:
-        # Get all values from the sheet
+        cursor = history_cursors.setdefault((spreadsheet_id, sheet_name), {"next_row": 1, "history": []})
+        next_row = cursor["next_row"]
+
+        # Get the values appended since the last load
         result = sheet_service.spreadsheets().values().get(
             spreadsheetId=spreadsheet_id,
-            range=f"{sheet_name}!A:C"
+            range=f"{sheet_name}!A{next_row}:C"
         ).execute()
 
         values = result.get('values', [])
 
-        if not values:
+        if not values and not cursor["history"]:
             print(f"No data found in sheet {sheet_name}")
             return []
 
-        # Process the values into conversation history - keeping each message separate
-        conversation_history = []
-
         # Skip header row if present
-        start_idx = 1 if len(values) > 0 and values[0][0].lower() == "timestamp" else 0
+        start_idx = 1 if next_row == 1 and len(values) > 0 and values[0] and values[0][0].lower() == "timestamp" else 0
 
+        # Process the new values into conversation history - keeping each message separate
         for row in values[start_idx:]:
             if len(row) >= 3:  # Should have timestamp, role, content
                 role = row[1] if len(row) > 1 else ""
                 content = row[2] if len(row) > 2 else ""
 
                 if role.lower() in ["user", "assistant"] and content.strip():
-                    conversation_history.append((role.lower(), content.strip()))
+                    cursor["history"].append((role.lower(), content.strip()))
 
-        return conversation_history
+        cursor["next_row"] = next_row + len(values)
+        return list(cursor["history"])
 
     except Exception as e:
         print(f"Error loading conversation history: {e}")
@@ -1,9 +1,18 @@
 import os
+import json
+import time
+import threading
 from typing import List, Dict
 from datetime import datetime
 import streamlit as st
+import httplib2
 from google.oauth2 import service_account
-from googleapiclient.discovery import build
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build, build_from_document
+from utils.settings import get_setting, get_float_setting
+from utils.storage import SheetsStorage, get_storage
+from utils.rate_limiter import execute_request
 
 # Google API scopes
 SCOPES = [
@@ -12,11 +21,70 @@ SCOPES = [
     'https://www.googleapis.com/auth/drive'
 ]
 
-# Get spreadsheet ID from Streamlit secrets
-SPREADSHEET_ID = st.secrets["SPREADSHEET_ID"]
+# Get spreadsheet ID from the environment or Streamlit secrets
+SPREADSHEET_ID = get_setting("SPREADSHEET_ID") or st.secrets["SPREADSHEET_ID"]
+
+# Process-wide service registry. Streamlit runs every rerun on a fresh script
+# thread, so services are shared by the whole process and each request leases
+# its own httplib2 transport from a pool (httplib2.Http is not thread-safe).
+_registry_lock = threading.Lock()
+_credentials = None
+_services = {}
+_service_metrics = {"hits": 0, "misses": 0, "transports_created": 0, "transport_leases": 0}
+
+# Parsed discovery documents, loaded lazily from the copies bundled with
+# google-api-python-client. Parsing dominates the cost of build(), so each
+# document is parsed once per process. Set GOOGLE_DISCOVERY=library to fall
+# back to googleapiclient's own per-build lookup.
+_discovery_documents = {}
+_discovery_lock = threading.Lock()
+
+# Client directory (sheet titles of SPREADSHEET_ID) shared by all sessions.
+# Refreshed after CLIENT_DIRECTORY_TTL seconds or when create_sheet adds a client.
+# generation is bumped by every invalidation, so a fetch that started before
+# one is not stored over it
+_client_directory = {"names": None, "fetched_at": 0.0, "generation": 0}
+_directory_lock = threading.Lock()
+_directory_metrics = {"hits": 0, "misses": 0, "invalidations": 0, "stale_fetches": 0}
+
+class _PooledHttp:
+    """httplib2.Http stand-in that leases a pooled AuthorizedHttp per request."""
+
+    def __init__(self, credentials):
+        self.credentials = credentials
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        with self._lock:
+            _service_metrics["transport_leases"] += 1
+            if self._idle:
+                return self._idle.pop()
+            _service_metrics["transports_created"] += 1
+        return AuthorizedHttp(self.credentials, http=httplib2.Http())
+
+    def _release(self, http):
+        with self._lock:
+            self._idle.append(http)
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        http = self._acquire()
+        try:
+            return http.request(uri, method, body=body, headers=headers, **kwargs)
+        finally:
+            self._release(http)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for http in idle:
+            http.close()
 
 def get_google_credentials():
-    """Get credentials from Streamlit secrets."""
+    """Get credentials from Streamlit secrets, cached for the whole process."""
+    global _credentials
+    if _credentials is not None:
+        return _credentials
     try:
         # Create credentials dict from Streamlit secrets
         credentials_dict = {
@@ -36,50 +104,148 @@ def get_google_credentials():
             credentials_dict,
             scopes=SCOPES
         )
-        return credentials
+        with _registry_lock:
+            if _credentials is None:
+                _credentials = credentials
+        return _credentials
     except Exception as e:
         st.error(f"Error getting Google credentials: {str(e)}")
         return None
 
-def get_sheet_service():
-    """Get Google Sheets API service."""
+def _load_discovery_document(api: str, version: str):
+    """Get the parsed bundled discovery document for an API, or None if not bundled."""
+    key = (api, version)
+    document = _discovery_documents.get(key)
+    if document is None:
+        with _discovery_lock:
+            document = _discovery_documents.get(key)
+            if document is None:
+                content = discovery_cache.get_static_doc(api, version)
+                if content is None:
+                    return None
+                document = json.loads(content)
+                _discovery_documents[key] = document
+    return document
+
+def build_service(api: str, version: str, credentials=None, http=None):
+    """Build a Google API service without fetching or re-parsing its discovery document."""
+    document = None
+    if get_setting("GOOGLE_DISCOVERY", "bundled") == "bundled":
+        document = _load_discovery_document(api, version)
+    if document is None:
+        return build(api, version, http=http, credentials=credentials)
+    return build_from_document(document, http=http, credentials=credentials)
+
+def _get_pooled_service(api: str, version: str):
+    """Return the shared service for an API, building it on first use."""
+    key = (api, version)
+    service = _services.get(key)
+    if service is not None:
+        with _registry_lock:
+            _service_metrics["hits"] += 1
+        return service
+
     creds = get_google_credentials()
-    if creds:
-        return build('sheets', 'v4', credentials=creds)
-    return None
+    if not creds:
+        return None
+
+    with _registry_lock:
+        service = _services.get(key)
+        if service is not None:
+            _service_metrics["hits"] += 1
+            return service
+        _service_metrics["misses"] += 1
+        service = build_service(api, version, http=_PooledHttp(creds))
+        _services[key] = service
+        return service
+
+def get_service_metrics() -> Dict[str, int]:
+    """Get hit/miss and transport counters for the service registry."""
+    with _registry_lock:
+        return dict(_service_metrics, services=len(_services))
+
+def reset_service_registry():
+    """Drop all pooled services and credentials so they are rebuilt on next use."""
+    global _credentials
+    with _registry_lock:
+        for service in _services.values():
+            service.close()
+        _services.clear()
+        _credentials = None
+
+def get_sheet_service():
+    """Get Google Sheets API service (the in-process fake with STORAGE_BACKEND=fake)."""
+    if get_setting("STORAGE_BACKEND", "sheets") == "fake":
+        from utils.fake_sheets import get_fake_sheets_service
+        return get_fake_sheets_service()
+    return _get_pooled_service('sheets', 'v4')
 
 def get_docs_service():
     """Get Google Docs API service."""
-    creds = get_google_credentials()
-    if creds:
-        return build('docs', 'v1', credentials=creds)
-    return None
+    return _get_pooled_service('docs', 'v1')
 
 def get_drive_service():
     """Get Google Drive API service."""
-    creds = get_google_credentials()
-    if creds:
-        return build('drive', 'v3', credentials=creds)
-    return None
+    return _get_pooled_service('drive', 'v3')
+
+def _storage_for(sheet_service, spreadsheet_id: str) -> SheetsStorage:
+    """Storage bound to a caller-provided service and spreadsheet"""
+    return SheetsStorage(lambda: sheet_service, spreadsheet_id)
+
+def _directory_generation() -> int:
+    """Get the generation to pass to _store_client_directory() for a fetch about to start"""
+    with _directory_lock:
+        return _client_directory["generation"]
+
+def _store_client_directory(names: List[str], generation: int):
+    """Replace the cached client directory with freshly fetched titles, unless it was invalidated during the fetch"""
+    with _directory_lock:
+        if _client_directory["generation"] != generation:
+            _directory_metrics["stale_fetches"] += 1
+            return
+        _client_directory["names"] = list(names)
+        _client_directory["fetched_at"] = time.monotonic()
+
+def _cached_client_directory():
+    """Get the cached sheet titles, or None if missing or older than the TTL"""
+    ttl = get_float_setting("CLIENT_DIRECTORY_TTL", 300.0)
+    with _directory_lock:
+        names = _client_directory["names"]
+        if names is not None and time.monotonic() - _client_directory["fetched_at"] < ttl:
+            _directory_metrics["hits"] += 1
+            return list(names)
+        _directory_metrics["misses"] += 1
+        return None
+
+def invalidate_client_directory():
+    """Drop the cached client directory so the next lookup refetches it"""
+    with _directory_lock:
+        _client_directory["names"] = None
+        _client_directory["generation"] += 1
+        _directory_metrics["invalidations"] += 1
+
+def get_client_directory_metrics() -> Dict[str, int]:
+    """Get hit/miss/invalidation counters for the client directory cache"""
+    with _directory_lock:
+        return dict(_directory_metrics)
+
+def get_client_directory() -> List[str]:
+    """Get the sheet titles of the spreadsheet, cached for CLIENT_DIRECTORY_TTL seconds. Raises on failure."""
+    names = _cached_client_directory()
+    if names is None:
+        generation = _directory_generation()
+        names = get_storage().list_clients()
+        _store_client_directory(names, generation)
+    return names
 
 def get_all_sheet_names() -> List[str]:
     """Get all sheet names from the spreadsheet"""
     try:
-        sheet_service = get_sheet_service()
-        if not sheet_service:
+        if not get_storage().is_available():
             return ["Example Client"]
             
-        spreadsheet = sheet_service.spreadsheets().get(spreadsheetId=SPREADSHEET_ID).execute()
-        sheets = spreadsheet.get('sheets', [])
-        
-        # Filter out empty or invalid sheet names
-        valid_names = [
-            sheet['properties']['title'] 
-            for sheet in sheets 
-            if sheet.get('properties', {}).get('title')
-        ]
-        
-        return valid_names if valid_names else ["Example Client"]
+        names = get_client_directory()
+        return names if names else ["Example Client"]
     except Exception as e:
         print(f"Error getting sheet names: {e}")
         return ["Example Client"]
@@ -89,9 +255,18 @@ def check_sheet_exists(sheet_service, spreadsheet_id: str, sheet_name: str) -> b
     try:
         if not sheet_service:
             return False
+        
+        # A cached hit is authoritative; a miss may be a client added elsewhere
+        if spreadsheet_id == SPREADSHEET_ID:
+            names = _cached_client_directory()
+            if names is not None and sheet_name in names:
+                return True
             
-        spreadsheet = sheet_service.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
-        return any(sheet['properties']['title'] == sheet_name for sheet in spreadsheet.get('sheets', []))
+        generation = _directory_generation()
+        names = _storage_for(sheet_service, spreadsheet_id).list_clients()
+        if spreadsheet_id == SPREADSHEET_ID:
+            _store_client_directory(names, generation)
+        return sheet_name in names
     except Exception as e:
         print(f"Error checking sheet existence: {e}")
         return False
@@ -102,30 +277,9 @@ def create_sheet(sheet_service, spreadsheet_id: str, sheet_name: str) -> bool:
         if not sheet_service:
             return False
             
-        request = {
-            'addSheet': {
-                'properties': {
-                    'title': sheet_name
-                }
-            }
-        }
-        
-        body = {'requests': [request]}
-        sheet_service.spreadsheets().batchUpdate(
-            spreadsheetId=spreadsheet_id,
-            body=body
-        ).execute()
-
-        # Add headers
-        values = [['Timestamp', 'Session ID', 'Message', 'Reply 1', 'Reply 2', 'Final Reply', 'Summarized Reply']]
-        body = {'values': values}
-        
-        sheet_service.spreadsheets().values().update(
-            spreadsheetId=spreadsheet_id,
-            range=f"{sheet_name}!A1:G1",
-            valueInputOption='RAW',
-            body=body
-        ).execute()
+        _storage_for(sheet_service, spreadsheet_id).create_client(sheet_name)
+        if spreadsheet_id == SPREADSHEET_ID:
+            invalidate_client_directory()
         
         return True
     except Exception as e:
@@ -148,22 +302,18 @@ def save_to_sheets(sheet_service, client_name: str, message: str, reply: str, su
                 reply2 = parts[1].strip()
                 reply1 = parts[0].split("Reply 1:")[1].strip()
         
-        # Create row with separate Reply 1 and Reply 2
-        values = [[timestamp, client_name, message, reply1, reply2, reply, summary]]
-        
-        result = sheet_service.spreadsheets().values().get(
-            spreadsheetId=SPREADSHEET_ID,
-            range=f"{client_name}!A:A"
-        ).execute()
-        
-        next_row = len(result.get('values', [])) + 1
-        
-        sheet_service.spreadsheets().values().update(
-            spreadsheetId=SPREADSHEET_ID,
-            range=f"{client_name}!A{next_row}:G{next_row}",
-            valueInputOption='RAW',
-            body={'values': values}
-        ).execute()
+        # Queue the row (with separate Reply 1 and Reply 2) for the background
+        # writer; it lands in the local store immediately and in the sheet shortly
+        from utils.write_behind import enqueue_interaction
+        enqueue_interaction(client_name, {
+            'timestamp': timestamp,
+            'session_id': client_name,
+            'user_message': message,
+            'reply1': reply1,
+            'reply2': reply2,
+            'final_reply': reply,
+            'summary': summary
+        })
         
         return True
     except Exception as e:
@@ -184,7 +334,7 @@ def save_to_docs(docs_service, drive_service, client_name: str, content: str) ->
         document = {
             'title': doc_title
         }
-        doc = docs_service.documents().create(body=document).execute()
+        doc = execute_request(docs_service.documents().create(body=document), "docs", idempotent=False)
         document_id = doc.get('documentId')
         
         # Insert content
@@ -199,10 +349,10 @@ def save_to_docs(docs_service, drive_service, client_name: str, content: str) ->
             }
         ]
         
-        docs_service.documents().batchUpdate(
+        execute_request(docs_service.documents().batchUpdate(
             documentId=document_id,
             body={'requests': requests}
-        ).execute()
+        ), "docs", idempotent=False)
         
         # Get the document URL
         doc_url = f"https://docs.google.com/document/d/{document_id}/edit"
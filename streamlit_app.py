@@ -3,13 +3,9 @@ import os
 import sys
 from pathlib import Path
 import uuid
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import time
 from datetime import datetime
-from openai import OpenAI
-from anthropic import Anthropic
-
-# Initialize API clients with keys from secrets
-openai_client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
-anthropic_client = Anthropic(api_key=st.secrets["ANTHROPIC_API_KEY"])
 
 # Disable file watcher in production to avoid inotify limits
 if not os.environ.get("DEVELOPMENT"):
@@ -33,7 +29,12 @@ if str(current_dir) not in sys.path:
     sys.path.append(str(current_dir))
 
 # Import from our modules
-from fred_us_tools_2 import chat, summarize_message, system_message
+from fred_us_tools_2 import (
+    chat, stream_chat, chat_structured, ensure_reply_format, format_replies,
+    summarize_message, condense_memory, system_message,
+    chat_async, stream_chat_async, summarize_message_async,
+    chat_both, stream_chat_both, chat_split, stream_chat_split, clean_single_reply, PROVIDER_NAMES
+)
 from google_services import (
     get_sheet_service, get_docs_service, get_drive_service,
     get_all_sheet_names, save_to_sheets, save_to_docs,
@@ -41,6 +42,19 @@ from google_services import (
     SPREADSHEET_ID
 )
 from utils.theme_loader import add_theme_toggle
+from utils.history_cache import load_rows
+from utils.write_behind import enqueue_interaction, start_writer, get_write_queue_stats, retry_dead_letters
+from utils.local_store import dead_letters
+from utils.rate_limiter import get_rate_limiter_stats
+from utils.llm_clients import get_llm_client_metrics
+from utils.latency import get_latency_stats
+from utils.turn_pipeline import process_turn
+from utils.async_bridge import run_async, iterate_async, submit_async
+from utils.summary_cache import get_summary_cache_stats
+from utils.context_builder import ConversationContext
+from utils.rolling_memory import get_memory, remember_turn, remember_history_in_background
+from utils.vector_memory import index_interactions, index_in_background, retrieve
+from utils.settings import get_setting, get_bool_setting, get_int_setting, get_float_setting
 from utils.prompt_manager import (
     initialize_system_prompt_state,
     add_system_prompt_manager,
@@ -52,19 +66,14 @@ from utils.prompt_manager import (
 add_theme_toggle()
 initialize_system_prompt_state()
 
+# Replay writes left in the local journal by a previous run
+start_writer()
+
 def load_chat_history(client_name):
-    """Load chat history from Google Sheets and format it for context"""
+    """Load chat history from the local store (synced with Google Sheets) and format it for context"""
     try:
-        sheet_service = get_sheet_service()
-        if not sheet_service:
-            return []
-            
-        result = sheet_service.spreadsheets().values().get(
-            spreadsheetId=SPREADSHEET_ID,
-            range=f"{client_name}!A:G"
-        ).execute()
-        
-        values = result.get('values', [])
+        # Served locally; only rows added to the sheet since the last pull are fetched
+        values = load_rows(client_name)
         if not values:
             return []
             
@@ -91,86 +100,260 @@ def load_chat_history(client_name):
         return []
 
 def get_conversation_context(chat_history, current_question):
-    """Create a context for the AI by including all past interactions"""
+    """Create the prompt parts for the AI from past interactions, within the token budget"""
     # Get the current system prompt (default or custom)
     current_system_prompt = get_current_system_prompt(system_message)
     
-    # Start with the system prompt
-    context = current_system_prompt + "\n\n"
+    # Digests of older days, then the newest interactions in full and older
+    # ones by summary, as the budget allows
+    memory = get_memory(st.session_state.client_name) if get_bool_setting("ROLLING_MEMORY", True) else None
     
-    # Add current client info
-    context += f"You are currently chatting with {st.session_state.client_name}.\n"
+    # Past interactions relevant to this message, except the one being retried
+    relevant = []
+    if get_bool_setting("RETRIEVAL_MEMORY", True):
+        retried = st.session_state.chat_history[len(chat_history):]
+        relevant = [meta for _, meta in retrieve(st.session_state.client_name, current_question, exclude=retried)]
     
-    if chat_history:
-        context += "\nPrevious conversation history:\n"
-        # Include all previous interactions
-        for interaction in chat_history:
-            timestamp = interaction.get('timestamp', 'No timestamp')
-            context += f"\nTime: {timestamp}\n"
-            context += f"{st.session_state.client_name}: {interaction['user_message']}\n"
-            context += f"Your response: {interaction['bot_reply']}\n"
-            if interaction.get('summary'):
-                context += f"Summary: {interaction['summary']}\n"
-            context += "---\n"
+    # Formatted past interactions are kept in the session and only the new
+    # or changed ones are formatted again
+    conversation = st.session_state.get("conversation_context")
+    if conversation is None or conversation.client_name != st.session_state.client_name:
+        conversation = ConversationContext(st.session_state.client_name)
+        st.session_state.conversation_context = conversation
     
-    context += f"\nCurrent message from {st.session_state.client_name}: {current_question}\n"
-    context += "\nRespond naturally as Fred, maintaining consistency with your personality and previous interactions."
+    context, report = conversation.build(
+        current_system_prompt,
+        chat_history,
+        current_question,
+        memory=memory,
+        relevant=relevant
+    )
+    st.session_state.context_report = report
     
     return context
 
-def save_interaction_to_sheets(sheet_service, client_name, interaction):
-    """Helper function to save/update interaction in sheets with proper session tracking"""
+def save_interaction_to_sheets(client_name, interaction):
+    """Queue an interaction to be saved/updated in sheets by the background writer"""
     try:
-        # Format data for sheets
-        row_data = [
-            interaction.get('timestamp', ''),
-            interaction.get('session_id', ''),
-            interaction.get('user_message', ''),
-            interaction.get('reply1', ''),
-            interaction.get('reply2', ''),
-            interaction.get('final_reply', ''),
-            interaction.get('summary', '')
-        ]
-        
-        # If this is a retry/edit of an existing message, try to update the existing row
-        result = sheet_service.spreadsheets().values().get(
-            spreadsheetId=SPREADSHEET_ID,
-            range=f"{client_name}!A:H"
-        ).execute()
-        
-        values = result.get('values', [])
-        row_index = None
-        
-        # Look for matching session_id and message
-        for idx, row in enumerate(values):
-            if len(row) > 1 and row[1] == interaction['session_id'] and row[2] == interaction['user_message']:
-                row_index = idx + 1  # +1 because sheets are 1-indexed
-                break
-        
-        if row_index:
-            # Update existing row
-            range_name = f"{client_name}!A{row_index}:G{row_index}"
-            sheet_service.spreadsheets().values().update(
-                spreadsheetId=SPREADSHEET_ID,
-                range=range_name,
-                valueInputOption='RAW',
-                body={'values': [row_data]}
-            ).execute()
-        else:
-            # Append new row
-            sheet_service.spreadsheets().values().append(
-                spreadsheetId=SPREADSHEET_ID,
-                range=f"{client_name}!A:G",
-                valueInputOption='RAW',
-                body={'values': [row_data]}
-            ).execute()
-            
+        enqueue_interaction(client_name, interaction)
+        return True
+    except Exception as e:
+        st.error(f"Error saving to sheets: {e}")
+        return False
+
+def remember_in_memory(client_name, interaction):
+    """Add a saved turn to the client's retrieval index and rolling memory (runs on a pipeline thread)"""
+    if get_bool_setting("RETRIEVAL_MEMORY", True):
+        index_interactions(client_name, [interaction])
+    if get_bool_setting("ROLLING_MEMORY", True):
+        remember_turn(client_name, interaction, condense_memory)
+
+def save_turn(client_name, interaction, metrics):
+    """Save a new or retried turn and fill in its summary in the background"""
+    try:
+        summarize = None
+        if not interaction.get("summary"):
+            # ASYNC_LLM runs provider calls as coroutines on one shared event loop
+            summarize = summarize_message_async if get_bool_setting("ASYNC_LLM", False) else summarize_message
+        process_turn(client_name, interaction, summarize, metrics, remember_in_memory)
         return True
     except Exception as e:
         st.error(f"Error saving to sheets: {e}")
         return False
 
-def handle_chat_input(prompt):
+def generate_structured(context, model_choice, metrics):
+    """Get reply1, reply2 and summary in one call, or None to fall back to text mode"""
+    with st.spinner("Processing..."):
+        start = time.perf_counter()
+        structured = chat_structured(context, [], model_choice, usage=metrics)
+        metrics["ttft_ms"] = metrics["total_ms"] = (time.perf_counter() - start) * 1000
+    metrics["structured"] = structured is not None
+    if structured is None:
+        st.warning("Structured reply failed; falling back to text mode.")
+    return structured
+
+def generate_reply(context, model_choice, metrics):
+    """Get the reply text in one blocking call"""
+    hedge = st.session_state.hedged_requests
+    if get_bool_setting("ASYNC_LLM", False):
+        return run_async(chat_async(context, [], model_choice, usage=metrics, hedge=hedge))
+    return chat(context, [], model_choice, usage=metrics, hedge=hedge)
+
+def stream_reply(context, model_choice, metrics):
+    """Stream the reply text"""
+    hedge = st.session_state.hedged_requests
+    if get_bool_setting("ASYNC_LLM", False):
+        return iterate_async(stream_chat_async(context, [], model_choice, usage=metrics, hedge=hedge))
+    return stream_chat(context, [], model_choice, usage=metrics, hedge=hedge)
+
+def show_live_turn(container, prompt):
+    """Show the user message and an empty assistant message in container to stream the reply into.
+
+    Returns the placeholder holding both and the assistant message.
+    """
+    with container:
+        live = st.empty()
+        with live.container():
+            with st.chat_message("user"):
+                st.markdown(prompt)
+            assistant = st.chat_message("assistant")
+    return live, assistant
+
+def stream_side_by_side(chunks, labels, container, metrics):
+    """Show (key, text delta) chunks in side-by-side panes, one per labels key; returns {key: text}"""
+    metrics["streamed"] = True
+    texts = {key: "" for key in labels}
+    panes = {}
+    with container:
+        for column, key in zip(st.columns(len(labels)), labels):
+            with column:
+                st.caption(labels[key])
+                panes[key] = st.empty()
+    start = time.perf_counter()
+    for key, chunk in chunks:
+        metrics.setdefault("ttft_ms", (time.perf_counter() - start) * 1000)
+        texts[key] += chunk
+        panes[key].markdown(texts[key] + "▌")
+    metrics["total_ms"] = (time.perf_counter() - start) * 1000
+    metrics.setdefault("ttft_ms", metrics["total_ms"])
+    for key, text in texts.items():
+        panes[key].markdown(text)
+    return texts
+
+def compare_replies(context, model_choice, metrics, container=None):
+    """Get the replies of both models at once, streaming them side by side into container if given.
+
+    Returns {provider: response}; the selected model's token counts go into
+    metrics and the other one's into metrics["comparison_usage"].
+    """
+    other = "claude" if model_choice == "openai" else "openai"
+    usages = {model_choice: metrics, other: metrics.setdefault("comparison_usage", {})}
+    if container is None:
+        with st.spinner("Processing..."):
+            start = time.perf_counter()
+            responses = chat_both(context, [], usages)
+            metrics["ttft_ms"] = metrics["total_ms"] = (time.perf_counter() - start) * 1000
+        return responses
+
+    labels = {model_choice: PROVIDER_NAMES[model_choice], other: PROVIDER_NAMES[other]}
+    texts = stream_side_by_side(stream_chat_both(context, [], usages), labels, container, metrics)
+    return {provider: ensure_reply_format(text, PROVIDER_NAMES[provider]) for provider, text in texts.items()}
+
+def split_replies(context, model_choice, metrics, container=None):
+    """Get Reply 1 and Reply 2 from two concurrent requests, streaming each into its own pane of container if given"""
+    if container is None:
+        with st.spinner("Processing..."):
+            start = time.perf_counter()
+            replies = chat_split(context, [], model_choice, usage=metrics)
+            metrics["ttft_ms"] = metrics["total_ms"] = (time.perf_counter() - start) * 1000
+        return replies
+
+    texts = stream_side_by_side(
+        stream_chat_split(context, [], model_choice, usage=metrics),
+        {1: "Reply 1", 2: "Reply 2"},
+        container,
+        metrics
+    )
+    return clean_single_reply(texts[1]), clean_single_reply(texts[2])
+
+def format_comparison(provider, response):
+    """Format the other model's replies for the Comparison column"""
+    return f"{PROVIDER_NAMES[provider]}:\n{response}"
+
+def speculation_key():
+    """What a speculative Random Variation was generated for"""
+    return (
+        st.session_state.client_name,
+        st.session_state.model_choice,
+        st.session_state.generation_mode,
+        st.session_state.current_question,
+        st.session_state.current_response
+    )
+
+def discard_speculation():
+    """Drop the speculative Random Variation, cancelling it if still running"""
+    speculation = st.session_state.get("speculative_retry")
+    st.session_state.speculative_retry = None
+    if speculation:
+        speculation["future"].cancel()
+    return speculation
+
+def speculate_retry():
+    """Start generating a Random Variation of the latest reply in the background.
+
+    Only in text mode with speculative retries on, and for at most
+    SPECULATIVE_RETRY_BUDGET variants per session: a variant nobody asks
+    for is paid for all the same. The variant is summarized as well, so a
+    retry that uses it needs no further calls.
+    """
+    discard_speculation()
+    stats = st.session_state.speculation_stats
+    response = st.session_state.current_response
+    if (not st.session_state.speculative_retries
+            or st.session_state.generation_mode != "text"
+            or not response or response.startswith("Error:")
+            or stats["started"] >= get_int_setting("SPECULATIVE_RETRY_BUDGET", 5)):
+        return
+    
+    # The context handle_retry() would build; keep the report of the shown reply
+    report = st.session_state.context_report
+    context = get_conversation_context(st.session_state.chat_history[:-1], st.session_state.current_question)
+    st.session_state.context_report = report
+    model_choice = st.session_state.model_choice
+    usage = {}
+
+    async def variant():
+        reply = await chat_async(context, [], model_choice, usage=usage, hedge=False)
+        if reply.startswith("Error:"):
+            return reply, ""
+        return reply, await summarize_message_async(reply)
+
+    st.session_state.speculative_retry = {"key": speculation_key(), "future": submit_async(variant()), "usage": usage}
+    stats["started"] += 1
+
+def take_speculative_retry():
+    """Get the (response, summary, usage) of the speculative Random Variation, or None.
+
+    One still running for this reply is waited for, up to
+    SPECULATIVE_RETRY_WAIT seconds, as it is ahead of a live request.
+    """
+    speculation = st.session_state.get("speculative_retry")
+    if not speculation or speculation["key"] != speculation_key():
+        # For another reply: generate live instead
+        discard_speculation()
+        return None
+    try:
+        with st.spinner("Processing..."):
+            response, summary = speculation["future"].result(get_float_setting("SPECULATIVE_RETRY_WAIT", 15.0))
+    except FutureTimeoutError:
+        print("Speculative retry did not finish in time; generating live")
+        discard_speculation()
+        return None
+    except Exception as e:
+        print(f"Error in speculative retry: {e}")
+        st.session_state.speculative_retry = None
+        return None
+    st.session_state.speculative_retry = None
+    if response.startswith("Error:"):
+        return None
+    st.session_state.speculation_stats["used"] += 1
+    return response, summary, speculation["usage"]
+
+def timed_stream(chunks, metrics):
+    """Pass streamed chunks through, recording time to first token and total time"""
+    start = time.perf_counter()
+    for chunk in chunks:
+        if "ttft_ms" not in metrics:
+            metrics["ttft_ms"] = (time.perf_counter() - start) * 1000
+        yield chunk
+    metrics["total_ms"] = (time.perf_counter() - start) * 1000
+    metrics.setdefault("ttft_ms", metrics["total_ms"])
+
+def record_turn_metrics(metrics):
+    """Keep the timings of the latest turns in the session"""
+    st.session_state.turn_metrics = (st.session_state.turn_metrics + [metrics])[-50:]
+
+def handle_chat_input(prompt, container=None):
     if not prompt:
         return
         
@@ -179,16 +362,53 @@ def handle_chat_input(prompt):
     # Get conversation context from history
     context = get_conversation_context(st.session_state.chat_history, prompt)
     
-    with st.spinner("Processing..."):
-        # Pass the full context as the prompt
-        response = chat(context, [], st.session_state.model_choice)
+    model_choice = st.session_state.model_choice
+    metrics = {"model": model_choice, "streamed": False, "context_tokens": st.session_state.context_report["used"]}
+    live = None
+    replies_container = None
+    structured = None
+    replies = None
+    comparison = None
+    if st.session_state.generation_mode == "structured":
+        # Both replies and the summary from a single (non-streamed) call
+        structured = generate_structured(context, model_choice, metrics)
+    
+    if not structured and st.session_state.stream_replies and container is not None:
+        # Show the reply in the chat as it is generated
+        live, replies_container = show_live_turn(container, prompt)
+    
+    if structured:
+        replies = structured["reply1"], structured["reply2"]
+        response = format_replies(*replies)
+    elif st.session_state.generation_mode == "compare":
+        # Both models at once; the selected one's replies fill the usual columns
+        responses = compare_replies(context, model_choice, metrics, replies_container)
+        response = responses.pop(model_choice)
+        comparison = next(iter(responses.items()))
+    elif st.session_state.generation_mode == "split":
+        # Reply 1 and Reply 2 from concurrent requests
+        replies = split_replies(context, model_choice, metrics, replies_container)
+        response = format_replies(*replies)
+    elif replies_container is not None:
+        metrics["streamed"] = True
+        with replies_container:
+            streamed = st.write_stream(timed_stream(stream_reply(context, model_choice, metrics), metrics))
+        # A hedged stream may have come from the other model
+        provider = "Claude" if metrics.get("answered_by", model_choice) == "claude" else "OpenAI"
+        response = ensure_reply_format(streamed, provider)
+    else:
+        with st.spinner("Processing..."):
+            start = time.perf_counter()
+            # Pass the full context as the prompt
+            response = generate_reply(context, model_choice, metrics)
+            metrics["ttft_ms"] = metrics["total_ms"] = (time.perf_counter() - start) * 1000
+    record_turn_metrics(metrics)
     
     # Save the interaction to chat history with full details
     current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    summary = summarize_message(response)
     
-    # Parse replies
-    reply1, reply2 = parse_replies(response)
+    # Parse replies, unless they came separately
+    reply1, reply2 = replies or parse_replies(response)
     
     new_interaction = {
         "timestamp": current_time,
@@ -198,19 +418,22 @@ def handle_chat_input(prompt):
         "reply1": reply1,
         "reply2": reply2,
         "final_reply": response,  # Initially same as full response
-        "summary": summary
+        "summary": structured["summary"] if structured else "",  # Else filled in by the turn pipeline
+        "comparison": format_comparison(*comparison) if comparison else ""
     }
     
     st.session_state.chat_history.append(new_interaction)
     st.session_state.current_response = response
+    st.session_state.current_comparison = comparison
     
-    # Save to sheets
-    try:
-        sheet_service = get_sheet_service()
-        if sheet_service:
-            save_interaction_to_sheets(sheet_service, st.session_state.client_name, new_interaction)
-    except Exception as e:
-        st.error(f"Error saving to sheets: {e}")
+    # Save to sheets and summarize in the background
+    save_turn(st.session_state.client_name, new_interaction, metrics)
+    
+    if live is not None:
+        # The chat container renders the finished turn
+        live.empty()
+    
+    speculate_retry()
 
 def render_chat_interface():
     if st.session_state.show_history:
@@ -230,7 +453,7 @@ def render_chat_interface():
             key=f"chat_input_{st.session_state.session_id}"
         )
         if prompt:
-            handle_chat_input(prompt)
+            handle_chat_input(prompt, chat_container)
         
         # Display chat in the container
         with chat_container:
@@ -241,8 +464,19 @@ def render_chat_interface():
                 
                 if st.session_state.current_response:
                     with st.chat_message("assistant"):
-                        # First show the response
-                        st.markdown(st.session_state.current_response)
+                        # First show the response, next to the other model's in compare mode
+                        if st.session_state.current_comparison:
+                            other, other_response = st.session_state.current_comparison
+                            selected = "claude" if other == "openai" else "openai"
+                            selected_col, other_col = st.columns(2)
+                            with selected_col:
+                                st.caption(PROVIDER_NAMES[selected])
+                                st.markdown(st.session_state.current_response)
+                            with other_col:
+                                st.caption(PROVIDER_NAMES[other])
+                                st.markdown(other_response)
+                        else:
+                            st.markdown(st.session_state.current_response)
                         
                         # Add retry button
                         retry_col1, retry_col2 = st.columns([0.15, 0.85])
@@ -306,20 +540,13 @@ def render_chat_interface():
                         key=f"save_reply_{st.session_state.session_id}",
                         use_container_width=True
                     ):
-                        with st.spinner("Saving reply..."):
-                            try:
-                                # Update the final reply in sheets
-                                st.session_state.chat_history[-1]["final_reply"] = edited_reply
-                                sheet_service = get_sheet_service()
-                                if sheet_service:
-                                    save_interaction_to_sheets(
-                                        sheet_service,
-                                        st.session_state.client_name,
-                                        st.session_state.chat_history[-1]
-                                    )
-                                st.success("Reply saved successfully!")
-                            except Exception as e:
-                                st.error(f"Error saving reply: {e}")
+                        # Update the final reply in sheets
+                        st.session_state.chat_history[-1]["final_reply"] = edited_reply
+                        if save_interaction_to_sheets(
+                            st.session_state.client_name,
+                            st.session_state.chat_history[-1]
+                        ):
+                            st.success("Reply saved successfully!")
     else:
         st.title("Client Conversation Assistant")
         st.info("👈 Please select or enter a client name in the sidebar to start.")
@@ -337,6 +564,7 @@ def initialize_session_state():
         'chat_history': [],
         'current_question': None,
         'current_response': None,
+        'current_comparison': None,
         'model_choice': "openai",
         'client_initialized': False,
         'needs_update': False,
@@ -345,7 +573,14 @@ def initialize_session_state():
         'current_page': 0,
         'show_retry_options': False,
         'retry_clicked': False,
-        'guidance_text': ""
+        'guidance_text': "",
+        'stream_replies': get_bool_setting("STREAM_REPLIES", True),
+        'generation_mode': get_setting("GENERATION_MODE", "text"),
+        'hedged_requests': get_bool_setting("HEDGED_REQUESTS", False),
+        'speculative_retries': get_bool_setting("SPECULATIVE_RETRY", False),
+        'speculative_retry': None,
+        'speculation_stats': {"started": 0, "used": 0},
+        'turn_metrics': []
     }
     
     for key, default_value in defaults.items():
@@ -387,15 +622,23 @@ def handle_start_conversation(client_name):
     st.session_state.client_name = client_name
     st.session_state.client_initialized = True
     
-    # Load chat history from sheets
+    # Load chat history, including writes not replicated to sheets yet
     st.session_state.chat_history = load_chat_history(client_name)
     st.session_state.needs_update = True
+    
+    # Digest older days of the history and index it in the background
+    if get_bool_setting("ROLLING_MEMORY", True):
+        remember_history_in_background(client_name, st.session_state.chat_history, condense_memory)
+    if get_bool_setting("RETRIEVAL_MEMORY", True):
+        index_in_background(client_name, st.session_state.chat_history)
 
 def handle_clear_chat():
     st.session_state.session_id = str(uuid.uuid4())
     st.session_state.chat_history = []
     st.session_state.current_response = None
+    st.session_state.current_comparison = None
     st.session_state.current_question = None
+    discard_speculation()
     st.session_state.needs_update = True
 
 def handle_new_client():
@@ -404,7 +647,9 @@ def handle_new_client():
     st.session_state.client_initialized = False
     st.session_state.chat_history = []
     st.session_state.current_response = None
+    st.session_state.current_comparison = None
     st.session_state.current_question = None
+    discard_speculation()
     st.session_state.needs_update = True
 
 def render_sidebar():
@@ -446,6 +691,37 @@ def render_sidebar():
         )
         if model != st.session_state.model_choice:
             st.session_state.model_choice = model
+        st.radio(
+            "Generation mode:",
+            ["text", "structured", "compare", "split"],
+            key="generation_mode",
+            format_func=lambda mode: {
+                "text": "Text + summary", "structured": "Structured", "compare": "Compare models", "split": "Parallel replies"
+            }[mode],
+            horizontal=True,
+            help="Structured asks for both replies and the summary in one call; "
+            "Compare models asks both models at once and shows their replies side by side; "
+            "Parallel replies asks for Reply 1 and Reply 2 separately, at the same time"
+        )
+        st.toggle(
+            "Stream replies",
+            key="stream_replies",
+            help="Show replies as they are generated (not in structured mode)",
+            disabled=st.session_state.generation_mode == "structured"
+        )
+        st.toggle(
+            "Hedge with the other model",
+            key="hedged_requests",
+            help="When the selected model is slower than usual, ask the other one too and keep the first reply (text mode)",
+            disabled=st.session_state.generation_mode != "text"
+        )
+        st.toggle(
+            "Pre-generate a variation",
+            key="speculative_retries",
+            help="Generate a Random Variation in the background after each reply, so retrying is instant (text mode; "
+            f"at most {get_int_setting('SPECULATIVE_RETRY_BUDGET', 5)} per session)",
+            disabled=st.session_state.generation_mode != "text"
+        )
         
         # Chat History Viewer
         if st.session_state.client_initialized:
@@ -478,6 +754,86 @@ def render_sidebar():
         # Display session info
         st.markdown("---")
         st.caption(f"Session ID: {st.session_state.session_id}")
+        
+        write_stats = get_write_queue_stats()
+        if write_stats["queue_depth"] or write_stats["last_flush_ms"] is not None:
+            last_flush = write_stats["last_flush_ms"]
+            st.caption(
+                f"Sheets sync: {write_stats['queue_depth']} pending"
+                + (f", last flush {last_flush:.0f} ms" if last_flush is not None else "")
+            )
+        if write_stats["dead_letters"]:
+            st.caption(f"Sheets sync: {write_stats['dead_letters']} failed writes set aside")
+            with st.expander("Failed writes"):
+                if st.button("Retry failed writes", use_container_width=True):
+                    st.caption(f"Queued {retry_dead_letters()} writes again")
+                for client, interaction, error, attempts, failed_at in dead_letters():
+                    st.markdown(
+                        f"**{client}** ({time.strftime('%Y-%m-%d %H:%M', time.localtime(failed_at))}, "
+                        f"{attempts} attempts): {interaction.get('user_message', '')}"
+                    )
+                    st.caption(error)
+
+        if st.session_state.turn_metrics:
+            last_turn = st.session_state.turn_metrics[-1]
+            st.caption(
+                f"Last reply: first token {last_turn['ttft_ms']:.0f} ms, "
+                f"total {last_turn['total_ms'] / 1000:.1f} s"
+                + (f", summary {last_turn['summarize_ms'] / 1000:.1f} s" if 'summarize_ms' in last_turn else "")
+                + (f", answered by {'Claude' if last_turn['answered_by'] == 'claude' else 'OpenAI'}" if last_turn.get('hedged') else "")
+                + (", pre-generated" if last_turn.get('speculative') else "")
+            )
+            if last_turn.get('input_tokens'):
+                st.caption(
+                    f"Prompt cache: {last_turn['cache_read_tokens']}/{last_turn['input_tokens']} input tokens read"
+                    + (f", {last_turn['cache_write_tokens']} written" if last_turn['cache_write_tokens'] is not None else "")
+                )
+
+        speculation_stats = st.session_state.speculation_stats
+        if speculation_stats["started"]:
+            st.caption(
+                f"Pre-generated variations: {speculation_stats['used']}/{speculation_stats['started']} used"
+            )
+
+        context_report = st.session_state.get("context_report")
+        if context_report:
+            st.caption(
+                f"Context: {context_report['used']}/{context_report['budget']} tokens"
+                + (" (est.)" if context_report['estimated'] else "")
+                + f", {context_report['full_turns']} full, {context_report['summarized_turns']} summarized, "
+                f"{context_report['omitted_turns']} omitted"
+                + (f", {context_report['remembered_turns']} in memory" if context_report['remembered_turns'] else "")
+                + (f", {context_report['relevant_turns']} retrieved" if context_report['relevant_turns'] else "")
+            )
+
+        cache_stats = get_summary_cache_stats()
+        if cache_stats["hit_rate"] is not None:
+            st.caption(
+                f"Summary cache: {cache_stats['hit_rate']:.0%} hits, "
+                f"{cache_stats['entries']} cached"
+            )
+
+        limiter_stats = get_rate_limiter_stats()
+        if limiter_stats["throttled"] or limiter_stats["retried"]:
+            st.caption(
+                f"Google API: {limiter_stats['throttled']} throttled, "
+                f"{limiter_stats['retried']} retried, {limiter_stats['failed']} failed"
+            )
+
+        for key, stats in get_latency_stats().items():
+            provider, kind = key.split(":")
+            st.caption(
+                f"{'Claude' if provider == 'claude' else 'OpenAI'} {kind.replace('_', ' ')} latency: "
+                f"p50 {stats['p50']:.1f} s, p95 {stats['p95']:.1f} s"
+            )
+
+        for provider, counts in get_llm_client_metrics().items():
+            if counts["requests"]:
+                st.caption(
+                    f"{'Claude' if provider == 'claude' else 'OpenAI'} connections: "
+                    f"{counts['reused']}/{counts['requests']} requests reused one, "
+                    f"{counts['tls_handshakes']} TLS handshakes"
+                )
 
 def render_chat_history_viewer():
     """Render the chat history viewer interface"""
@@ -636,42 +992,81 @@ def render_chat_history_viewer():
 
 def handle_retry(guidance=None):
     """Handle retry logic with or without guidance"""
-    context = get_conversation_context(
-        st.session_state.chat_history[:-1], 
-        st.session_state.current_question
-    )
-    
-    if guidance:
-        context += f"\n\nGuidance for your response: {guidance}"
+    metrics = {
+        "model": st.session_state.model_choice,
+        "streamed": False,
+        "retry": True
+    }
+    structured = None
+    comparison = None
+    summary = ""
     
-    new_response = chat(context, [], st.session_state.model_choice)
+    # A Random Variation may have been generated in the background already
+    start = time.perf_counter()
+    speculation = None if guidance else take_speculative_retry()
+    if speculation:
+        new_response, summary, usage = speculation
+        waited_ms = (time.perf_counter() - start) * 1000
+        metrics.update(usage, speculative=True, ttft_ms=waited_ms, total_ms=waited_ms)
+        reply1, reply2 = parse_replies(new_response)
+    else:
+        discard_speculation()
+        context = get_conversation_context(
+            st.session_state.chat_history[:-1], 
+            st.session_state.current_question
+        )
+        
+        if guidance:
+            context = context.with_guidance(guidance)
+        
+        metrics["context_tokens"] = st.session_state.context_report["used"]
+        if st.session_state.generation_mode == "structured":
+            structured = generate_structured(context, st.session_state.model_choice, metrics)
+        
+        if structured:
+            new_response = format_replies(structured["reply1"], structured["reply2"])
+            reply1, reply2 = structured["reply1"], structured["reply2"]
+            summary = structured["summary"]
+        elif st.session_state.generation_mode == "split":
+            reply1, reply2 = split_replies(context, st.session_state.model_choice, metrics)
+            new_response = format_replies(reply1, reply2)
+        elif st.session_state.generation_mode == "compare":
+            responses = compare_replies(context, st.session_state.model_choice, metrics)
+            new_response = responses.pop(st.session_state.model_choice)
+            comparison = next(iter(responses.items()))
+            reply1, reply2 = parse_replies(new_response)
+        else:
+            start = time.perf_counter()
+            new_response = generate_reply(context, st.session_state.model_choice, metrics)
+            metrics["ttft_ms"] = metrics["total_ms"] = (time.perf_counter() - start) * 1000
+            reply1, reply2 = parse_replies(new_response)
+    record_turn_metrics(metrics)
     
     # Update the last interaction with new response
-    reply1, reply2 = parse_replies(new_response)
     st.session_state.chat_history[-1].update({
         "bot_reply": new_response,
         "reply1": reply1,
         "reply2": reply2,
         "final_reply": new_response,
-        "summary": summarize_message(new_response)
+        "summary": summary,
+        "comparison": format_comparison(*comparison) if comparison else ""
     })
     
-    # Save updated response to sheets
-    try:
-        sheet_service = get_sheet_service()
-        if sheet_service:
-            save_interaction_to_sheets(
-                sheet_service,
-                st.session_state.client_name,
-                st.session_state.chat_history[-1]
-            )
-    except Exception as e:
-        st.error(f"Error saving retry to sheets: {e}")
+    # Save updated response to sheets and summarize it in the background
+    save_turn(
+        st.session_state.client_name,
+        st.session_state.chat_history[-1],
+        metrics
+    )
         
     st.session_state.current_response = new_response
+    st.session_state.current_comparison = comparison
     st.session_state.show_retry_options = False
     st.session_state.retry_clicked = False
     st.session_state.guidance_text = ""
+    
+    # And the next one, should this one not do either
+    speculate_retry()
 
 if __name__ == "__main__":
     main() 
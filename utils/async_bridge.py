@@ -0,0 +1,107 @@
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Awaitable, Dict, Iterator, Tuple
+from concurrent.futures import Future
+
+# One asyncio event loop for the whole process, on a daemon thread.
+#
+# Streamlit runs each rerun on a thread of its own without an event loop,
+# so coroutines (the async LLM calls in fred_us_tools_2) are handed to this
+# loop and the calling thread waits for, or iterates over, their results.
+# Independent calls gathered in one coroutine run concurrently, and calls
+# from every session share the loop and its async clients
+# (utils/llm_clients.get_async_llm_client) instead of holding a thread each.
+_loop = None
+_lock = threading.Lock()
+
+# Seconds iterate_async() waits for an abandoned iterator to close
+CLOSE_TIMEOUT = 2.0
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Get the shared event loop, starting its thread on first use"""
+    global _loop
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="async-bridge", daemon=True).start()
+            _loop = loop
+        return _loop
+
+def submit_async(coroutine: Awaitable) -> Future:
+    """Schedule a coroutine on the shared loop; returns a concurrent.futures.Future"""
+    return asyncio.run_coroutine_threadsafe(coroutine, get_loop())
+
+def run_async(coroutine: Awaitable, timeout: float = None) -> Any:
+    """Run a coroutine on the shared loop and wait for its result"""
+    future = submit_async(coroutine)
+    try:
+        return future.result(timeout)
+    except BaseException:
+        # Timed out or interrupted (e.g. Streamlit stopping the rerun): stop the work too
+        future.cancel()
+        raise
+
+async def _step_async(iterator: AsyncIterator, step: Dict[str, Any]) -> Any:
+    step["task"] = asyncio.current_task()
+    return await iterator.__anext__()
+
+async def _close_async(iterator: AsyncIterator, step: Dict[str, Any]) -> None:
+    # An async generator cannot be closed while a step of it is still running
+    task = step.get("task")
+    if task is not None and not task.done():
+        task.cancel()
+        await asyncio.wait([task])
+    aclose = getattr(iterator, "aclose", None)
+    if aclose is not None:
+        await aclose()
+
+def iterate_async(iterator: AsyncIterator) -> Iterator:
+    """Iterate an async iterator (e.g. a streamed reply) from a synchronous thread.
+
+    Abandoned early, the pending step is cancelled and the iterator closed
+    (closing its HTTP stream), waiting up to CLOSE_TIMEOUT seconds for that.
+    """
+    loop = get_loop()
+    step = {}
+    pending = None
+    try:
+        while True:
+            pending = asyncio.run_coroutine_threadsafe(_step_async(iterator, step), loop)
+            try:
+                item = pending.result()
+            except StopAsyncIteration:
+                pending = None
+                return
+            pending = None
+            yield item
+    finally:
+        if pending is not None:
+            pending.cancel()
+        closing = asyncio.run_coroutine_threadsafe(_close_async(iterator, step), loop)
+        try:
+            closing.result(CLOSE_TIMEOUT)
+        except Exception as e:
+            print(f"Error closing async iterator: {e!r}")
+
+async def merge_async(iterators: Dict[Any, AsyncIterator]) -> AsyncIterator[Tuple[Any, Any]]:
+    """Iterate several async iterators at once, yielding (key, item) as items arrive"""
+    pending = {asyncio.ensure_future(iterator.__anext__()): key for key, iterator in iterators.items()}
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                key = pending.pop(task)
+                try:
+                    item = task.result()
+                except StopAsyncIteration:
+                    continue
+                pending[asyncio.ensure_future(iterators[key].__anext__())] = key
+                yield key, item
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        for iterator in iterators.values():
+            aclose = getattr(iterator, "aclose", None)
+            if aclose is not None:
+                await aclose()
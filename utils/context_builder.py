@@ -0,0 +1,331 @@
+from functools import lru_cache
+from typing import NamedTuple
+from utils.settings import get_setting, get_int_setting
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a characters-per-token estimate
+    tiktoken = None
+
+# Token-budgeted conversation context for the chat prompt.
+#
+# The system prompt, the client line and the current message are always
+# included. Past interactions are then added newest first: in full while
+# they fit the budget, then (from the first one that does not fit on) by
+# their summary, until even a summary does not fit; a turn whose summary is
+# not written yet is skipped rather than ending the history. When rolling
+# memory digests are given they come first and stand in for the raw turns of the
+# days they cover; turns of the recent days (from memory["raw_from"] on) are
+# still sent raw while they fit, and only the digests of recent days some of
+# whose turns did not fit are kept. Retrieved interactions (utils/vector_memory.py) are
+# added by summary unless they are already in the history part; they change
+# with every message, so they go after the history, next to the current
+# message, to keep the prompt prefix stable for provider prompt caching
+# (system prompt, then the client line, memory and history). Token counts
+# are cached per text, so each interaction is counted once per process, and a
+# ConversationContext kept in the session also caches each interaction's
+# formatted blocks, so a turn only formats what is new since the last one.
+# Once the history no longer fits, where it starts and where full turns
+# give way to summaries would move with every turn and change the whole
+# prefix; instead both cut-offs move by HISTORY_WINDOW_STEP turns at a time.
+# The history part is also split at the last multiple of that step: the
+# turns before it stay the same for that many turns, so a provider can
+# cache them, and only the recent turns after it change.
+# The result is returned in parts (system prompt, history, recent turns,
+# current message) for the providers to use as they are.
+#
+#   CONTEXT_TOKEN_BUDGET    tokens for the whole context (default 6000)
+#   CONTEXT_TOKEN_ENCODING  tiktoken encoding, if installed (default cl100k_base)
+#   HISTORY_WINDOW_STEP     turns the history cut-offs move at a time (default 8)
+CHARS_PER_TOKEN = 4
+
+@lru_cache(maxsize=1)
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(get_setting("CONTEXT_TOKEN_ENCODING", "cl100k_base"))
+    except Exception as e:
+        print(f"Error loading tiktoken encoding, estimating token counts: {e}")
+        return None
+
+@lru_cache(maxsize=8192)
+def count_tokens(text):
+    """Count (or, without tiktoken, estimate) the tokens of a text"""
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def format_interaction(interaction, client_name):
+    """Format a past interaction in full"""
+    block = f"\nTime: {interaction.get('timestamp', 'No timestamp')}\n"
+    block += f"{client_name}: {interaction['user_message']}\n"
+    block += f"Your response: {interaction['bot_reply']}\n"
+    if interaction.get('summary'):
+        block += f"Summary: {interaction['summary']}\n"
+    return block + "---\n"
+
+def format_summary(interaction, client_name):
+    """Format a past interaction by its summary only, or None if it has none"""
+    if not interaction.get('summary'):
+        return None
+    block = f"\nTime: {interaction.get('timestamp', 'No timestamp')}\n"
+    block += f"{client_name}: {interaction['user_message']}\n"
+    block += f"Summary of your response: {interaction['summary']}\n"
+    return block + "---\n"
+
+def format_memory(memory):
+    """Format rolling memory digests (see utils/rolling_memory.py), or "" if there are none"""
+    block = ""
+    if memory.get("overall"):
+        block += f"Overall: {memory['overall']}\n"
+    for day, digest in memory.get("days", []):
+        block += f"On {day}: {digest}\n"
+    return "\nMemory of earlier conversations:\n" + block if block else ""
+
+def format_relevant(meta, client_name):
+    """Format a retrieved past interaction"""
+    block = f"\nTime: {meta.get('timestamp') or 'No timestamp'}\n"
+    block += f"{client_name}: {meta['user_message']}\n"
+    if meta.get('summary'):
+        block += f"Summary of your response: {meta['summary']}\n"
+    return block + "---\n"
+
+def _key(interaction):
+    return (interaction.get('timestamp', ''), interaction.get('user_message', ''))
+
+def _day(interaction):
+    return (interaction.get('timestamp') or '')[:10]
+
+def _covered(memory, interaction):
+    """Whether the memory digests cover the raw turn"""
+    day = _day(interaction)
+    through = memory.get("through")
+    return day in memory.get("covered_days", ()) or bool(through and day and day <= through)
+
+def _round_up(index, step):
+    return -(-index // step) * step
+
+def _replaced(memory, interaction):
+    """Whether the memory digests replace the raw turn even when it would fit"""
+    raw_from = memory.get("raw_from")
+    return _covered(memory, interaction) and not (raw_from and _day(interaction) >= raw_from)
+
+class PromptParts(NamedTuple):
+    """A built prompt, kept in parts so providers need not re-split it.
+
+    history is the part that stays the same from turn to turn for a while
+    and recent the history turns after it.
+    """
+    system: str
+    history: str
+    current: str
+    recent: str = ""
+
+    def text(self):
+        """The prompt as one string, as build_context() returns it"""
+        return self.system + "\n\n" + self.history + self.recent + self.current
+
+    def with_guidance(self, guidance):
+        return self._replace(current=self.current + f"\n\nGuidance for your response: {guidance}")
+
+class ConversationContext:
+    """Incrementally maintained context of one client's conversation.
+
+    Keep one per session (st.session_state) and call build() every turn:
+    the formatted blocks and token counts of past interactions are cached
+    by position and only redone for interactions that are new or changed
+    since the last build (a summary filled in, a retry, a saved reply).
+    """
+
+    def __init__(self, client_name):
+        self.client_name = client_name
+        # History position -> (signature, full block, its tokens, summary block or None, its tokens)
+        self._entries = {}
+        # (oldest turn, first full turn) of the last saturated history part
+        self._window = None
+
+    def _entry(self, index, interaction):
+        signature = (
+            interaction.get('timestamp'), interaction.get('user_message'),
+            interaction.get('bot_reply'), interaction.get('summary')
+        )
+        entry = self._entries.get(index)
+        if entry is None or entry[0] != signature:
+            full = format_interaction(interaction, self.client_name)
+            summary = format_summary(interaction, self.client_name)
+            entry = (signature, full, count_tokens(full), summary, count_tokens(summary) if summary else 0)
+            self._entries[index] = entry
+        return entry
+
+    def _fill(self, chat_history, indexes, room, full_from=None):
+        """Pick the turns of the history part, newest first; returns [(index, block, tokens, full)].
+
+        Turns go in full while they fit (with full_from, only from that
+        index on), then by summary until one does not fit. A turn that does
+        not fit in full and has no summary yet is skipped.
+        """
+        picked = []
+        summarizing = False
+        for index in reversed(indexes):
+            _, full_block, full_tokens, summary_block, summary_tokens = self._entry(index, chat_history[index])
+            if full_from is not None:
+                summarizing = index < full_from
+            if not summarizing and full_tokens <= room:
+                picked.append((index, full_block, full_tokens, True))
+                room -= full_tokens
+            # Out of room for full turns; older ones go in as summaries
+            elif summary_block is None:
+                summarizing = True
+            elif summary_tokens <= room:
+                summarizing = True
+                picked.append((index, summary_block, summary_tokens, False))
+                room -= summary_tokens
+            else:
+                break
+        return picked
+
+    def _fill_window(self, chat_history, indexes, room, oldest, full_from):
+        """Pick the turns from oldest on, in full from full_from on, or None if they do not all fit"""
+        indexes = [index for index in indexes if index >= oldest]
+        picked = self._fill(chat_history, indexes, room, full_from)
+        # Only turns with no summary yet may be missing
+        missing = set(indexes) - {index for index, _, _, _ in picked}
+        if any(index >= full_from or self._entry(index, chat_history[index])[3] is not None for index in missing):
+            return None
+        if any(index >= full_from and not is_full for index, _, _, is_full in picked):
+            return None
+        return picked
+
+    def build(self, system_prompt, chat_history, current_question, budget=None, memory=None, relevant=None):
+        """Build the prompt within a token budget; returns (PromptParts, report).
+
+        chat_history must be the session's history or a prefix of it. With
+        memory, the digests are included and replace the raw turns of the
+        days they cover, except for recent turns that fit. relevant is a list of retrieved interactions (dicts
+        with timestamp, user_message and summary), best first. The history
+        turns since the last multiple of HISTORY_WINDOW_STEP are returned
+        separately as PromptParts.recent.
+        """
+        if budget is None:
+            budget = get_int_setting("CONTEXT_TOKEN_BUDGET", 6000)
+        client_name = self.client_name
+
+        header = f"You are currently chatting with {client_name}.\n"
+        footer = f"\nCurrent message from {client_name}: {current_question}\n"
+        footer += "\nRespond naturally as Fred, maintaining consistency with your personality and previous interactions."
+        history_title = "\nPrevious conversation history:\n"
+
+        used = count_tokens(system_prompt + "\n\n") + count_tokens(header) + count_tokens(footer)
+
+        memory_block = ""
+        indexes = range(len(chat_history))
+        if memory:
+            memory_block = format_memory(memory)
+            if memory_block and used + count_tokens(memory_block) > budget:
+                # Keep the overall digest only
+                memory_block = format_memory({"overall": memory.get("overall")})
+                memory = dict(memory, days=[], covered_days=set())
+            if memory_block and used + count_tokens(memory_block) <= budget:
+                used += count_tokens(memory_block)
+                indexes = [index for index in indexes if not _replaced(memory, chat_history[index])]
+            else:
+                memory_block = ""
+                memory = None
+
+        # Room for retrieved interactions is set aside before the history
+        relevant_title = "\nRelevant earlier moments:\n"
+        relevant_blocks = []
+        reserved = count_tokens(relevant_title) if relevant else 0
+        for meta in relevant or []:
+            block = format_relevant(meta, client_name)
+            if used + reserved + count_tokens(block) > budget:
+                break
+            relevant_blocks.append((_key(meta), block))
+            reserved += count_tokens(block)
+        budget -= reserved
+
+        if indexes:
+            used += count_tokens(history_title)
+
+        picked = self._fill(chat_history, indexes, budget - used)
+        step = max(1, get_int_setting("HISTORY_WINDOW_STEP", 8))
+        if step > 1 and picked and (len(picked) < len(indexes) or not picked[-1][3]):
+            # Saturated: keep the cut-offs of the last turn while everything
+            # after them still fits, else move both to the next multiple of
+            # the step, which leaves out or summarizes a few more turns but
+            # keeps them where they are for the next turns
+            kept = self._window and self._fill_window(chat_history, indexes, budget - used, *self._window)
+            if kept:
+                picked = kept
+            else:
+                newest = picked[0][0]
+                oldest = picked[-1][0]
+                if oldest > indexes[0] and _round_up(oldest, step) <= newest:
+                    oldest = _round_up(oldest, step)
+                fulls = [index for index, _, _, is_full in picked if is_full]
+                full_from = max(min(_round_up(fulls[-1], step), newest) if fulls else newest + 1, oldest)
+                picked = self._fill(chat_history, [index for index in indexes if index >= oldest], budget - used, full_from)
+                self._window = (oldest, full_from)
+
+        # Turns before the last multiple of the step stay put for the next turns
+        stable_end = len(chat_history) // step * step
+        blocks = [block for index, block, _, _ in reversed(picked) if index < stable_end]
+        recent_blocks = [block for index, block, _, _ in reversed(picked) if index >= stable_end]
+        used += sum(tokens for _, _, tokens, _ in picked)
+        full = sum(1 for *_, is_full in picked if is_full)
+        summarized = len(picked) - full
+        included = {_key(chat_history[index]) for index, _, _, _ in picked}
+
+        if memory_block and memory.get("days"):
+            # Recent days all of whose turns went in raw need no digest
+            left_out = {_day(turn) for turn in chat_history if _key(turn) not in included}
+            days = [(day, digest) for day, digest in memory["days"] if day in left_out]
+            if len(days) < len(memory["days"]):
+                used -= count_tokens(memory_block)
+                memory_block = format_memory(dict(memory, days=days))
+                used += count_tokens(memory_block)
+
+        # Retrieved interactions already in the history part are not repeated
+        relevant_blocks = [block for key, block in relevant_blocks if key not in included]
+        budget += reserved
+        relevant_block = relevant_title + "".join(relevant_blocks) if relevant_blocks else ""
+        if relevant_block:
+            used += count_tokens(relevant_block)
+
+        # Turns left out of the history part that a digest covers
+        remembered = sum(
+            1 for turn in chat_history
+            if memory_block and _key(turn) not in included and _covered(memory, turn)
+        )
+
+        history = [header, memory_block]
+        if indexes:
+            history.append(history_title)
+            history.extend(blocks)
+
+        report = {
+            "budget": budget,
+            "used": used,
+            "full_turns": full,
+            "summarized_turns": summarized,
+            "omitted_turns": len(chat_history) - full - summarized - remembered,
+            "memory_tokens": count_tokens(memory_block) if memory_block else 0,
+            "remembered_turns": remembered,
+            "relevant_turns": len(relevant_blocks),
+            "recent_turns": len(recent_blocks),
+            "estimated": _encoding() is None
+        }
+        return PromptParts(system_prompt, "".join(history), relevant_block + footer, "".join(recent_blocks)), report
+
+def build_context(system_prompt, client_name, chat_history, current_question, budget=None, memory=None,
+                  relevant=None):
+    """Build the prompt context as one string within a token budget; returns (context, report).
+
+    See ConversationContext.build(), which this builds from scratch.
+    """
+    parts, report = ConversationContext(client_name).build(
+        system_prompt, chat_history, current_question, budget=budget, memory=memory, relevant=relevant
+    )
+    return parts.text(), report
@@ -0,0 +1,82 @@
+import re
+import numpy as np
+
+# Local extractive summarizer, used instead of the GPT-4 summary call when
+# SUMMARIZER=extractive. Sentences are scored by the cosine similarity of
+# their TF-IDF vector to the TF-IDF centroid of the whole message (with a
+# small bonus for coming early), and the best ones are returned in their
+# original order. Runs in milliseconds without any API call.
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+_REPLY_LABEL = re.compile(r"^\s*Reply\s*\d\s*:\s*", re.IGNORECASE)
+_WORD = re.compile(r"[a-z0-9']+")
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being
+below between both but by can could did do does doing down during each few for from further
+had has have having he her here hers herself him himself his how i if in into is it its itself
+just me more most my myself no nor not now of off on once only or other our ours ourselves out
+over own same she should so some such than that the their theirs them themselves then there
+these they this those through to too under until up very was we were what when where which
+while who whom why will with would you your yours yourself yourselves i'm you're it's that's
+don't i'll i've let's
+""".split())
+
+def split_sentences(text):
+    """Split text into sentences, dropping "Reply N:" labels"""
+    sentences = []
+    for part in _SENTENCE_SPLIT.split(text or ""):
+        sentence = _REPLY_LABEL.sub("", part).strip()
+        if sentence:
+            sentences.append(sentence)
+    return sentences
+
+def tokenize(sentence):
+    """Lowercase content words of a sentence"""
+    return [word for word in _WORD.findall(sentence.lower()) if word not in STOPWORDS]
+
+def score_sentences(sentences):
+    """Score each sentence by how representative it is of the whole text"""
+    tokens = [tokenize(sentence) for sentence in sentences]
+    vocabulary = {}
+    rows, cols = [], []
+    for row, words in enumerate(tokens):
+        for word in words:
+            rows.append(row)
+            cols.append(vocabulary.setdefault(word, len(vocabulary)))
+    if not vocabulary:
+        return np.zeros(len(sentences))
+
+    counts = np.zeros((len(sentences), len(vocabulary)))
+    np.add.at(counts, (rows, cols), 1)
+
+    # Sentences play the role of documents for the inverse document frequency
+    document_frequency = np.count_nonzero(counts, axis=0)
+    idf = np.log((1 + len(sentences)) / (1 + document_frequency)) + 1
+    lengths = counts.sum(axis=1, keepdims=True)
+    weights = np.divide(counts, lengths, out=np.zeros_like(counts), where=lengths > 0) * idf
+
+    centroid = weights.mean(axis=0)
+    norms = np.linalg.norm(weights, axis=1) * np.linalg.norm(centroid)
+    similarity = np.divide(weights @ centroid, norms, out=np.zeros(len(sentences)), where=norms > 0)
+
+    position_bonus = 0.1 / (1 + np.arange(len(sentences)))
+    return similarity + position_bonus
+
+def summarize_extractive(text, max_sentences=2, max_chars=400):
+    """Pick the most representative sentences of a text, in their original order"""
+    sentences = split_sentences(text)
+    if len(sentences) <= max_sentences:
+        return " ".join(sentences)[:max_chars]
+
+    scores = score_sentences(sentences)
+    chosen = []
+    length = 0
+    for index in np.argsort(-scores, kind="stable"):
+        if len(chosen) == max_sentences:
+            break
+        sentence_length = len(sentences[index]) + 1
+        if chosen and length + sentence_length > max_chars:
+            continue
+        chosen.append(index)
+        length += sentence_length
+    return " ".join(sentences[index] for index in sorted(chosen))[:max_chars]
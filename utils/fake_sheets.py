@@ -0,0 +1,230 @@
+import re
+import json
+import time
+import random
+import threading
+from collections import deque
+import httplib2
+from googleapiclient.errors import HttpError
+from utils.settings import get_float_setting, get_int_setting
+
+# In-process stand-in for the Google Sheets API, used with STORAGE_BACKEND=fake
+# to run, benchmark and load-test the app offline. It implements the subset of
+# spreadsheets() / spreadsheets().values() the app calls, sleeps for a
+# simulated round trip on every execute() and answers 429 once the per-minute
+# read or write quota is used up, like the real API.
+#
+#   FAKE_SHEETS_LATENCY_MS       mean simulated round trip (default 150)
+#   FAKE_SHEETS_READ_QUOTA       read requests per minute (default 60)
+#   FAKE_SHEETS_WRITE_QUOTA      write requests per minute (default 60)
+
+_A1_RANGE = re.compile(r"^(?:'?(?P<sheet>.+?)'?!)?(?P<start_col>[A-Z]*)(?P<start_row>\d*)(?::(?P<end_col>[A-Z]*)(?P<end_row>\d*))?$")
+
+_UNBOUNDED = 10 ** 6
+
+def _column_index(letters):
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index - 1
+
+def _column_letters(index):
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+def _http_error(status, message, uri="https://sheets.googleapis.com/fake"):
+    content = json.dumps({"error": {"code": status, "message": message}}).encode()
+    return HttpError(httplib2.Response({"status": status}), content, uri=uri)
+
+class _Request:
+    """Deferred call, executed like googleapiclient.http.HttpRequest"""
+
+    def __init__(self, service, kind, handler):
+        self._service = service
+        self._kind = kind
+        self._handler = handler
+
+    def execute(self, num_retries=0):
+        self._service._before_request(self._kind)
+        return self._handler()
+
+class _Values:
+    def __init__(self, service):
+        self._service = service
+
+    def get(self, spreadsheetId, range, **kwargs):
+        return _Request(self._service, "read", lambda: self._service._get_values(range))
+
+    def update(self, spreadsheetId, range, valueInputOption, body, **kwargs):
+        return _Request(self._service, "write", lambda: self._service._update_values(range, body.get('values', [])))
+
+    def append(self, spreadsheetId, range, valueInputOption, body, **kwargs):
+        return _Request(self._service, "write", lambda: self._service._append_values(range, body.get('values', [])))
+
+    def batchUpdate(self, spreadsheetId, body):
+        def run():
+            responses = [self._service._update_values(data['range'], data.get('values', [])) for data in body.get('data', [])]
+            return {"spreadsheetId": spreadsheetId, "responses": responses}
+        return _Request(self._service, "write", run)
+
+class _Spreadsheets:
+    def __init__(self, service):
+        self._service = service
+
+    def get(self, spreadsheetId, **kwargs):
+        return _Request(self._service, "read", self._service._get_spreadsheet)
+
+    def batchUpdate(self, spreadsheetId, body):
+        return _Request(self._service, "write", lambda: self._service._batch_update(body.get('requests', [])))
+
+    def values(self):
+        return _Values(self._service)
+
+class FakeSheetsService:
+    """Thread-safe in-memory spreadsheet with simulated latency and quota"""
+
+    def __init__(self, latency_ms=150.0, read_quota=60, write_quota=60):
+        self.latency_ms = latency_ms
+        self.quotas = {"read": read_quota, "write": write_quota}
+        self._sheets = {}
+        self._lock = threading.Lock()
+        self._recent = {"read": deque(), "write": deque()}
+        self.stats = {"read": 0, "write": 0, "throttled": 0}
+
+    def spreadsheets(self):
+        return _Spreadsheets(self)
+
+    def close(self):
+        pass
+
+    def _before_request(self, kind):
+        if self.latency_ms:
+            time.sleep(random.uniform(0.5, 1.5) * self.latency_ms / 1000)
+        now = time.monotonic()
+        with self._lock:
+            recent = self._recent[kind]
+            while recent and now - recent[0] >= 60:
+                recent.popleft()
+            if len(recent) >= self.quotas[kind]:
+                self.stats["throttled"] += 1
+                raise _http_error(429, f"Quota exceeded for quota metric '{kind.title()} requests' (fake)")
+            recent.append(now)
+            self.stats[kind] += 1
+
+    def _parse_range(self, range_name):
+        """Split an A1 range into (sheet, start_row, start_col, end_row or None, end_col)"""
+        match = _A1_RANGE.match(range_name)
+        sheet = match.group('sheet') if match else None
+        if sheet not in self._sheets:
+            raise _http_error(400, f"Unable to parse range: {range_name}")
+        start_col = _column_index(match.group('start_col')) if match.group('start_col') else 0
+        start_row = int(match.group('start_row')) if match.group('start_row') else 1
+        if match.group('end_col') is None:
+            # No colon: a single cell, or the whole sheet
+            if match.group('start_col'):
+                return sheet, start_row, start_col, start_row if match.group('start_row') else None, start_col
+            return sheet, start_row, start_col, None, _UNBOUNDED
+        end_col = _column_index(match.group('end_col')) if match.group('end_col') else _UNBOUNDED
+        end_row = int(match.group('end_row')) if match.group('end_row') else None
+        return sheet, start_row, start_col, end_row, end_col
+
+    def _a1(self, sheet, first_row, last_row, first_col, last_col):
+        title = f"'{sheet}'" if not sheet.isalnum() else sheet
+        return f"{title}!{_column_letters(first_col)}{first_row}:{_column_letters(last_col)}{last_row}"
+
+    def _get_spreadsheet(self):
+        with self._lock:
+            return {"sheets": [
+                {"properties": {"title": title, "sheetId": index}}
+                for index, title in enumerate(self._sheets)
+            ]}
+
+    def _batch_update(self, requests):
+        replies = []
+        with self._lock:
+            for request in requests:
+                if 'addSheet' in request:
+                    title = request['addSheet']['properties']['title']
+                    if title in self._sheets:
+                        raise _http_error(400, f"A sheet with the name \"{title}\" already exists.")
+                    self._sheets[title] = []
+                    replies.append({"addSheet": {"properties": {"title": title, "sheetId": len(self._sheets) - 1}}})
+                else:
+                    raise _http_error(400, f"Unsupported request: {list(request)}")
+        return {"replies": replies}
+
+    def _get_values(self, range_name):
+        with self._lock:
+            sheet, start_row, start_col, end_row, end_col = self._parse_range(range_name)
+            rows = self._sheets[sheet][start_row - 1:end_row]
+            values = [[str(cell) for cell in row[start_col:end_col + 1]] for row in rows]
+        # Like the real API, trailing empty cells and rows are omitted
+        values = [self._trim(row) for row in values]
+        while values and not values[-1]:
+            values.pop()
+        result = {"range": range_name, "majorDimension": "ROWS"}
+        if values:
+            result["values"] = values
+        return result
+
+    def _trim(self, row):
+        row = list(row)
+        while row and row[-1] == "":
+            row.pop()
+        return row
+
+    def _write(self, sheet, first_row, first_col, values):
+        rows = self._sheets[sheet]
+        for offset, row_values in enumerate(values):
+            index = first_row - 1 + offset
+            while len(rows) <= index:
+                rows.append([])
+            row = rows[index]
+            while len(row) < first_col + len(row_values):
+                row.append("")
+            row[first_col:first_col + len(row_values)] = ["" if v is None else str(v) for v in row_values]
+            rows[index] = self._trim(row)
+
+    def _update_values(self, range_name, values):
+        with self._lock:
+            sheet, start_row, start_col, _, _ = self._parse_range(range_name)
+            self._write(sheet, start_row, start_col, values)
+        width = max((len(row) for row in values), default=1)
+        return {
+            "updatedRange": self._a1(sheet, start_row, start_row + len(values) - 1, start_col, start_col + width - 1),
+            "updatedRows": len(values)
+        }
+
+    def _append_values(self, range_name, values):
+        with self._lock:
+            sheet, _, start_col, _, _ = self._parse_range(range_name)
+            rows = self._sheets[sheet]
+            last = len(rows)
+            while last and not rows[last - 1]:
+                last -= 1
+            first_row = last + 1
+            self._write(sheet, first_row, start_col, values)
+        width = max((len(row) for row in values), default=1)
+        return {"updates": {
+            "updatedRange": self._a1(sheet, first_row, first_row + len(values) - 1, start_col, start_col + width - 1),
+            "updatedRows": len(values)
+        }}
+
+_fake_service = None
+_fake_lock = threading.Lock()
+
+def get_fake_sheets_service():
+    """Get the process-wide fake Sheets service configured from settings"""
+    global _fake_service
+    with _fake_lock:
+        if _fake_service is None:
+            _fake_service = FakeSheetsService(
+                latency_ms=get_float_setting("FAKE_SHEETS_LATENCY_MS", 150.0),
+                read_quota=get_int_setting("FAKE_SHEETS_READ_QUOTA", 60),
+                write_quota=get_int_setting("FAKE_SHEETS_WRITE_QUOTA", 60)
+            )
+        return _fake_service
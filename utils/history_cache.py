@@ -0,0 +1,92 @@
+import threading
+from utils import local_store
+from utils.storage import get_storage
+from utils.rate_limiter import background_priority
+from utils.interaction_index import extend_index, has_index, lookup_row, turn_key
+
+# Client histories are served from the local store (utils/local_store.py).
+# Each client sheet is pulled incrementally: only rows from the stored cursor
+# on are fetched, and the background writer records the rows it writes. Once
+# a client has been pulled, reads return the local copy straight away and the
+# pull for newer rows runs in the background. Rows edited in the sheet by
+# anyone else are only picked up after invalidate_history().
+_lock = threading.Lock()
+_pulls_in_progress = set()
+
+def interaction_to_row(interaction):
+    """Format an interaction as a sheet row (columns A:H)"""
+    return [
+        interaction.get('timestamp', ''),
+        interaction.get('session_id', ''),
+        interaction.get('user_message', ''),
+        interaction.get('reply1', ''),
+        interaction.get('reply2', ''),
+        interaction.get('final_reply', ''),
+        interaction.get('summary', ''),
+        interaction.get('comparison', '')
+    ]
+
+def pull_rows(client_name, last_column="H"):
+    """Fetch the rows added since the last pull into the local store"""
+    next_row = local_store.get_next_row(client_name) or 1
+    values = get_storage().load_history(client_name, next_row, last_column)
+    local_store.store_rows(client_name, next_row, values)
+    extend_index(client_name, values, next_row)
+
+def _pull_in_background(client_name, last_column):
+    with _lock:
+        if client_name in _pulls_in_progress:
+            return
+        _pulls_in_progress.add(client_name)
+
+    def run():
+        try:
+            with background_priority():
+                pull_rows(client_name, last_column)
+        except Exception as e:
+            print(f"Error pulling rows for {client_name}: {e}")
+        finally:
+            with _lock:
+                _pulls_in_progress.discard(client_name)
+
+    threading.Thread(target=run, name=f"sheets-pull-{client_name}", daemon=True).start()
+
+def ensure_index(client_name):
+    """Make sure the row index of a client covers every row in the sheet"""
+    if not has_index(client_name):
+        extend_index(client_name, local_store.get_rows(client_name), 1)
+        pull_rows(client_name)
+
+def load_rows(client_name, last_column="H"):
+    """Get all rows of a client sheet (row 1 first), including writes not replicated yet"""
+    if get_storage().is_available():
+        if local_store.get_next_row(client_name) is None:
+            pull_rows(client_name, last_column)
+        else:
+            _pull_in_background(client_name, last_column)
+
+    rows = local_store.get_rows(client_name)
+    extend_index(client_name, rows, 1)
+
+    # Overlay upserts not replicated yet: the writes given up on (oldest
+    # first), then those still waiting in the journal, which are newer
+    pending = [interaction for _, interaction, _, _, _ in reversed(local_store.dead_letters(client_name))]
+    pending += [interaction for _, _, _, interaction in local_store.journal_entries(client_name)]
+    appended = {}
+    for interaction in pending:
+        row = interaction_to_row(interaction)
+        row_index = lookup_row(client_name, interaction) or appended.get(turn_key(interaction))
+        if row_index and row_index <= len(rows):
+            rows[row_index - 1] = row
+        else:
+            rows.append(row)
+            appended[turn_key(interaction)] = len(rows)
+    return rows
+
+def update_row(client_name, row_number, row):
+    """Record a row written to the sheet by this process in the local store"""
+    local_store.update_row(client_name, row_number, row)
+
+def invalidate_history(client_name=None):
+    """Forget the local copy of one client, or of all clients"""
+    local_store.forget_client(client_name)
@@ -0,0 +1,63 @@
+import re
+import threading
+
+# Per-client map of turn keys (timestamp, session_id, user_message) -> 1-based
+# sheet row, shared by all sessions so upserts can target a row without
+# re-reading the sheet. A retry or saved reply keeps its turn's timestamp and
+# so updates the turn's row, while the same message sent again is a new turn.
+# Rows only ever get appended by the app, so row numbers stay valid; call
+# invalidate_index() if rows are deleted or reordered by hand.
+_lock = threading.Lock()
+_indexes = {}
+
+_RANGE_ROW = re.compile(r"![A-Z]+(\d+)")
+
+def _index_values(index, values, first_row):
+    for offset, row in enumerate(values):
+        if len(row) > 2:
+            # Keep the first match, like the linear scan this replaces
+            index.setdefault((row[0], row[1], row[2]), first_row + offset)
+
+def replace_index(client_name, values):
+    """Rebuild a client's index from sheet values read from row 1"""
+    index = {}
+    _index_values(index, values, 1)
+    with _lock:
+        _indexes[client_name] = index
+
+def extend_index(client_name, values, first_row):
+    """Add rows read starting at first_row to a client's index"""
+    with _lock:
+        _index_values(_indexes.setdefault(client_name, {}), values, first_row)
+
+def has_index(client_name):
+    """Check whether a client's sheet has been indexed"""
+    with _lock:
+        return client_name in _indexes
+
+def turn_key(interaction):
+    """Get the key of the turn an interaction belongs to"""
+    return (interaction.get('timestamp', ''), interaction.get('session_id', ''), interaction.get('user_message', ''))
+
+def lookup_row(client_name, interaction):
+    """Get the sheet row of an interaction's turn, or None if it has not been written"""
+    with _lock:
+        return _indexes.get(client_name, {}).get(turn_key(interaction))
+
+def record_row(client_name, interaction, row):
+    """Remember the sheet row an interaction's turn was written to"""
+    with _lock:
+        _indexes.setdefault(client_name, {}).setdefault(turn_key(interaction), row)
+
+def invalidate_index(client_name=None):
+    """Forget the index of one client, or of all clients"""
+    with _lock:
+        if client_name is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(client_name, None)
+
+def row_from_range(range_name):
+    """Get the first row number of an A1 range like "Client!A12:G12" """
+    match = _RANGE_ROW.search(range_name or "")
+    return int(match.group(1)) if match else None
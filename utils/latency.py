@@ -0,0 +1,70 @@
+import threading
+from bisect import bisect_left
+from typing import Dict, Optional
+from utils.settings import get_int_setting, get_float_setting
+
+# Per-provider latency histograms, shared by the whole process.
+#
+# Latencies of successful provider calls are counted in log-spaced buckets
+# (each 20% wider than the previous, from 50 ms up) per provider and kind:
+# "reply" for a complete reply, "first_token" for the first streamed chunk,
+# "single_reply" and "single_reply_first_token" for the same of one reply
+# of a split turn, and "structured" for a structured-mode call.
+# Once a histogram holds LATENCY_HISTORY samples its counts are halved, so
+# percentiles follow how the provider behaves now rather than last week.
+# hedge_delay() turns them into how long to wait for a provider before
+# asking the other one as well.
+#
+#   LATENCY_HISTORY          samples before counts are halved (default 1000)
+#   HEDGE_PERCENTILE         percentile of the latency to hedge after (default 95)
+#   HEDGE_MIN_SAMPLES        samples needed before using it (default 20)
+#   HEDGE_DEFAULT_DELAY_MS   hedge delay until then (default 6000)
+BUCKETS = [0.05 * 1.2 ** i for i in range(60)]  # 50 ms .. about 2 hours
+
+_lock = threading.Lock()
+_histograms = {}
+
+def record_latency(provider, kind, seconds):
+    """Count a successful call's latency"""
+    with _lock:
+        counts = _histograms.setdefault((provider, kind), [0.0] * (len(BUCKETS) + 1))
+        counts[bisect_left(BUCKETS, seconds)] += 1
+        if sum(counts) >= get_int_setting("LATENCY_HISTORY", 1000):
+            counts[:] = [count / 2 for count in counts]
+
+def latency_count(provider, kind):
+    """Get the (decayed) number of samples of a histogram"""
+    with _lock:
+        return sum(_histograms.get((provider, kind), ()))
+
+def latency_percentile(provider, kind, fraction) -> Optional[float]:
+    """Get a latency percentile in seconds (a bucket's upper bound), or None without samples"""
+    with _lock:
+        counts = _histograms.get((provider, kind))
+        if not counts or not sum(counts):
+            return None
+        target = fraction * sum(counts)
+        seen = 0.0
+        for index, count in enumerate(counts):
+            seen += count
+            if count and seen >= target:
+                return BUCKETS[min(index, len(BUCKETS) - 1)]
+        return BUCKETS[-1]
+
+def hedge_delay(provider, kind):
+    """Seconds to wait for a provider before hedging with the other one"""
+    percentile = latency_percentile(provider, kind, get_float_setting("HEDGE_PERCENTILE", 95) / 100)
+    if percentile is None or latency_count(provider, kind) < get_int_setting("HEDGE_MIN_SAMPLES", 20):
+        return get_float_setting("HEDGE_DEFAULT_DELAY_MS", 6000) / 1000
+    return percentile
+
+def get_latency_stats() -> Dict[str, Dict[str, float]]:
+    """Get the sample count, p50 and p95 of every histogram, keyed "provider:kind" """
+    return {
+        f"{provider}:{kind}": {
+            "count": latency_count(provider, kind),
+            "p50": latency_percentile(provider, kind, 0.5),
+            "p95": latency_percentile(provider, kind, 0.95)
+        }
+        for provider, kind in list(_histograms)
+    }
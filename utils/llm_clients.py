@@ -0,0 +1,171 @@
+import threading
+from typing import Dict
+from utils.settings import get_setting, get_int_setting, get_float_setting
+
+# Process-wide OpenAI and Anthropic clients.
+#
+# SDK clients are thread-safe and each owns an HTTP connection pool, so one
+# client per provider is shared by every session and call: connections (and
+# their TLS sessions) are kept alive between calls instead of being set up
+# again for every chat, stream and summary. Each kind of operation gets a
+# view of the provider's client with its own timeouts; client.with_options()
+# shares the underlying connection pool. The async clients (for coroutines
+# run on utils/async_bridge.py's event loop) have pools of their own, with
+# the same limits and timeouts.
+#
+#   LLM_MAX_CONNECTIONS        open connections per provider (default 20)
+#   LLM_KEEPALIVE_CONNECTIONS  idle connections kept alive (default 10)
+#   LLM_KEEPALIVE_EXPIRY       seconds an idle connection is kept (default 120)
+#   LLM_CONNECT_TIMEOUT        seconds to connect (default 5)
+#   LLM_CHAT_TIMEOUT           seconds for a whole chat call (default 120)
+#   LLM_STREAM_TIMEOUT         seconds to wait for each streamed chunk (default 30)
+#   LLM_SUMMARY_TIMEOUT        seconds for a summary or memory digest (default 30)
+#   LLM_MAX_RETRIES            SDK retries of connection errors, 429 and 5xx (default 2)
+OPERATION_TIMEOUTS = {
+    "chat": ("LLM_CHAT_TIMEOUT", 120.0),
+    "stream": ("LLM_STREAM_TIMEOUT", 30.0),
+    "summary": ("LLM_SUMMARY_TIMEOUT", 30.0)
+}
+API_KEY_SETTINGS = {"openai": "OPENAI_API_KEY", "claude": "ANTHROPIC_API_KEY"}
+
+_lock = threading.Lock()
+_clients = {}
+_operation_clients = {}
+_async_clients = {}
+_async_operation_clients = {}
+_metrics = {}
+
+def _provider_metrics(provider):
+    return _metrics.setdefault(provider, {"requests": 0, "connections_opened": 0, "tls_handshakes": 0})
+
+def _count(provider, key):
+    with _lock:
+        _provider_metrics(provider)[key] += 1
+
+def _limits():
+    import httpx  # installed with the OpenAI and Anthropic SDKs
+    return httpx.Limits(
+        max_connections=get_int_setting("LLM_MAX_CONNECTIONS", 20),
+        max_keepalive_connections=get_int_setting("LLM_KEEPALIVE_CONNECTIONS", 10),
+        keepalive_expiry=get_float_setting("LLM_KEEPALIVE_EXPIRY", 120.0)
+    )
+
+def _count_connection_event(provider, event):
+    # Connection setup events only happen for requests that could not reuse one
+    if event == "connection.connect_tcp.complete":
+        _count(provider, "connections_opened")
+    elif event == "connection.start_tls.complete":
+        _count(provider, "tls_handshakes")
+
+def _http_client(provider, default_client_class):
+    """Build the provider's pooled HTTP client, counting requests and new connections"""
+    def trace(event, info):
+        _count_connection_event(provider, event)
+
+    def on_request(request):
+        _count(provider, "requests")
+        request.extensions["trace"] = trace
+
+    return default_client_class(limits=_limits(), event_hooks={"request": [on_request]})
+
+def _async_http_client(provider, default_client_class):
+    """Async counterpart of _http_client(); async HTTP clients need async hooks"""
+    async def trace(event, info):
+        _count_connection_event(provider, event)
+
+    async def on_request(request):
+        _count(provider, "requests")
+        request.extensions["trace"] = trace
+
+    return default_client_class(limits=_limits(), event_hooks={"request": [on_request]})
+
+def _create_client(provider):
+    api_key = get_setting(API_KEY_SETTINGS[provider])
+    max_retries = get_int_setting("LLM_MAX_RETRIES", 2)
+    if provider == "claude":
+        import anthropic
+        return anthropic.Anthropic(
+            api_key=api_key,
+            http_client=_http_client(provider, anthropic.DefaultHttpxClient),
+            max_retries=max_retries
+        )
+    from openai import OpenAI, DefaultHttpxClient
+    return OpenAI(api_key=api_key, http_client=_http_client(provider, DefaultHttpxClient), max_retries=max_retries)
+
+def _create_async_client(provider):
+    api_key = get_setting(API_KEY_SETTINGS[provider])
+    max_retries = get_int_setting("LLM_MAX_RETRIES", 2)
+    if provider == "claude":
+        import anthropic
+        return anthropic.AsyncAnthropic(
+            api_key=api_key,
+            http_client=_async_http_client(provider, anthropic.DefaultAsyncHttpxClient),
+            max_retries=max_retries
+        )
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+    return AsyncOpenAI(
+        api_key=api_key,
+        http_client=_async_http_client(provider, DefaultAsyncHttpxClient),
+        max_retries=max_retries
+    )
+
+def _timeout(operation):
+    import httpx
+    setting, default = OPERATION_TIMEOUTS[operation]
+    return httpx.Timeout(get_float_setting(setting, default), connect=get_float_setting("LLM_CONNECT_TIMEOUT", 5.0))
+
+def get_llm_client(provider, operation="chat"):
+    """Get the shared client of a provider ("openai" or "claude") for an operation ("chat", "stream" or "summary")"""
+    key = (provider, operation)
+    client = _operation_clients.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _operation_clients.get(key)
+        if client is None:
+            if provider not in _clients:
+                _clients[provider] = _create_client(provider)
+                _provider_metrics(provider)
+            client = _clients[provider].with_options(timeout=_timeout(operation))
+            _operation_clients[key] = client
+        return client
+
+def get_async_llm_client(provider, operation="chat"):
+    """Get the shared async client of a provider for an operation.
+
+    Only use it from coroutines on the utils/async_bridge.py loop: its
+    connections belong to that event loop.
+    """
+    key = (provider, operation)
+    client = _async_operation_clients.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _async_operation_clients.get(key)
+        if client is None:
+            if provider not in _async_clients:
+                _async_clients[provider] = _create_async_client(provider)
+                _provider_metrics(provider)
+            client = _async_clients[provider].with_options(timeout=_timeout(operation))
+            _async_operation_clients[key] = client
+        return client
+
+def get_llm_client_metrics() -> Dict[str, Dict[str, int]]:
+    """Get request and connection counters per provider; reused = requests that needed no new connection"""
+    with _lock:
+        return {
+            provider: dict(counts, reused=max(0, counts["requests"] - counts["connections_opened"]))
+            for provider, counts in _metrics.items()
+        }
+
+def reset_llm_clients():
+    """Close the shared clients so they are created again (e.g. after a key change)"""
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+        _operation_clients.clear()
+        # Async clients can only be closed on their loop; drop them
+        _async_clients.clear()
+        _async_operation_clients.clear()
+    for client in clients:
+        client.close()
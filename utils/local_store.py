@@ -0,0 +1,397 @@
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from utils.settings import get_setting
+
+# Local-first mirror of the conversation sheets (SQLite in WAL mode).
+#
+# - sheet_rows / sheet_cursors: the rows replicated from each client sheet and
+#   the next sheet row that has not been pulled yet.
+# - journal: interaction upserts that have not reached the sheet yet, one per
+#   turn (client, timestamp, session_id, user_message). It survives restarts and is replayed
+#   by the background writer in utils/write_behind.py.
+# - dead_letters: journal entries the writer gave up on after repeated
+#   failures, kept for the operator to see.
+# - summaries: content-addressed summary cache (utils/summary_cache.py),
+#   evicted least recently used first.
+# - memory_turns / memory_digests: per-client rolling memory
+#   (utils/rolling_memory.py), rebuilt from the history if lost.
+DEFAULT_PATH = Path(__file__).parent.parent / ".cache" / "local_store.db"
+# Bumped when stored data has to be migrated, see _migrate()
+SCHEMA_VERSION = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sheet_rows (
+    client TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (client, row)
+);
+CREATE TABLE IF NOT EXISTS sheet_cursors (
+    client TEXT PRIMARY KEY,
+    next_row INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS journal (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    client TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    user_message TEXT NOT NULL,
+    interaction TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1,
+    updated_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (client, timestamp, session_id, user_message)
+);
+CREATE TABLE IF NOT EXISTS dead_letters (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    client TEXT NOT NULL,
+    interaction TEXT NOT NULL,
+    error TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    failed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS summaries (
+    key TEXT PRIMARY KEY,
+    summary TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS summaries_last_used ON summaries (last_used);
+CREATE TABLE IF NOT EXISTS memory_turns (
+    client TEXT NOT NULL,
+    day TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    user_message TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    PRIMARY KEY (client, timestamp, user_message)
+);
+CREATE TABLE IF NOT EXISTS memory_digests (
+    client TEXT NOT NULL,
+    period TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    turns INTEGER NOT NULL,
+    through TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (client, period)
+);
+"""
+
+_lock = threading.RLock()
+_connection = None
+
+def _migrate(connection):
+    version = connection.execute("PRAGMA user_version").fetchone()[0]
+    if version < 1:
+        # Digests used to be made of reply summaries only; rebuild them with the client's messages
+        connection.execute("DELETE FROM memory_digests")
+    if version < 2:
+        columns = [row[1] for row in connection.execute("PRAGMA table_info(journal)")]
+        if "attempts" not in columns:
+            connection.execute("ALTER TABLE journal ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+    if version < 3:
+        # Upserts used to coalesce on (client, session_id, user_message), so the
+        # same message sent twice overwrote the first turn; key them on the turn
+        columns = [row[1] for row in connection.execute("PRAGMA table_info(journal)")]
+        if "timestamp" not in columns:
+            rows = connection.execute(
+                "SELECT client, session_id, user_message, interaction, version, updated_at, attempts FROM journal ORDER BY id"
+            ).fetchall()
+            connection.execute("DROP TABLE journal")
+            connection.executescript(_SCHEMA)
+            connection.executemany(
+                "INSERT INTO journal (client, timestamp, session_id, user_message, interaction, version, updated_at, attempts) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (client, json.loads(data).get('timestamp', ''), session_id, user_message, data, version, updated_at, attempts)
+                    for client, session_id, user_message, data, version, updated_at, attempts in rows
+                ]
+            )
+    connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+def get_connection():
+    """Get the shared SQLite connection, creating the database on first use"""
+    global _connection
+    with _lock:
+        if _connection is None:
+            # The fake Sheets backend starts empty every run, so its mirror does too
+            default = ":memory:" if get_setting("STORAGE_BACKEND", "sheets") == "fake" else str(DEFAULT_PATH)
+            path = get_setting("LOCAL_STORE_PATH", default)
+            if path != ":memory:":
+                Path(path).parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            _migrate(connection)
+            _connection = connection
+        return _connection
+
+def _execute(sql, params=()):
+    with _lock:
+        return get_connection().execute(sql, params).fetchall()
+
+def _transaction(statements):
+    """Run (sql, params) pairs atomically"""
+    with _lock:
+        connection = get_connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            for sql, params in statements:
+                connection.execute(sql, params)
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+def get_next_row(client_name):
+    """Get the first sheet row not pulled yet for a client, or None if never synced"""
+    rows = _execute("SELECT next_row FROM sheet_cursors WHERE client = ?", (client_name,))
+    return rows[0][0] if rows else None
+
+def get_rows(client_name):
+    """Get the replicated sheet rows of a client, row 1 first"""
+    rows = _execute(
+        "SELECT row, data FROM sheet_rows WHERE client = ? ORDER BY row",
+        (client_name,)
+    )
+    values = []
+    for row, data in rows:
+        # Keep positions aligned with sheet rows even if a row is missing
+        while len(values) < row - 1:
+            values.append([])
+        values.append(json.loads(data))
+    return values
+
+def store_rows(client_name, first_row, values):
+    """Store rows pulled from the sheet starting at first_row and advance the cursor"""
+    statements = [
+        (
+            "INSERT INTO sheet_rows (client, row, data) VALUES (?, ?, ?) "
+            "ON CONFLICT (client, row) DO UPDATE SET data = excluded.data",
+            (client_name, first_row + offset, json.dumps(row))
+        )
+        for offset, row in enumerate(values)
+    ]
+    statements.append((
+        "INSERT INTO sheet_cursors (client, next_row) VALUES (?, ?) "
+        "ON CONFLICT (client) DO UPDATE SET next_row = MAX(next_row, excluded.next_row)",
+        (client_name, first_row + len(values))
+    ))
+    _transaction(statements)
+
+def update_row(client_name, row_number, row):
+    """Record a row written to the sheet by this app"""
+    next_row = get_next_row(client_name)
+    if next_row is None or row_number > next_row:
+        # Rows before it have not been pulled yet; the next pull will pick it up
+        return
+    store_rows(client_name, row_number, [row])
+
+def forget_client(client_name=None):
+    """Drop replicated rows of one client, or of all clients"""
+    if client_name is None:
+        _transaction([("DELETE FROM sheet_rows", ()), ("DELETE FROM sheet_cursors", ())])
+    else:
+        _transaction([
+            ("DELETE FROM sheet_rows WHERE client = ?", (client_name,)),
+            ("DELETE FROM sheet_cursors WHERE client = ?", (client_name,))
+        ])
+
+def journal_upsert(client_name, interaction):
+    """Durably record an interaction upsert; returns True if it replaced a pending one of the same turn"""
+    key = (
+        client_name, interaction.get('timestamp', ''), interaction.get('session_id', ''),
+        interaction.get('user_message', '')
+    )
+    with _lock:
+        replaced = bool(_execute(
+            "SELECT 1 FROM journal WHERE client = ? AND timestamp = ? AND session_id = ? AND user_message = ?",
+            key
+        ))
+        # Upsert in place so the entry keeps its position in the replay order
+        _execute(
+            "INSERT INTO journal (client, timestamp, session_id, user_message, interaction, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (client, timestamp, session_id, user_message) DO UPDATE SET "
+            "interaction = excluded.interaction, version = version + 1, updated_at = excluded.updated_at",
+            key + (json.dumps(interaction), time.time())
+        )
+    return replaced
+
+def journal_entries(client_name=None):
+    """Get pending journal entries as (id, version, client, interaction), oldest first"""
+    if client_name is None:
+        rows = _execute("SELECT id, version, client, interaction FROM journal ORDER BY id")
+    else:
+        rows = _execute(
+            "SELECT id, version, client, interaction FROM journal WHERE client = ? ORDER BY id",
+            (client_name,)
+        )
+    return [(entry_id, version, client, json.loads(data)) for entry_id, version, client, data in rows]
+
+def journal_remove(entries):
+    """Remove replicated journal entries, keeping any that changed since they were read"""
+    _transaction([
+        ("DELETE FROM journal WHERE id = ? AND version = ?", (entry_id, version))
+        for entry_id, version, _, _ in entries
+    ])
+
+def journal_fail(entries, error, max_attempts):
+    """Count a failed write of journal entries; entries that reached max_attempts move to dead_letters.
+
+    Returns how many entries were moved.
+    """
+    with _lock:
+        _transaction([
+            ("UPDATE journal SET attempts = attempts + 1 WHERE id = ?", (entry_id,))
+            for entry_id, _, _, _ in entries
+        ])
+        ids = [entry_id for entry_id, _, _, _ in entries]
+        placeholders = ", ".join("?" for _ in ids)
+        dead = _execute(
+            f"SELECT id, client, interaction, attempts FROM journal WHERE id IN ({placeholders}) AND attempts >= ?",
+            tuple(ids) + (max_attempts,)
+        ) if ids else []
+        now = time.time()
+        statements = []
+        for entry_id, client, data, attempts in dead:
+            statements.append((
+                "INSERT INTO dead_letters (client, interaction, error, attempts, failed_at) VALUES (?, ?, ?, ?, ?)",
+                (client, data, error, attempts, now)
+            ))
+            statements.append(("DELETE FROM journal WHERE id = ?", (entry_id,)))
+        _transaction(statements)
+    return len(dead)
+
+def dead_letters(client_name=None):
+    """Get the writes given up on as (client, interaction, error, attempts, failed_at), newest first"""
+    if client_name is None:
+        rows = _execute("SELECT client, interaction, error, attempts, failed_at FROM dead_letters ORDER BY id DESC")
+    else:
+        rows = _execute(
+            "SELECT client, interaction, error, attempts, failed_at FROM dead_letters WHERE client = ? ORDER BY id DESC",
+            (client_name,)
+        )
+    return [(client, json.loads(data), error, attempts, failed_at) for client, data, error, attempts, failed_at in rows]
+
+def requeue_dead_letters():
+    """Move the writes given up on back into the journal; returns how many were moved.
+
+    A turn upserted again since it was given up on keeps its newer journal entry.
+    """
+    with _lock:
+        rows = _execute("SELECT id, client, interaction FROM dead_letters ORDER BY id")
+        statements = []
+        for dead_id, client, data in rows:
+            interaction = json.loads(data)
+            statements.append((
+                "INSERT INTO journal (client, timestamp, session_id, user_message, interaction, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (client, timestamp, session_id, user_message) DO NOTHING",
+                (
+                    client, interaction.get('timestamp', ''), interaction.get('session_id', ''),
+                    interaction.get('user_message', ''), data, time.time()
+                )
+            ))
+            statements.append(("DELETE FROM dead_letters WHERE id = ?", (dead_id,)))
+        _transaction(statements)
+    return len(rows)
+
+def dead_letter_count():
+    """Count the writes given up on"""
+    return _execute("SELECT COUNT(*) FROM dead_letters")[0][0]
+
+def journal_depth():
+    """Count journal entries not replicated yet"""
+    return _execute("SELECT COUNT(*) FROM journal")[0][0]
+
+def summary_get(key):
+    """Get a cached summary and mark it as recently used, or None"""
+    with _lock:
+        rows = _execute("SELECT summary FROM summaries WHERE key = ?", (key,))
+        if not rows:
+            return None
+        _execute("UPDATE summaries SET last_used = ? WHERE key = ?", (time.time(), key))
+    return rows[0][0]
+
+def summary_put(key, summary, max_entries, max_bytes):
+    """Cache a summary, then evict least recently used ones beyond the limits"""
+    size = len(key) + len(summary.encode())
+    with _lock:
+        _execute(
+            "INSERT INTO summaries (key, summary, size, last_used) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET summary = excluded.summary, size = excluded.size, "
+            "last_used = excluded.last_used",
+            (key, summary, size, time.time())
+        )
+        entries, total = summary_usage()
+        evicted = 0
+        if entries > max_entries or total > max_bytes:
+            # Walk from the least recently used entry until both limits hold
+            for old_key, old_size in _execute("SELECT key, size FROM summaries ORDER BY last_used"):
+                if entries <= max_entries and total <= max_bytes:
+                    break
+                _execute("DELETE FROM summaries WHERE key = ?", (old_key,))
+                entries -= 1
+                total -= old_size
+                evicted += 1
+    return evicted
+
+def summary_usage():
+    """Count cached summaries and their total size in bytes"""
+    entries, total = _execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM summaries")[0]
+    return entries, total
+
+def memory_record_turns(client_name, turns):
+    """Upsert (day, timestamp, user_message, summary) turns of a client"""
+    _transaction([
+        (
+            "INSERT INTO memory_turns (client, day, timestamp, user_message, summary) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (client, timestamp, user_message) DO UPDATE SET summary = excluded.summary",
+            (client_name,) + tuple(turn)
+        )
+        for turn in turns
+    ])
+
+def memory_days(client_name):
+    """Get (day, turn count) of a client's remembered turns, oldest day first"""
+    return _execute(
+        "SELECT day, COUNT(*) FROM memory_turns WHERE client = ? GROUP BY day ORDER BY day",
+        (client_name,)
+    )
+
+def memory_day_turns(client_name, days):
+    """Get the (day, user_message, summary) of every turn on the given days, in order"""
+    if not days:
+        return []
+    placeholders = ", ".join("?" for _ in days)
+    return _execute(
+        f"SELECT day, user_message, summary FROM memory_turns WHERE client = ? AND day IN ({placeholders}) "
+        "ORDER BY day, timestamp",
+        (client_name,) + tuple(days)
+    )
+
+def memory_digests(client_name):
+    """Get a client's digests as {period: (digest, turns, through)}"""
+    rows = _execute(
+        "SELECT period, digest, turns, through FROM memory_digests WHERE client = ?",
+        (client_name,)
+    )
+    return {period: (digest, turns, through) for period, digest, turns, through in rows}
+
+def memory_put_digest(client_name, period, digest, turns, through=None, drop_periods=()):
+    """Store a digest, optionally dropping digests it replaces"""
+    statements = [(
+        "INSERT INTO memory_digests (client, period, digest, turns, through, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT (client, period) DO UPDATE SET digest = excluded.digest, turns = excluded.turns, "
+        "through = excluded.through, updated_at = excluded.updated_at",
+        (client_name, period, digest, turns, through, time.time())
+    )]
+    statements.extend(
+        ("DELETE FROM memory_digests WHERE client = ? AND period = ?", (client_name, old_period))
+        for old_period in drop_periods
+    )
+    _transaction(statements)
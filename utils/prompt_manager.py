@@ -2,12 +2,8 @@ import streamlit as st
 import docx
 import io
 import random
-from google_services import (
-    get_sheet_service,
-    check_sheet_exists,
-    create_sheet,
-    SPREADSHEET_ID
-)
+from utils.storage import get_storage
+from google_services import get_client_directory, invalidate_client_directory
 
 # List of fun random character names
 RANDOM_NAMES = [
@@ -37,57 +33,13 @@ def read_docx(file):
 def save_character_to_sheet(name, prompt):
     """Save character data to the characters sheet"""
     try:
-        sheet_service = get_sheet_service()
-        if not sheet_service:
+        storage = get_storage()
+        if not storage.is_available():
             return False
             
-        # Check if characters sheet exists, create if not
-        if not check_sheet_exists(sheet_service, SPREADSHEET_ID, "characters"):
-            if not create_sheet(sheet_service, SPREADSHEET_ID, "characters"):
-                st.error("Failed to create characters sheet")
-                return False
-            
-            # Add headers
-            sheet_service.spreadsheets().values().update(
-                spreadsheetId=SPREADSHEET_ID,
-                range="characters!A1:B1",
-                valueInputOption="RAW",
-                body={"values": [["Character Name", "System Prompt"]]}
-            ).execute()
-        
-        # Check if character already exists
-        result = sheet_service.spreadsheets().values().get(
-            spreadsheetId=SPREADSHEET_ID,
-            range="characters!A:B"
-        ).execute()
-        
-        values = result.get('values', [])
-        row_index = None
-        
-        # Look for existing character
-        for idx, row in enumerate(values):
-            if row[0] == name:
-                row_index = idx + 1  # +1 because sheets are 1-indexed
-                break
-        
-        if row_index:
-            # Update existing character
-            range_name = f"characters!A{row_index}:B{row_index}"
-            sheet_service.spreadsheets().values().update(
-                spreadsheetId=SPREADSHEET_ID,
-                range=range_name,
-                valueInputOption="RAW",
-                body={"values": [[name, prompt]]}
-            ).execute()
-        else:
-            # Add new character
-            sheet_service.spreadsheets().values().append(
-                spreadsheetId=SPREADSHEET_ID,
-                range="characters!A:B",
-                valueInputOption="RAW",
-                body={"values": [[name, prompt]]}
-            ).execute()
-        
+        # Creates the characters sheet if needed, and updates an existing character in place
+        if storage.save_character(name, prompt, get_client_directory()):
+            invalidate_client_directory()
         return True
     except Exception as e:
         st.error(f"Error saving character: {e}")
@@ -96,24 +48,12 @@ def save_character_to_sheet(name, prompt):
 def load_characters():
     """Load all characters from the sheet"""
     try:
-        sheet_service = get_sheet_service()
-        if not sheet_service:
-            return []
-            
-        if not check_sheet_exists(sheet_service, SPREADSHEET_ID, "characters"):
-            return []
-            
-        result = sheet_service.spreadsheets().values().get(
-            spreadsheetId=SPREADSHEET_ID,
-            range="characters!A:B"
-        ).execute()
-        
-        values = result.get('values', [])
-        if not values:
+        storage = get_storage()
+        if not storage.is_available():
             return []
             
-        # Skip header row and convert to list of tuples
-        return [(row[0], row[1]) for row in values[1:] if len(row) >= 2]
+        # The characters sheet is looked up in the cached client directory
+        return storage.load_characters(get_client_directory())
     except Exception as e:
         st.error(f"Error loading characters: {e}")
         return []
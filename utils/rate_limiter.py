@@ -0,0 +1,168 @@
+import time
+import random
+import threading
+from contextlib import contextmanager
+from googleapiclient.errors import HttpError
+from utils.settings import get_float_setting, get_int_setting
+
+# Shared client-side limiter for Google API requests.
+#
+# Reads and writes draw from separate token buckets sized from the
+# per-minute quotas, so bursts from several operators queue here instead of
+# failing with 429. Requests made from background threads (write-behind,
+# history pulls) leave a reserve of tokens for interactive ones. A 429 slows
+# the bucket down and is retried with exponential backoff and full jitter;
+# successes bring the rate back up to the quota.
+#
+#   GOOGLE_READ_QUOTA       read requests per minute (default 60)
+#   GOOGLE_WRITE_QUOTA      write requests per minute (default 60)
+#   GOOGLE_DOCS_QUOTA       Docs requests per minute (default 60)
+#   GOOGLE_API_BURST        requests allowed back to back (default 5)
+#   GOOGLE_API_MAX_RETRIES  retries of a throttled or failed request (default 5)
+#   GOOGLE_API_MAX_BACKOFF  longest wait between retries in seconds (default 32)
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """Token bucket with a reserve that background requests may not use"""
+
+    def __init__(self, per_minute, burst, reserve=1):
+        self.capacity = max(1, burst)
+        # Refill so that a full burst plus a minute of refills stays within the quota
+        self.nominal_rate = max(1, per_minute - self.capacity) / 60.0
+        self.rate = self.nominal_rate
+        self.reserve = min(reserve, self.capacity - 1)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._interactive_waiting = 0
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, priority=INTERACTIVE):
+        """Block until a token is available; returns the seconds waited"""
+        start = time.monotonic()
+        with self._cond:
+            if priority == INTERACTIVE:
+                self._interactive_waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if priority == INTERACTIVE:
+                        floor = 0
+                    else:
+                        # Leave the reserve, and everything while interactive requests wait
+                        floor = self.reserve + self._interactive_waiting
+                    if now >= self._paused_until and self._tokens >= floor + 1:
+                        self._tokens -= 1
+                        return now - start
+                    wait = max(self._paused_until - now, (floor + 1 - self._tokens) / self.rate)
+                    self._cond.wait(min(wait, 1.0))
+            finally:
+                if priority == INTERACTIVE:
+                    self._interactive_waiting -= 1
+                    self._cond.notify_all()
+
+    def throttled(self, pause):
+        """Slow down after a 429: halve the rate and hold requests for a while"""
+        with self._cond:
+            self._refill(time.monotonic())
+            self.rate = max(self.nominal_rate / 8, self.rate / 2)
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+
+    def succeeded(self):
+        """Recover the rate step by step after successful requests"""
+        with self._cond:
+            if self.rate < self.nominal_rate:
+                self._refill(time.monotonic())
+                self.rate = min(self.nominal_rate, self.rate * 1.1)
+                self._cond.notify_all()
+
+_lock = threading.Lock()
+_buckets = {}
+_priority = threading.local()
+_stats = {"requests": 0, "throttled": 0, "retried": 0, "failed": 0, "wait_seconds": 0.0}
+
+def _bucket(kind):
+    with _lock:
+        if kind not in _buckets:
+            _buckets[kind] = TokenBucket(
+                get_int_setting(f"GOOGLE_{kind.upper()}_QUOTA", 60),
+                get_int_setting("GOOGLE_API_BURST", 5)
+            )
+        return _buckets[kind]
+
+@contextmanager
+def background_priority():
+    """Mark Google API requests made by this thread as background work"""
+    previous = getattr(_priority, "value", INTERACTIVE)
+    _priority.value = BACKGROUND
+    try:
+        yield
+    finally:
+        _priority.value = previous
+
+def _backoff(attempt, error):
+    """Seconds to wait before a retry: Retry-After if given, else jittered exponential"""
+    resp = getattr(error, "resp", None)
+    retry_after = resp.get("retry-after") if resp is not None else None
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    cap = get_float_setting("GOOGLE_API_MAX_BACKOFF", 32.0)
+    return random.uniform(0, min(cap, 2 ** attempt))
+
+def execute_request(request, kind="read", idempotent=True):
+    """Execute a googleapiclient request within the quota, retrying 429 and 5xx errors.
+
+    Requests that must not run twice (appends, adding a sheet) are only
+    retried on 429, which the API answers before doing anything.
+    """
+    bucket = _bucket(kind)
+    priority = getattr(_priority, "value", INTERACTIVE)
+    max_retries = get_int_setting("GOOGLE_API_MAX_RETRIES", 5)
+    attempt = 0
+    while True:
+        waited = bucket.acquire(priority)
+        with _lock:
+            _stats["requests"] += 1
+            _stats["wait_seconds"] += waited
+        try:
+            result = request.execute()
+        except HttpError as e:
+            status = getattr(getattr(e, "resp", None), "status", None)
+            retryable = status == 429 or (idempotent and status in RETRYABLE_STATUSES)
+            if not retryable or attempt >= max_retries:
+                with _lock:
+                    _stats["failed"] += 1
+                raise
+            delay = _backoff(attempt, e)
+            with _lock:
+                _stats["retried"] += 1
+                if status == 429:
+                    _stats["throttled"] += 1
+            if status == 429:
+                bucket.throttled(delay)
+            else:
+                time.sleep(delay)
+            attempt += 1
+            continue
+        bucket.succeeded()
+        return result
+
+def get_rate_limiter_stats():
+    """Get request, throttle and retry counters and the current rate of each bucket"""
+    with _lock:
+        stats = dict(_stats)
+        buckets = dict(_buckets)
+    for kind, bucket in buckets.items():
+        stats[f"{kind}_per_minute"] = bucket.rate * 60
+    return stats
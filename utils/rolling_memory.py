@@ -0,0 +1,147 @@
+import threading
+from datetime import datetime, timedelta
+from utils import local_store
+from utils.settings import get_int_setting
+
+# Rolling, hierarchical memory of each client's older conversations.
+#
+# Every saved turn's message and reply summary are recorded per day. Days
+# before today are condensed in the background into a digest per day for the
+# most recent MEMORY_RECENT_DAYS closed days, and everything older is folded,
+# chunk by chunk, into one overall digest. The digests are made of what the
+# client said as well as of the replies, so names, pets and preferences the
+# client mentioned survive. The prompt carries the overall digest and the day
+# digests instead of the raw turns of those days, so its size stays bounded
+# however long the history gets. Turns of today and of the last
+# MEMORY_RAW_DAYS closed days are still sent raw while the context budget has
+# room for them; their digests only stand in for the ones that do not fit.
+#
+#   MEMORY_RECENT_DAYS    closed days kept as separate day digests (default 7)
+#   MEMORY_RAW_DAYS       closed days whose turns are sent raw when they fit (default 2)
+#   MEMORY_CHUNK_CHARS    note text folded into the overall digest per call (default 6000)
+OVERALL = "overall"
+
+_lock = threading.Lock()
+_client_locks = {}
+_refreshes_in_progress = set()
+
+def _client_lock(client_name):
+    with _lock:
+        return _client_locks.setdefault(client_name, threading.Lock())
+
+def turn_day(interaction):
+    """Get the YYYY-MM-DD day of an interaction, or None without a timestamp"""
+    timestamp = interaction.get('timestamp') or ''
+    try:
+        return datetime.strptime(timestamp[:10], "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        return None
+
+def record_turns(client_name, interactions):
+    """Remember the summaries of saved interactions"""
+    turns = [
+        (turn_day(interaction), interaction['timestamp'], interaction.get('user_message', ''), interaction['summary'])
+        for interaction in interactions
+        if turn_day(interaction) and interaction.get('summary')
+    ]
+    if turns:
+        local_store.memory_record_turns(client_name, turns)
+
+def format_note(client_name, user_message, summary):
+    """A remembered turn as a note to condense"""
+    return f"{client_name}: {user_message}\nYour reply: {summary}"
+
+def refresh_memory(client_name, condense, today=None):
+    """Bring the digests of a client up to date with its remembered turns.
+
+    condense(notes, previous_digest) returns a digest of the notes, merged
+    with the previous digest when one is given; it raises on failure.
+    """
+    today = today or datetime.now().strftime("%Y-%m-%d")
+    with _client_lock(client_name):
+        days = [(day, count) for day, count in local_store.memory_days(client_name) if day < today]
+        recent_days = max(0, get_int_setting("MEMORY_RECENT_DAYS", 7))
+        recent = days[len(days) - recent_days:] if recent_days else []
+        old = days[:len(days) - len(recent)]
+        digests = local_store.memory_digests(client_name)
+
+        # Fold days that left the recent window into the overall digest
+        overall, folded_turns, through = digests.get(OVERALL, (None, 0, None))
+        unfolded = [(day, count) for day, count in old if through is None or day > through]
+        if unfolded:
+            chunk_chars = get_int_setting("MEMORY_CHUNK_CHARS", 6000)
+            turns = local_store.memory_day_turns(client_name, [day for day, _ in unfolded])
+            chunk = []
+            for index, (day, user_message, summary) in enumerate(turns):
+                chunk.append(f"{day}: {format_note(client_name, user_message, summary)}")
+                # Chunks end on day boundaries so "through" is exact
+                day_ends = index == len(turns) - 1 or turns[index + 1][0] != day
+                if day_ends and (index == len(turns) - 1 or sum(map(len, chunk)) >= chunk_chars):
+                    overall = condense("\n".join(chunk), overall)
+                    folded_turns += len(chunk)
+                    # Record progress per chunk so a failure does not redo it
+                    local_store.memory_put_digest(
+                        client_name, OVERALL, overall, folded_turns, through=day,
+                        drop_periods=[d for d, _ in unfolded if d <= day and d in digests]
+                    )
+                    chunk = []
+
+        # Digest each recent closed day once its turns stopped changing
+        for day, count in recent:
+            digest = digests.get(day)
+            if digest and digest[1] == count:
+                continue
+            turns = local_store.memory_day_turns(client_name, [day])
+            notes = "\n".join(format_note(client_name, user_message, summary) for _, user_message, summary in turns)
+            local_store.memory_put_digest(client_name, day, condense(notes, None), count)
+
+def remember_turn(client_name, interaction, condense):
+    """Record a saved turn and refresh the client's digests (call off the UI thread)"""
+    try:
+        record_turns(client_name, [interaction])
+        refresh_memory(client_name, condense)
+    except Exception as e:
+        print(f"Error updating memory for {client_name}: {e}")
+
+def remember_history_in_background(client_name, interactions, condense):
+    """Record a loaded history and refresh the digests on a background thread"""
+    with _lock:
+        if client_name in _refreshes_in_progress:
+            return
+        _refreshes_in_progress.add(client_name)
+
+    def run():
+        try:
+            record_turns(client_name, interactions)
+            refresh_memory(client_name, condense)
+        except Exception as e:
+            print(f"Error building memory for {client_name}: {e}")
+        finally:
+            with _lock:
+                _refreshes_in_progress.discard(client_name)
+
+    threading.Thread(target=run, name=f"memory-{client_name}", daemon=True).start()
+
+def get_memory(client_name, today=None):
+    """Get the digests to use in the prompt.
+
+    Returns {"overall": digest or None, "days": [(day, digest)] oldest first,
+    "through": last day in the overall digest, "covered_days": days with a
+    digest, "raw_from": first day whose turns go in raw while they fit}.
+    """
+    today = today or datetime.now().strftime("%Y-%m-%d")
+    raw_days = max(0, get_int_setting("MEMORY_RAW_DAYS", 2))
+    raw_from = (datetime.strptime(today, "%Y-%m-%d") - timedelta(days=raw_days)).strftime("%Y-%m-%d")
+    digests = local_store.memory_digests(client_name)
+    overall, _, through = digests.get(OVERALL, (None, 0, None))
+    days = sorted(
+        (period, digest) for period, (digest, _, _) in digests.items()
+        if period != OVERALL and period < today
+    )
+    return {
+        "overall": overall,
+        "days": days,
+        "through": through,
+        "covered_days": {day for day, _ in days},
+        "raw_from": raw_from
+    }
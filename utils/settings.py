@@ -0,0 +1,34 @@
+import os
+import streamlit as st
+
+def get_setting(name, default=None):
+    """Read an optional setting from the environment, falling back to Streamlit secrets"""
+    value = os.environ.get(name)
+    if value is not None:
+        return value
+    try:
+        return st.secrets.get(name, default)
+    except Exception:
+        # No secrets file configured
+        return default
+
+def get_int_setting(name, default):
+    """Read an optional integer setting"""
+    try:
+        return int(get_setting(name, default))
+    except (TypeError, ValueError):
+        return default
+
+def get_float_setting(name, default):
+    """Read an optional float setting"""
+    try:
+        return float(get_setting(name, default))
+    except (TypeError, ValueError):
+        return default
+
+def get_bool_setting(name, default):
+    """Read an optional on/off setting ("1", "true", "yes" and "on" count as enabled)"""
+    value = get_setting(name, default)
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes", "on")
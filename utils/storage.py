@@ -0,0 +1,187 @@
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional, Tuple
+from utils.rate_limiter import execute_request
+
+INTERACTION_HEADERS = ['Timestamp', 'Session ID', 'Message', 'Reply 1', 'Reply 2', 'Final Reply', 'Summarized Reply', 'Comparison']
+CHARACTER_HEADERS = ['Character Name', 'System Prompt']
+CHARACTERS_SHEET = "characters"
+
+class StorageBackend(ABC):
+    """Where client conversations and saved characters live.
+
+    Clients are tables of rows whose first row holds the headers; row numbers
+    are 1-based like sheet rows. Methods raise on failure.
+    """
+
+    @abstractmethod
+    def is_available(self) -> bool:
+        """Whether the backend can be reached (e.g. credentials are configured)"""
+
+    @abstractmethod
+    def list_clients(self) -> List[str]:
+        """Get the names of all clients (including the characters table)"""
+
+    @abstractmethod
+    def create_client(self, client_name: str, headers: List[str] = INTERACTION_HEADERS):
+        """Create an empty client table with a header row"""
+
+    @abstractmethod
+    def load_history(self, client_name: str, first_row: int = 1, last_column: str = "H") -> List[List[str]]:
+        """Get the rows of a client from first_row on"""
+
+    @abstractmethod
+    def upsert_interactions(self, updates: List[Tuple[str, int, List[str]]],
+                            appends: Dict[str, List[List[str]]],
+                            on_appended: Optional[Callable[[str, Optional[int]], None]] = None) -> Dict[str, Optional[int]]:
+        """Overwrite (client, row, values) updates and append rows per client.
+
+        Returns the first row number each client's appended rows landed on.
+        on_appended(client, first_row) is called as soon as a client's rows
+        are appended, so they are recorded even if a later append fails.
+        """
+
+    @abstractmethod
+    def load_characters(self, clients: Optional[List[str]] = None) -> List[Tuple[str, str]]:
+        """Get all saved (name, prompt) characters.
+
+        clients is a (possibly cached) list_clients() result to look the
+        characters table up in; it is only listed again if missing there.
+        """
+
+    @abstractmethod
+    def save_character(self, name: str, prompt: str, clients: Optional[List[str]] = None) -> bool:
+        """Add a character, or replace the prompt of an existing one.
+
+        clients is as for load_characters(). Returns whether the characters
+        table had to be created.
+        """
+
+class SheetsStorage(StorageBackend):
+    """Storage on a Google Sheets spreadsheet, one sheet per client"""
+
+    def __init__(self, service_factory, spreadsheet_id):
+        self._service_factory = service_factory
+        self.spreadsheet_id = spreadsheet_id
+
+    def _service(self):
+        service = self._service_factory()
+        if not service:
+            raise RuntimeError("Google Sheets service not available")
+        return service
+
+    def is_available(self):
+        return bool(self._service_factory())
+
+    def list_clients(self):
+        # Field mask: only the titles, not the metadata of every sheet
+        spreadsheet = execute_request(self._service().spreadsheets().get(
+            spreadsheetId=self.spreadsheet_id,
+            fields='sheets.properties.title'
+        ), "read")
+        return [
+            sheet['properties']['title']
+            for sheet in spreadsheet.get('sheets', [])
+            if sheet.get('properties', {}).get('title')
+        ]
+
+    def create_client(self, client_name, headers=INTERACTION_HEADERS):
+        service = self._service()
+        execute_request(service.spreadsheets().batchUpdate(
+            spreadsheetId=self.spreadsheet_id,
+            body={'requests': [{'addSheet': {'properties': {'title': client_name}}}]}
+        ), "write", idempotent=False)
+        execute_request(service.spreadsheets().values().update(
+            spreadsheetId=self.spreadsheet_id,
+            range=f"{client_name}!A1",
+            valueInputOption='RAW',
+            body={'values': [headers]}
+        ), "write")
+
+    def load_history(self, client_name, first_row=1, last_column="H"):
+        result = execute_request(self._service().spreadsheets().values().get(
+            spreadsheetId=self.spreadsheet_id,
+            range=f"{client_name}!A{first_row}:{last_column}"
+        ), "read")
+        return result.get('values', [])
+
+    def upsert_interactions(self, updates, appends, on_appended=None):
+        from utils.interaction_index import row_from_range
+
+        service = self._service()
+        if updates:
+            execute_request(service.spreadsheets().values().batchUpdate(
+                spreadsheetId=self.spreadsheet_id,
+                body={
+                    'valueInputOption': 'RAW',
+                    'data': [
+                        {'range': f"{client_name}!A{row}:H{row}", 'values': [values]}
+                        for client_name, row, values in updates
+                    ]
+                }
+            ), "write")
+
+        first_rows = {}
+        for client_name, rows in appends.items():
+            result = execute_request(service.spreadsheets().values().append(
+                spreadsheetId=self.spreadsheet_id,
+                range=f"{client_name}!A:H",
+                valueInputOption='RAW',
+                body={'values': rows}
+            ), "write", idempotent=False)
+            first_rows[client_name] = row_from_range(result.get('updates', {}).get('updatedRange'))
+            if on_appended is not None:
+                on_appended(client_name, first_rows[client_name])
+        return first_rows
+
+    def _has_characters(self, clients):
+        # A cached listing may predate the table; only a hit is trusted
+        return (clients is not None and CHARACTERS_SHEET in clients) or CHARACTERS_SHEET in self.list_clients()
+
+    def load_characters(self, clients=None):
+        if not self._has_characters(clients):
+            return []
+        values = self.load_history(CHARACTERS_SHEET, last_column="B")
+        # Skip header row
+        return [(row[0], row[1]) for row in values[1:] if len(row) >= 2]
+
+    def save_character(self, name, prompt, clients=None):
+        service = self._service()
+        created = not self._has_characters(clients)
+        if created:
+            self.create_client(CHARACTERS_SHEET, CHARACTER_HEADERS)
+
+        values = self.load_history(CHARACTERS_SHEET, last_column="B")
+        row_index = next((idx + 1 for idx, row in enumerate(values) if row and row[0] == name), None)
+        if row_index:
+            execute_request(service.spreadsheets().values().update(
+                spreadsheetId=self.spreadsheet_id,
+                range=f"{CHARACTERS_SHEET}!A{row_index}:B{row_index}",
+                valueInputOption='RAW',
+                body={'values': [[name, prompt]]}
+            ), "write")
+        else:
+            execute_request(service.spreadsheets().values().append(
+                spreadsheetId=self.spreadsheet_id,
+                range=f"{CHARACTERS_SHEET}!A:B",
+                valueInputOption='RAW',
+                body={'values': [[name, prompt]]}
+            ), "write", idempotent=False)
+        return created
+
+_storage = None
+_storage_lock = threading.Lock()
+
+def get_storage() -> StorageBackend:
+    """Get the process-wide storage backend.
+
+    STORAGE_BACKEND=sheets (default) uses the Google Sheets spreadsheet;
+    STORAGE_BACKEND=fake uses the same code against the in-process fake
+    Sheets server, for offline runs and load tests.
+    """
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            from google_services import get_sheet_service, SPREADSHEET_ID
+            _storage = SheetsStorage(get_sheet_service, SPREADSHEET_ID)
+        return _storage
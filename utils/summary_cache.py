@@ -0,0 +1,58 @@
+import json
+import hashlib
+import threading
+from utils import local_store
+from utils.settings import get_int_setting
+
+# Content-addressed cache of message summaries, persisted in the local store.
+# Entries are keyed by a hash of (model, prompt, message), so identical text
+# summarized the same way - retries that produce the same reply, re-saves,
+# backfills - costs no API call, across restarts too.
+#
+#   SUMMARY_CACHE_MAX_ENTRIES   most summaries kept (default 5000)
+#   SUMMARY_CACHE_MAX_BYTES     most bytes kept (default 5 MB)
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0}
+
+def summary_key(model, prompt, message):
+    """Hash the inputs that determine a summary"""
+    return hashlib.sha256(json.dumps([model, prompt, message]).encode()).hexdigest()
+
+def get_cached_summary(model, prompt, message):
+    """Get the cached summary of a message, or None"""
+    try:
+        summary = local_store.summary_get(summary_key(model, prompt, message))
+    except Exception as e:
+        print(f"Error reading summary cache: {e}")
+        summary = None
+    with _lock:
+        _stats["hits" if summary is not None else "misses"] += 1
+    return summary
+
+def store_summary(model, prompt, message, summary):
+    """Cache the summary of a message"""
+    try:
+        evicted = local_store.summary_put(
+            summary_key(model, prompt, message),
+            summary,
+            get_int_setting("SUMMARY_CACHE_MAX_ENTRIES", 5000),
+            get_int_setting("SUMMARY_CACHE_MAX_BYTES", 5 * 1024 * 1024)
+        )
+    except Exception as e:
+        print(f"Error writing summary cache: {e}")
+        return
+    with _lock:
+        _stats["stored"] += 1
+        _stats["evicted"] += evicted
+
+def get_summary_cache_stats():
+    """Get hit/miss counters, the hit rate and the size of the cache"""
+    entries, size = local_store.summary_usage()
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return dict(
+            _stats,
+            hit_rate=_stats["hits"] / lookups if lookups else None,
+            entries=entries,
+            bytes=size
+        )
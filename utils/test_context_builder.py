@@ -0,0 +1,50 @@
+from utils.context_builder import ConversationContext
+
+def history(turns, unsummarized=()):
+    return [
+        {
+            "timestamp": f"2026-10-01 10:{turn:02d}:00",
+            "user_message": "How was the garden this weekend? " * 5,
+            "bot_reply": "The tennis and the jazz dinner were lovely. " * 12,
+            "summary": "" if turn in unsummarized else f"Talked about turn {turn}."
+        }
+        for turn in range(turns)
+    ]
+
+def build(chat_history, budget, step, monkeypatch):
+    monkeypatch.setenv("HISTORY_WINDOW_STEP", str(step))
+    context = ConversationContext("Ann")
+    for turn in range(1, len(chat_history) + 1):
+        parts, report = context.build("You are Fred.", chat_history[:turn], "Hello", budget=budget)
+    return parts, report
+
+def test_everything_fits_in_full(monkeypatch):
+    parts, report = build(history(3), 6000, 1, monkeypatch)
+    assert report["full_turns"] == 3
+    assert report["omitted_turns"] == 0
+
+def test_older_turns_go_in_by_summary(monkeypatch):
+    parts, report = build(history(10), 1200, 1, monkeypatch)
+    assert report["full_turns"] > 0
+    assert report["summarized_turns"] > 0
+    assert report["used"] <= 1200
+
+def test_turn_without_summary_does_not_end_the_history(monkeypatch):
+    # Turns 5 to 9 fit in full; turn 4 does not and has no summary yet
+    parts, report = build(history(10, unsummarized={4}), 1200, 1, monkeypatch)
+    assert report["full_turns"] == 5
+    assert "Talked about turn 3." in parts.history + parts.recent
+    assert report["summarized_turns"] > 0
+    assert report["used"] > 1100
+
+def test_history_prefix_is_stable_within_a_step(monkeypatch):
+    monkeypatch.setenv("HISTORY_WINDOW_STEP", "4")
+    chat_history = history(40)
+    context = ConversationContext("Ann")
+    prefixes = []
+    for turn in range(30, 34):
+        parts, report = context.build("You are Fred.", chat_history[:turn], "Hello", budget=1500)
+        assert report["used"] <= 1500
+        prefixes.append(parts.history)
+    # Turns 32 and 33 only add recent turns after the same history part
+    assert prefixes[2] == prefixes[3]
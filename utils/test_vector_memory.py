@@ -0,0 +1,53 @@
+import numpy as np
+from utils.vector_memory import VectorIndex
+
+DIM = 64
+
+def interaction(timestamp, message):
+    return {"timestamp": timestamp, "user_message": message, "summary": ""}
+
+def test_search_finds_the_closest_interaction(tmp_path):
+    index = VectorIndex(tmp_path, "Ann", DIM)
+    index.add([interaction("1", "walking the dog by the lake"), interaction("2", "wine and jazz on Friday")])
+    [(score, meta)] = VectorIndex(tmp_path, "Ann", DIM).search("jazz and wine", k=1)
+    assert meta["timestamp"] == "2"
+    assert score > 0.5
+
+def test_saved_again_supersedes_the_older_row(tmp_path):
+    index = VectorIndex(tmp_path, "Ann", DIM)
+    index.add([interaction("1", "garden")])
+    assert index.add([interaction("1", "garden")]) == 0
+    index.add([dict(interaction("1", "garden"), summary="tomatoes in the garden")])
+    assert len(index) == 1
+    [(_, meta)] = index.search("tomatoes", k=5)
+    assert meta["summary"] == "tomatoes in the garden"
+
+def test_orphaned_vectors_are_cut_off_on_load(tmp_path):
+    index = VectorIndex(tmp_path, "Ann", DIM)
+    index.add([interaction("1", "dog walk")])
+    # A crash after appending a vector but before its metadata
+    with open(index.vectors_path, "ab") as f:
+        f.write(np.ones(DIM, dtype=np.float32).tobytes())
+
+    VectorIndex(tmp_path, "Ann", DIM).add([interaction("2", "wine jazz")])
+    index = VectorIndex(tmp_path, "Ann", DIM)
+    assert index.vectors_path.stat().st_size == 2 * 4 * DIM
+    [(score, meta)] = index.search("wine jazz", k=1)
+    assert meta["timestamp"] == "2"
+    assert score > 0.99
+
+def test_partial_metadata_line_is_dropped_with_its_vector(tmp_path):
+    index = VectorIndex(tmp_path, "Ann", DIM)
+    index.add([interaction("1", "dog walk")])
+    with open(index.vectors_path, "ab") as f:
+        f.write(np.ones(DIM, dtype=np.float32).tobytes())
+    with open(index.meta_path, "a", encoding="utf-8") as f:
+        f.write('{"key": "2')
+
+    VectorIndex(tmp_path, "Ann", DIM).add([interaction("3", "garden market")])
+    index = VectorIndex(tmp_path, "Ann", DIM)
+    assert len(index) == 2
+    assert index.vectors_path.stat().st_size == 2 * 4 * DIM
+    [(score, meta)] = index.search("garden market", k=1)
+    assert meta["timestamp"] == "3"
+    assert score > 0.99
@@ -0,0 +1,88 @@
+import os
+
+os.environ["STORAGE_BACKEND"] = "fake"
+
+import pytest
+from utils import local_store, storage, write_behind
+from utils.fake_sheets import FakeSheetsService, _http_error
+from utils.history_cache import load_rows
+from utils.interaction_index import invalidate_index
+
+def interaction(message, reply="Hi"):
+    return {"timestamp": "2026-10-01 10:00:00", "session_id": "s1", "user_message": message, "reply1": reply}
+
+@pytest.fixture
+def sheets(monkeypatch):
+    """A fresh fake spreadsheet and an empty in-memory local store"""
+    service = FakeSheetsService(latency_ms=0)
+    monkeypatch.setenv("LOCAL_STORE_PATH", ":memory:")
+    monkeypatch.setenv("WRITE_BEHIND_MAX_ATTEMPTS", "2")
+    monkeypatch.setattr(local_store, "_connection", None)
+    monkeypatch.setattr(storage, "_storage", storage.SheetsStorage(lambda: service, "fake"))
+    invalidate_index()
+    return storage.get_storage()
+
+def test_upserts_of_a_turn_coalesce(sheets):
+    sheets.create_client("Ann")
+    local_store.journal_upsert("Ann", interaction("Hello", "first"))
+    assert local_store.journal_upsert("Ann", interaction("Hello", "second"))
+    assert local_store.journal_depth() == 1
+
+    write_behind.write_interactions(local_store.journal_entries())
+    assert local_store.journal_depth() == 0
+    assert sheets.load_history("Ann")[1:] == [["2026-10-01 10:00:00", "s1", "Hello", "second"]]
+
+def test_rejected_entry_is_set_aside_without_holding_up_others(sheets):
+    sheets.create_client("Ann")
+    local_store.journal_upsert("Ann", interaction("Hello"))
+    # No sheet for Bob: Sheets rejects the range (400)
+    local_store.journal_upsert("Bob", interaction("Hello"))
+
+    assert write_behind._write_isolated(2) == (1, True)
+    assert local_store.dead_letter_count() == 0
+    assert write_behind._write_isolated(1) == (0, True)
+    assert [client for client, *_ in local_store.dead_letters()] == ["Bob"]
+    assert local_store.journal_depth() == 0
+    assert len(sheets.load_history("Ann")) == 2
+
+    # Still shown in the history until it is written
+    sheets.create_client("Bob")
+    assert load_rows("Bob")[1:] == [["2026-10-01 10:00:00", "s1", "Hello", "Hi", "", "", "", ""]]
+
+def test_outage_does_not_count_as_an_attempt(sheets, monkeypatch):
+    local_store.journal_upsert("Ann", interaction("Hello"))
+    monkeypatch.setattr(sheets, "_service_factory", lambda: None)
+
+    for _ in range(5):
+        assert write_behind._write_isolated(1) == (0, True)
+    assert local_store.dead_letter_count() == 0
+    assert local_store.journal_depth() == 1
+
+def test_dead_letters_can_be_requeued(sheets):
+    local_store.journal_upsert("Bob", interaction("Hello"))
+    for _ in range(2):
+        write_behind._write_isolated(1)
+    assert local_store.dead_letter_count() == 1
+
+    sheets.create_client("Bob")
+    assert local_store.requeue_dead_letters() == 1
+    assert local_store.dead_letter_count() == 0
+    write_behind.write_interactions(local_store.journal_entries())
+    assert sheets.load_history("Bob")[1:] == [["2026-10-01 10:00:00", "s1", "Hello", "Hi"]]
+
+def test_requeue_keeps_a_newer_journal_entry(sheets):
+    local_store.journal_upsert("Bob", interaction("Hello", "old"))
+    for _ in range(2):
+        write_behind._write_isolated(1)
+    local_store.journal_upsert("Bob", interaction("Hello", "new"))
+
+    local_store.requeue_dead_letters()
+    [(_, _, _, queued)] = local_store.journal_entries()
+    assert queued["reply1"] == "new"
+
+def test_only_request_errors_are_permanent():
+    assert write_behind.is_permanent_error(_http_error(400, "bad range"))
+    assert not write_behind.is_permanent_error(_http_error(429, "quota"))
+    assert not write_behind.is_permanent_error(_http_error(503, "unavailable"))
+    assert not write_behind.is_permanent_error(RuntimeError("Storage backend not available"))
+    assert not write_behind.is_permanent_error(ConnectionError("reset"))
@@ -0,0 +1,84 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils.settings import get_int_setting
+from utils.write_behind import enqueue_interaction
+from utils.async_bridge import submit_async
+
+# Post-generation work of a chat turn, off the rerun that shows the reply.
+#
+# The interaction is journaled for the background writer straight away
+# (with an empty summary) while the summary is generated on a worker
+# thread. When the summary is ready it is patched into the interaction
+# dict - the same object held in st.session_state.chat_history - and
+# queued again, which updates the pending journal entry or the sheet row.
+# Stage timings are written into the turn's metrics dict as they finish.
+# An async summarize (a coroutine function) runs on the shared event loop
+# of utils/async_bridge.py instead of holding a worker thread while it waits.
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=get_int_setting("TURN_PIPELINE_WORKERS", 4),
+                thread_name_prefix="turn-pipeline"
+            )
+        return _executor
+
+def process_turn(client_name, interaction, summarize, metrics=None, remember=None):
+    """Persist a turn now and summarize it in the background; returns the summary future.
+
+    Pass summarize=None when the interaction already has its summary.
+    summarize may be a coroutine function. remember(client_name, interaction)
+    is then called on a worker thread once the summary is known.
+    """
+    if metrics is None:
+        metrics = {}
+    response = interaction.get('bot_reply', '')
+
+    start = time.perf_counter()
+    enqueue_interaction(client_name, interaction)
+    metrics["persist_ms"] = (time.perf_counter() - start) * 1000
+    if summarize is None:
+        if remember is not None:
+            _get_executor().submit(remember, client_name, interaction)
+        return None
+
+    def finish(summary):
+        if interaction.get('bot_reply') != response:
+            # Replaced by a retry in the meantime; its own summary is on the way
+            return summary
+        interaction['summary'] = summary
+        try:
+            enqueue_interaction(client_name, interaction)
+        except Exception as e:
+            print(f"Error saving summary for {client_name}: {e}")
+        if remember is not None:
+            remember(client_name, interaction)
+        return summary
+
+    if asyncio.iscoroutinefunction(summarize):
+        async def run_async():
+            start = time.perf_counter()
+            try:
+                summary = await summarize(response)
+            finally:
+                metrics["summarize_ms"] = (time.perf_counter() - start) * 1000
+            # Saving and remembering block; keep them off the event loop
+            return await asyncio.get_running_loop().run_in_executor(_get_executor(), finish, summary)
+
+        return submit_async(run_async())
+
+    def run():
+        start = time.perf_counter()
+        try:
+            summary = summarize(response)
+        finally:
+            metrics["summarize_ms"] = (time.perf_counter() - start) * 1000
+        return finish(summary)
+
+    return _get_executor().submit(run)
@@ -0,0 +1,202 @@
+import os
+import json
+import zlib
+import hashlib
+import threading
+from pathlib import Path
+import numpy as np
+from utils.extractive_summarizer import tokenize
+from utils.settings import get_setting, get_int_setting, get_float_setting
+
+# Per-client retrieval memory over past interactions.
+#
+# Each interaction is embedded locally with signed feature hashing of its
+# content words (no API call, stable across restarts) and appended
+# to a float32 file per client that is memory-mapped for search, plus a
+# JSON-lines sidecar with the interaction's key and text. Search is a
+# matrix-vector product over the mapped rows. An interaction saved again
+# (retry, Save Reply) is appended again and supersedes its older row.
+#
+#   VECTOR_MEMORY_DIR         index directory (default .cache/vectors)
+#   VECTOR_MEMORY_DIM         embedding size (default 1024)
+#   RETRIEVAL_TOP_K           interactions retrieved per message (default 5)
+#   RETRIEVAL_MIN_SCORE       lowest cosine similarity retrieved (default 0.15)
+DEFAULT_DIR = Path(__file__).parent.parent / ".cache" / "vectors"
+
+def _normalize(word):
+    # Crude stemming so "Clara's" matches "Clara" and "dogs" matches "dog"
+    if word.endswith("'s"):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+def _features(text):
+    return [_normalize(word) for word in tokenize(text)]
+
+def embed(text, dim=None):
+    """Embed a text as an L2-normalized hashed bag of words"""
+    dim = dim or get_int_setting("VECTOR_MEMORY_DIM", 1024)
+    vector = np.zeros(dim, dtype=np.float32)
+    counts = {}
+    for feature in _features(text):
+        counts[feature] = counts.get(feature, 0) + 1
+    for feature, count in counts.items():
+        digest = zlib.crc32(feature.encode())
+        sign = 1.0 if digest & 0x80000000 else -1.0
+        vector[digest % dim] += sign * (1.0 + np.log(count))
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+def interaction_key(interaction):
+    return f"{interaction.get('timestamp', '')}\x1f{interaction.get('user_message', '')}"
+
+def interaction_text(interaction):
+    """The text an interaction is found by: the message and what was said back"""
+    reply = interaction.get('summary') or interaction.get('final_reply') or interaction.get('bot_reply', '')
+    return f"{interaction.get('user_message', '')}\n{reply}"
+
+class VectorIndex:
+    """Append-only, memory-mapped embedding index of one client's interactions"""
+
+    def __init__(self, directory, name, dim):
+        directory.mkdir(parents=True, exist_ok=True)
+        self.dim = dim
+        self.vectors_path = directory / f"{name}.{dim}.f32"
+        self.meta_path = directory / f"{name}.{dim}.jsonl"
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._meta = []
+        self._latest = {}
+        lines = 0
+        if self.meta_path.exists():
+            with open(self.meta_path, encoding="utf-8") as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        self._meta.append(json.loads(line))
+                    except ValueError:
+                        # A crash mid-append leaves a partial last line
+                        break
+        # A crash between the two appends leaves extra vectors (or a partial
+        # one); cut both files back to the rows they have in common so the
+        # next append lines up again
+        rows = self.vectors_path.stat().st_size // (4 * dim) if self.vectors_path.exists() else 0
+        self._meta = self._meta[:rows]
+        if self.vectors_path.exists() and self.vectors_path.stat().st_size != len(self._meta) * 4 * dim:
+            os.truncate(self.vectors_path, len(self._meta) * 4 * dim)
+        if lines != len(self._meta):
+            with open(self.meta_path, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(meta) + "\n" for meta in self._meta)
+        for row, meta in enumerate(self._meta):
+            self._latest[meta["key"]] = row
+
+    def __len__(self):
+        return len(self._latest)
+
+    def contains(self, interaction):
+        """Whether the interaction is indexed with its current text"""
+        row = self._latest.get(interaction_key(interaction))
+        return row is not None and self._meta[row]["text"] == interaction_text(interaction)
+
+    def add(self, interactions):
+        """Embed and append interactions not indexed with their current text yet"""
+        with self._lock:
+            new = [interaction for interaction in interactions if not self.contains(interaction)]
+            if not new:
+                return 0
+            vectors = np.stack([embed(interaction_text(interaction), self.dim) for interaction in new])
+            with open(self.vectors_path, "ab") as f:
+                f.write(vectors.astype(np.float32).tobytes())
+            with open(self.meta_path, "a", encoding="utf-8") as f:
+                for interaction in new:
+                    meta = {
+                        "key": interaction_key(interaction),
+                        "timestamp": interaction.get('timestamp', ''),
+                        "user_message": interaction.get('user_message', ''),
+                        "summary": interaction.get('summary', ''),
+                        "text": interaction_text(interaction)
+                    }
+                    self._latest[meta["key"]] = len(self._meta)
+                    self._meta.append(meta)
+                    f.write(json.dumps(meta) + "\n")
+            self._matrix = None
+            return len(new)
+
+    def _mapped(self):
+        if self._matrix is None and self._meta:
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(len(self._meta), self.dim))
+        return self._matrix
+
+    def search(self, text, k=5, min_score=0.0, exclude=()):
+        """Get up to k (score, meta) of the interactions most similar to a text"""
+        with self._lock:
+            matrix = self._mapped()
+            if matrix is None:
+                return []
+            rows = np.fromiter(self._latest.values(), dtype=np.int64)
+            excluded = set(exclude)
+            if excluded:
+                rows = rows[[self._meta[row]["key"] not in excluded for row in rows]]
+            if not len(rows):
+                return []
+            scores = matrix[rows] @ embed(text, self.dim)
+            top = np.argsort(-scores)[:k] if len(rows) > k else np.argsort(-scores)
+            return [
+                (float(scores[i]), self._meta[rows[i]])
+                for i in top
+                if scores[i] >= min_score
+            ]
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_index(client_name):
+    """Get the process-wide index of a client"""
+    directory = Path(get_setting("VECTOR_MEMORY_DIR", str(DEFAULT_DIR)))
+    dim = get_int_setting("VECTOR_MEMORY_DIM", 1024)
+    name = hashlib.sha1(client_name.encode()).hexdigest()[:16]
+    with _indexes_lock:
+        key = (str(directory), name, dim)
+        if key not in _indexes:
+            _indexes[key] = VectorIndex(directory, name, dim)
+        return _indexes[key]
+
+def index_interactions(client_name, interactions):
+    """Add saved interactions to the client's index"""
+    try:
+        return get_index(client_name).add([i for i in interactions if i.get('user_message')])
+    except Exception as e:
+        print(f"Error indexing interactions for {client_name}: {e}")
+        return 0
+
+def retrieve(client_name, message, exclude=()):
+    """Get the past interactions most relevant to a message as (score, meta), best first"""
+    try:
+        return get_index(client_name).search(
+            message,
+            k=get_int_setting("RETRIEVAL_TOP_K", 5),
+            min_score=get_float_setting("RETRIEVAL_MIN_SCORE", 0.15),
+            exclude=[interaction_key(interaction) for interaction in exclude]
+        )
+    except Exception as e:
+        print(f"Error retrieving memory for {client_name}: {e}")
+        return []
+
+_indexing_in_progress = set()
+
+def index_in_background(client_name, interactions):
+    """Index a loaded history on a background thread"""
+    with _indexes_lock:
+        if client_name in _indexing_in_progress:
+            return
+        _indexing_in_progress.add(client_name)
+
+    def run():
+        try:
+            index_interactions(client_name, interactions)
+        finally:
+            with _indexes_lock:
+                _indexing_in_progress.discard(client_name)
+
+    threading.Thread(target=run, name=f"vector-index-{client_name}", daemon=True).start()
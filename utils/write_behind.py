@@ -0,0 +1,235 @@
+import time
+import threading
+from collections import OrderedDict, deque
+from utils import local_store
+from utils.storage import get_storage
+from utils.settings import get_float_setting, get_int_setting
+from utils.rate_limiter import background_priority
+from utils.interaction_index import lookup_row, record_row
+from utils.history_cache import ensure_index, interaction_to_row, update_row
+
+# Interaction upserts are recorded in the durable journal of the local store
+# and replicated to Sheets by a background thread. The journal keeps one
+# entry per turn (client_name and the turn key of utils/interaction_index.py),
+# so a retry followed by Save Reply costs a single write, and entries left
+# over from a previous run are replayed when the writer starts. When Sheets
+# rejects a batch (a 4xx other than 429), its entries are written again
+# client by client and then one by one, so one bad entry (a deleted client
+# sheet, values Sheets rejects) does not hold up the others. An entry
+# rejected WRITE_BEHIND_MAX_ATTEMPTS times on its own is moved to the dead
+# letters of the local store, which history reads still show and
+# retry_dead_letters() requeues. Throttling, server and network errors and an
+# unavailable backend are not counted as attempts: the whole batch is
+# retried, backing off exponentially while they go on.
+#
+#   WRITE_BEHIND_DELAY          batching window in seconds (default 0.5)
+#   WRITE_BEHIND_RETRY_DELAY    seconds before retrying failed writes (default 5)
+#   WRITE_BEHIND_MAX_RETRY_DELAY  longest backoff between retries in seconds (default 120)
+#   WRITE_BEHIND_MAX_ATTEMPTS   rejected writes before an entry is set aside (default 5)
+_cond = threading.Condition()
+_worker = None
+_flush_latencies = deque(maxlen=100)
+_stats = {"enqueued": 0, "coalesced": 0, "flushes": 0, "rows_written": 0, "errors": 0, "dead_lettered": 0}
+
+def enqueue_interaction(client_name, interaction):
+    """Queue an interaction upsert for the background writer"""
+    coalesced = local_store.journal_upsert(client_name, interaction)
+    with _cond:
+        _stats["enqueued"] += 1
+        if coalesced:
+            _stats["coalesced"] += 1
+        _ensure_worker()
+        _cond.notify_all()
+
+def retry_dead_letters():
+    """Queue the writes given up on again; returns how many were queued"""
+    requeued = local_store.requeue_dead_letters()
+    if requeued:
+        with _cond:
+            _ensure_worker()
+            _cond.notify_all()
+    return requeued
+
+def start_writer():
+    """Start the background writer, replaying any writes left in the journal"""
+    with _cond:
+        _ensure_worker()
+        _cond.notify_all()
+
+def get_write_queue_stats():
+    """Get queue depth, flush latency and counters of the background writer"""
+    queue_depth = local_store.journal_depth()
+    with _cond:
+        latencies = list(_flush_latencies)
+        return dict(
+            _stats,
+            queue_depth=queue_depth,
+            dead_letters=local_store.dead_letter_count(),
+            last_flush_ms=latencies[-1] * 1000 if latencies else None,
+            avg_flush_ms=sum(latencies) / len(latencies) * 1000 if latencies else None
+        )
+
+def _ensure_worker():
+    global _worker
+    if _worker is None or not _worker.is_alive():
+        _worker = threading.Thread(target=_run_worker, name="sheets-write-behind", daemon=True)
+        _worker.start()
+
+def _run_worker():
+    with background_priority():
+        _write_forever()
+
+def _write_forever():
+    retry_delay = None
+    while True:
+        with _cond:
+            while not local_store.journal_depth():
+                _cond.wait()
+
+        # Short batching window so bursts (e.g. retry then Save Reply) coalesce
+        time.sleep(get_float_setting("WRITE_BEHIND_DELAY", 0.5))
+
+        entries = local_store.journal_entries()
+        start = time.perf_counter()
+        try:
+            write_interactions(entries)
+            written, failed = len(entries), False
+        except Exception as e:
+            print(f"Error flushing interactions to sheets: {e}")
+            if is_permanent_error(e):
+                written, failed = _write_isolated(len(entries))
+            else:
+                # Throttled or unavailable: nothing to blame on one entry,
+                # so the whole batch is retried after backing off
+                written, failed = max(0, len(entries) - local_store.journal_depth()), True
+
+        with _cond:
+            _stats["rows_written"] += written
+            if failed:
+                _stats["errors"] += 1
+            else:
+                _stats["flushes"] += 1
+                _flush_latencies.append(time.perf_counter() - start)
+            _cond.notify_all()
+
+        if failed:
+            # Back off exponentially while the failures go on
+            base = get_float_setting("WRITE_BEHIND_RETRY_DELAY", 5.0)
+            longest = max(base, get_float_setting("WRITE_BEHIND_MAX_RETRY_DELAY", 120.0))
+            retry_delay = min(retry_delay * 2 if retry_delay else base, longest)
+            time.sleep(retry_delay)
+        else:
+            retry_delay = None
+
+def _write_isolated(batch_size):
+    """Write what is left of a failed batch client by client, then entry by entry.
+
+    Stops at a failure that is not the entry's own (see is_permanent_error),
+    leaving the rest for the next retry. Returns how many entries of the
+    batch were written and whether any failed.
+    """
+    # Entries written before the batch failed are out of the journal already
+    remaining = local_store.journal_entries()
+    written = max(0, batch_size - len(remaining))
+    by_client = OrderedDict()
+    for entry in remaining:
+        by_client.setdefault(entry[2], []).append(entry)
+
+    failed = False
+    for entries in by_client.values():
+        try:
+            write_interactions(entries)
+            written += len(entries)
+            continue
+        except Exception as e:
+            if not is_permanent_error(e):
+                _count_failure(entries, e)
+                return written, True
+            if len(entries) == 1:
+                failed = True
+                _count_failure(entries, e)
+                continue
+        for entry in entries:
+            try:
+                write_interactions([entry])
+                written += 1
+            except Exception as e:
+                failed = True
+                _count_failure([entry], e)
+                if not is_permanent_error(e):
+                    return written, True
+    return written, failed
+
+def is_permanent_error(error):
+    """Whether a write failed because of the request itself (a 4xx other than 429).
+
+    Throttling, server errors, network errors and an unavailable backend
+    affect every write alike and say nothing about the entry.
+    """
+    status = getattr(getattr(error, "resp", None), "status", None)
+    try:
+        status = int(status)
+    except (TypeError, ValueError):
+        return False
+    return 400 <= status < 500 and status != 429
+
+def _count_failure(entries, error):
+    print(f"Error writing {len(entries)} interaction(s) for {entries[0][2]} to sheets: {error}")
+    if not is_permanent_error(error):
+        # Retried until it goes through, without counting an attempt
+        return
+    dead = local_store.journal_fail(entries, str(error), get_int_setting("WRITE_BEHIND_MAX_ATTEMPTS", 5))
+    if dead:
+        print(f"Gave up on {dead} interaction(s) for {entries[0][2]}; see the dead letters")
+        with _cond:
+            _stats["dead_lettered"] += dead
+
+def write_interactions(entries):
+    """Write journal entries: updates of known rows in one batch, then appends per client.
+
+    Entries are removed from the journal as soon as their write returns
+    (entries upserted again meanwhile stay queued), so a failure part way
+    through does not append the rows already written a second time.
+    """
+    storage = get_storage()
+    if not storage.is_available():
+        raise RuntimeError("Storage backend not available")
+
+    updates = []
+    update_entries = []
+    appends = OrderedDict()
+    for entry in entries:
+        _, _, client_name, interaction = entry
+        ensure_index(client_name)
+
+        row_index = lookup_row(client_name, interaction)
+        if row_index:
+            updates.append((client_name, row_index, interaction_to_row(interaction)))
+            update_entries.append(entry)
+        else:
+            appends.setdefault(client_name, []).append(entry)
+
+    def appended(client_name, first_row):
+        client_entries = appends[client_name]
+        if first_row:
+            # Appended rows are contiguous, starting at the first updated row
+            for offset, (_, _, _, interaction) in enumerate(client_entries):
+                record_row(client_name, interaction, first_row + offset)
+                update_row(client_name, first_row + offset, interaction_to_row(interaction))
+        local_store.journal_remove(client_entries)
+
+    if updates:
+        storage.upsert_interactions(updates, {})
+        for client_name, row_index, row in updates:
+            update_row(client_name, row_index, row)
+        local_store.journal_remove(update_entries)
+
+    if appends:
+        storage.upsert_interactions(
+            [],
+            OrderedDict(
+                (client_name, [interaction_to_row(interaction) for _, _, _, interaction in client_entries])
+                for client_name, client_entries in appends.items()
+            ),
+            on_appended=appended
+        )